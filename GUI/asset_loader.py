@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, List, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+from GUI.explosion_atlas import ExplosionAtlas
+from GUI.pixmap_cache import PixmapCache, game_assets
+from core.audio_manager import AudioManager, SFX_NAMES
+from core.setting_deploy import get_resource_path
+from logger import logger
+
+
+# декодирует звуки, музыку, картинки поля, цифры и кадры взрывов в фоновом потоке,
+# пока главное окно уже на экране. Картинки поток отдаёт как QImage: QPixmap
+# можно создавать только в GUI-потоке, поэтому в кэши их кладут слоты сигналов
+class AssetLoader(QThread):
+    progress = pyqtSignal(int, int, str)
+    image_ready = pyqtSignal(str, object, object, QImage)
+    atlas_ready = pyqtSignal(str, int, QImage)
+
+    def __init__(self, cell_size: int, parent=None):
+        super().__init__(parent)
+        audio = AudioManager.instance()
+        # микшер поднимаем в GUI-потоке, в фоне только декодирование
+        audio.init_mixer()
+        # сначала то, что нужно меню сразу: музыка лобби и щелчок кнопок
+        self._jobs: List[Tuple[str, Callable[[], None]]] = [("музыка лобби", lambda: audio.load_music("lobby"))]
+        self._jobs += [(f"звук {name}", lambda name=name: audio.load_effect(name)) for name in SFX_NAMES]
+        self._jobs += [(asset, lambda asset=asset, size=size: self._load_image(asset, size))
+                       for asset, size in game_assets(cell_size)]
+        self._jobs += [(f"взрыв {name}", lambda name=name, size=size: self._load_atlas(name, size))
+                       for name, size in ExplosionAtlas.atlas_names(cell_size)]
+        self._jobs.append(("музыка игры", lambda: audio.load_music("game")))
+        self.image_ready.connect(self._store_image)
+        self.atlas_ready.connect(self._store_atlas)
+        self.total = len(self._jobs)
+        self.elapsed_ms = 0.0
+
+    def run(self):
+        t0 = time.perf_counter()
+        for i, (what, job) in enumerate(self._jobs, 1):
+            try:
+                job()
+            except Exception as e:
+                # не загрузилось — подгрузится по первому требованию
+                logger.warning(f"Не удалось загрузить {what}: {e}")
+            self.progress.emit(i, self.total, what)
+        self.elapsed_ms = (time.perf_counter() - t0) * 1000
+        logger.info(f"Ресурсы загружены за {self.elapsed_ms:.0f} мс")
+
+    def _load_image(self, asset: str, size: int | None):
+        image = QImage(get_resource_path(asset))
+        if size is not None:
+            image = image.scaled(size, size)
+        self.image_ready.emit(asset, size, size, image)
+
+    def _load_atlas(self, name: str, size: int):
+        self.atlas_ready.emit(name, size, ExplosionAtlas.render(name, size))
+
+    # слоты объекта, созданного в GUI-потоке, — сигналы из run() приходят в очередь GUI-потока
+    def _store_image(self, asset: str, width: int | None, height: int | None, image: QImage):
+        PixmapCache.instance().put(asset, width, height, QPixmap.fromImage(image))
+
+    def _store_atlas(self, name: str, size: int, sheet: QImage):
+        ExplosionAtlas.put(name, size, sheet)
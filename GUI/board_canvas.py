@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple
+
+from PyQt5.QtCore import QPoint, QEasingCurve, QRect, Qt
+from PyQt5.QtGui import QColor, QPainter, QPixmap
+from PyQt5.QtWidgets import QWidget
+
+from GUI.explosion_atlas import ExplosionAtlas, FRAME_COUNT
+from GUI.pixmap_cache import PixmapCache, element_asset
+from GUI.tween_scheduler import TweenScheduler, FRAMES, GLOW
+from core.audio_manager import AudioManager
+from core.board import Board
+from core.element import Element
+from core.enums import Bonus, Color
+
+audio = AudioManager.instance()
+pixmaps = PixmapCache.instance()
+tweens = TweenScheduler.instance()
+
+EXPLOSION_FPS = 100
+HIGHLIGHT_MS = 1000
+HIGHLIGHT_PEAK = 0.8
+DRAG_THRESHOLD = 10
+
+
+# плитка на холсте: не виджет, а запись «что и где рисовать».
+# row/col — клетка, за которой плитка числится; x/y — где она сейчас (идёт анимация или нет);
+# asset — какая картинка нарисована: элемент движка могут перекрасить на месте
+class Tile:
+    __slots__ = ("element", "row", "col", "x", "y", "asset", "pixmap", "glow")
+
+    def __init__(self, element: Element, row: int, col: int, asset: str, pixmap: QPixmap, x: int, y: int):
+        self.element = element
+        self.row, self.col = row, col
+        self.asset = asset
+        self.pixmap = pixmap
+        self.x, self.y = x, y
+        self.glow = 0.0
+
+    def pos(self) -> QPoint:
+        return QPoint(self.x, self.y)
+
+    def move(self, p: QPoint):
+        self.x, self.y = p.x(), p.y()
+
+    def __repr__(self):
+        return (
+            f"<Tile row={self.row} col={self.col} "
+            f"color={self.element.color.name} bonus={self.element.bonus.name}>"
+        )
+
+
+class Explosion:
+    __slots__ = ("atlas", "frame", "x", "y")
+
+    def __init__(self, atlas: ExplosionAtlas, x: int, y: int):
+        self.atlas = atlas
+        self.frame = 0
+        self.x, self.y = x, y
+
+
+# взрывы рисуются в слое поверх родительского окна, а не на холсте: взрыв бомбы вдвое
+# больше клетки и у края поля выходит за холст. Мышь слой пропускает насквозь
+class ExplosionLayer(QWidget):
+    def __init__(self, parent: QWidget, canvas: QWidget):
+        super().__init__(parent)
+        self.canvas = canvas
+        self.explosions: List[Explosion] = []
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hide()
+
+    def add(self, explosion: Explosion):
+        if not self.explosions:
+            self.setGeometry(self.parentWidget().rect())
+            self.show()
+            self.raise_()
+        self.explosions.append(explosion)
+        tweens.add(FRAMES, self, explosion, 0, 0, FRAME_COUNT, 0, int(FRAME_COUNT * 1000 / EXPLOSION_FPS),
+                   on_done=lambda: self._remove(explosion))
+        self.update()
+
+    def _remove(self, explosion: Explosion):
+        self.explosions.remove(explosion)
+        if not self.explosions:
+            self.hide()
+
+    def clear(self):
+        tweens.cancel(self)
+        self.explosions.clear()
+        self.hide()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        # координаты взрывов — относительно холста
+        painter.translate(self.canvas.pos())
+        for e in self.explosions:
+            size = e.atlas.size
+            painter.drawPixmap(QRect(e.x, e.y, size, size), e.atlas.sheet, e.atlas.frame_rect(e.frame))
+
+
+# всё поле — один виджет: клетки, плитки и ракеты рисуются в одном paintEvent,
+# клик переводится в клетку по координатам. Координаты плиток — относительно холста
+class BoardCanvas(QWidget):
+    def __init__(self, parent: QWidget, rows: int, cols: int, cell_size: int, origin: QPoint,
+                 block_images: List[str], on_swap: Callable[[Tile, Tile], None] | None = None):
+        super().__init__(parent)
+        self.rows, self.cols, self.cell_size = rows, cols, cell_size
+        self.on_swap = on_swap
+        self.tiles: Dict[Tuple[int, int], Tile] = {}
+        # id(элемента движка) → его плитка: падение находит плитку без обхода всего поля.
+        # Плитка держит свой элемент, так что id не переиспользуется, пока запись жива
+        self._by_element: Dict[int, Tile] = {}
+        # ракеты в полёте: рисуются поверх плиток, в tiles не числятся
+        self.flying: List[Tile] = []
+        self.blasts = ExplosionLayer(parent, self)
+        self.selected_tile: Tile | None = None
+        self._drag_origin: QPoint | None = None
+        self._dragging = False
+        self._tinted: Dict[int, QPixmap] = {}
+        self.setGeometry(origin.x(), origin.y(), cols * cell_size, rows * cell_size)
+
+        # шахматка клеток не меняется — рисуем её один раз
+        self._background = QPixmap(self.size())
+        self._background.fill(Qt.transparent)
+        painter = QPainter(self._background)
+        for r in range(rows):
+            for c in range(cols):
+                painter.drawPixmap(c * cell_size, r * cell_size,
+                                   pixmaps.get(block_images[(r + c) % 2], cell_size))
+        painter.end()
+
+    def cell_pos(self, row: int, col: int) -> QPoint:
+        return QPoint(col * self.cell_size, row * self.cell_size)
+
+    def cell_at(self, p: QPoint) -> Tuple[int, int] | None:
+        if not self.rect().contains(p):
+            return None
+        return p.y() // self.cell_size, p.x() // self.cell_size
+
+    def new_tile(self, elem: Element, row: int, col: int, x: int, y: int) -> Tile:
+        asset = element_asset(elem.color, elem.bonus)
+        return Tile(elem, row, col, asset, pixmaps.get(asset, self.cell_size), x, y)
+
+    def tile_for(self, elem: Element) -> Tile | None:
+        return self._by_element.get(id(elem))
+
+    def place_tile(self, elem: Element, row: int, col: int, at_row: int | None = None) -> Tile:
+        # at_row — откуда плитка начнёт падать (над полем — отрицательная строка)
+        y = (row if at_row is None else at_row) * self.cell_size
+        tile = self.new_tile(elem, row, col, col * self.cell_size, y)
+        old = self.tiles.get((row, col))
+        if old is not None:
+            self._forget(old)
+        self.tiles[(row, col)] = tile
+        self._by_element[id(elem)] = tile
+        self.update()
+        return tile
+
+    def move_tile(self, tile: Tile, row: int, col: int):
+        # клетку освобождаем, только если в неё ещё никто не упал
+        if self.tiles.get((tile.row, tile.col)) is tile:
+            del self.tiles[(tile.row, tile.col)]
+        tile.row, tile.col = row, col
+        self.tiles[(row, col)] = tile
+
+    def _forget(self, tile: Tile):
+        if self._by_element.get(id(tile.element)) is tile:
+            del self._by_element[id(tile.element)]
+        if tile is self.selected_tile:
+            self.selected_tile = None
+
+    def remove_tile(self, row: int, col: int) -> Tile | None:
+        tile = self.tiles.pop((row, col), None)
+        if tile is not None:
+            self._forget(tile)
+            self.update()
+        return tile
+
+    def clear_tiles(self):
+        self.tiles.clear()
+        self._by_element.clear()
+        self.selected_tile = None
+        self.update()
+
+    def sync_board(self, board: Board) -> int:
+        # перерисовка по разнице: трогаем только клетки, где на экране не то, что в движке.
+        # Совпавшим плиткам лишь подставляем элемент движка, чтобы индекс падений оставался верным
+        changed = 0
+        for r in range(self.rows):
+            for c in range(self.cols):
+                elem = board.cell(r, c)
+                tile = self.tiles.get((r, c))
+                if elem is None:
+                    if tile is not None:
+                        self.remove_tile(r, c)
+                        changed += 1
+                    continue
+                # сравниваем с нарисованным, а не с элементом плитки: тот мог смениться на месте
+                if tile is None or tile.asset != element_asset(elem.color, elem.bonus):
+                    self.place_tile(elem, r, c)
+                    changed += 1
+                    continue
+                if tile.element is not elem:
+                    self._forget(tile)
+                    tile.element = elem
+                    self._by_element[id(elem)] = tile
+        return changed
+
+    def animate_fall(self, tile: Tile, target_row: int, finished: Callable[[], None] | None = None):
+        end = self.cell_pos(target_row, tile.col)
+        dur = 100 + (end.y() - tile.y) * 2
+        tweens.move(self, tile, end.x(), end.y(), dur, QEasingCurve.OutBounce, finished, blocking=True)
+
+    def animate_swap(self, t1: Tile, t2: Tile, finished: Callable[[], None]):
+        # оба твина стартуют в одном кадре с одной длительностью и завершаются вместе;
+        # finished висит на втором — к его вызову обе плитки уже на местах
+        x1, y1, x2, y2 = t1.x, t1.y, t2.x, t2.y
+        tweens.move(self, t1, x2, y2, 150, QEasingCurve.InOutQuad, blocking=True)
+        tweens.move(self, t2, x1, y1, 150, QEasingCurve.InOutQuad, finished, blocking=True)
+
+    def busy(self) -> bool:
+        return tweens.busy(self)
+
+    def when_idle(self, callback: Callable[[], None]):
+        tweens.when_idle(self, callback)
+
+    def stop_animations(self):
+        tweens.cancel(self)
+        self.flying.clear()
+        self.blasts.clear()
+        self.update()
+
+    def swap_tiles(self, t1: Tile, t2: Tile):
+        r1, c1 = t1.row, t1.col
+        r2, c2 = t2.row, t2.col
+        t1.row, t1.col, t2.row, t2.col = r2, c2, r1, c1
+        self.tiles[(t1.row, t1.col)] = t1
+        self.tiles[(t2.row, t2.col)] = t2
+
+    def explode(self, color: str, pos: QPoint, bonus: Bonus = Bonus.NONE):
+        if bonus == Bonus.BOMB:
+            atlas = ExplosionAtlas.get("bomb", self.cell_size * 2)
+        else:
+            atlas = ExplosionAtlas.get(color, self.cell_size)
+        self.blasts.add(Explosion(atlas, pos.x(), pos.y()))
+
+    def fire_rocket(self, row: int, col: int, orientation: Bonus):
+        elem = Element(row, col, Color.RED, orientation)
+        rocket = self.new_tile(elem, row, col, col * self.cell_size, row * self.cell_size)
+        self.flying.append(rocket)
+        if orientation == Bonus.ROCKET_H:
+            end = QPoint(0, rocket.y)
+        else:
+            audio.play_sound("rocket")
+            end = QPoint(rocket.x, 0)
+
+        def _on_rocket_done():
+            self.flying.remove(rocket)
+            self.explode(Color.RED.value, rocket.pos())
+
+        tweens.move(self, rocket, end.x(), end.y(), 100, QEasingCurve.InQuad, _on_rocket_done)
+
+    def _tint(self, pix: QPixmap) -> QPixmap:
+        # жёлтая подсветка выбранной плитки: силуэт плитки, залитый цветом
+        key = pix.cacheKey()
+        tinted = self._tinted.get(key)
+        if tinted is None:
+            tinted = QPixmap(pix.size())
+            tinted.fill(Qt.transparent)
+            painter = QPainter(tinted)
+            painter.drawPixmap(0, 0, pix)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceIn)
+            painter.fillRect(tinted.rect(), QColor("yellow"))
+            painter.end()
+            self._tinted[key] = tinted
+        return tinted
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._background)
+        for tile in self.tiles.values():
+            painter.drawPixmap(tile.x, tile.y, tile.pixmap)
+            if tile.glow > 0:
+                painter.setOpacity(tile.glow)
+                painter.drawPixmap(tile.x, tile.y, self._tint(tile.pixmap))
+                painter.setOpacity(1.0)
+        for rocket in self.flying:
+            painter.drawPixmap(rocket.x, rocket.y, rocket.pixmap)
+
+    def _animate_glow(self, tile: Tile):
+        tweens.add(GLOW, self, tile, 0, 0, HIGHLIGHT_PEAK, 0, HIGHLIGHT_MS, QEasingCurve.InOutQuad)
+
+    def mousePressEvent(self, e):
+        cell = self.cell_at(e.pos())
+        tile = self.tiles.get(cell) if cell else None
+        if tile is None:
+            return
+        audio.play_sound("click")
+        self._drag_origin = e.pos()
+        self._dragging = False
+        self.selected_tile = tile
+        self._animate_glow(tile)
+
+    def mouseMoveEvent(self, e):
+        if not self._drag_origin:
+            return
+        if (e.pos() - self._drag_origin).manhattanLength() > DRAG_THRESHOLD:
+            self._dragging = True
+
+    def mouseReleaseEvent(self, e):
+        source = self.selected_tile
+        dragging = self._dragging
+        self._drag_origin = None
+        self._dragging = False
+        if not dragging or source is None:
+            return
+        cell = self.cell_at(e.pos())
+        target = self.tiles.get(cell) if cell else None
+        if target is not None and target is not source and self.on_swap:
+            self.on_swap(source, target)
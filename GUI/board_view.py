@@ -1,16 +1,22 @@
+from __future__ import annotations
+
 import random
 
-from PyQt5.QtCore import QPoint, QSize, QPropertyAnimation, QEasingCurve, Qt
+from typing import Callable
+
+from PyQt5.QtCore import QElapsedTimer, QPoint, QSize, Qt, QTimer
 from PyQt5.QtGui import QPixmap, QIcon, QFontDatabase, QFont
 from PyQt5.QtWidgets import (
     QLabel,
     QFrame, QPushButton, QWidget
 )
 
-from GUI.tile_label import TileLabel
+from GUI.board_canvas import BoardCanvas
+from GUI.digit_display import DigitDisplay
+from GUI.pixmap_cache import DIGIT_COLORS
 from core.audio_manager import AudioManager
 from core.board import Board
-from core.enums import Bonus
+from core.replay import ReplayReader
 from core.setting_deploy import get_resource_path
 
 audio = AudioManager.instance()
@@ -21,6 +27,13 @@ class BoardView(QWidget):
     COLS = 7
     CELL_SIZE = 60
     GRID_ORIGIN = QPoint(40, 300)
+    # при просмотре повтора долгие раздумья игрока сжимаем до этой паузы, с
+    REPLAY_MAX_PAUSE = 2.0
+    # зеркало соперника обновляется не чаще MIRROR_FPS раз в секунду; пока своё поле
+    # анимируется, ждём, но не дольше MIRROR_MAX_DEFER_MS сверх обычного кадра
+    MIRROR_FPS = 10
+    MIRROR_POLL_MS = 50
+    MIRROR_MAX_DEFER_MS = 500
 
     ICON_PATH = get_resource_path("assets/icon.png")
     BACKGROUND_PATH = get_resource_path("assets/game_background.png")
@@ -32,12 +45,13 @@ class BoardView(QWidget):
         name: get_resource_path(f"assets/elements/{name}.png")
         for name in ("orange", "purple", "red", "yellow")
     }
+    # пути для PixmapCache — относительно корня ресурсов
     BLOCK_IMAGES = [
-        get_resource_path(f"assets/block{i}.png")
+        f"assets/block{i}.png"
         for i in (1, 2)
     ]
 
-    def __init__(self):
+    def __init__(self, max_fps: float = MIRROR_FPS, local_busy: Callable[[], bool] | None = None):
         super().__init__()
         self.setEnabled(False)
 
@@ -45,9 +59,20 @@ class BoardView(QWidget):
         self.setWindowFlag(Qt.WindowCloseButtonHint, False)
 
         self.board = None
-        self.animations = []
-        self.selected_tile = None
-        self.tile_labels = {}
+        # режим просмотра записанной партии, см. play_replay
+        self.replay: ReplayReader | None = None
+        self.replay_speed = 1.0
+        self._replay_timer = None
+        # почтовый ящик на одно место: пришедшее поле затирает ещё не показанное
+        self._mailbox: Board | None = None
+        self.mirror_dropped = 0
+        self.local_busy = local_busy
+        self._mirror_frame_ms = int(1000 / max_fps)
+        self._since_refresh = QElapsedTimer()
+        self._since_refresh.start()
+        self._mirror_timer = QTimer(self)
+        self._mirror_timer.setSingleShot(True)
+        self._mirror_timer.timeout.connect(self._flush_mailbox)
         self._load_fonts()
         self._init_window()
         self._init_background()
@@ -55,8 +80,9 @@ class BoardView(QWidget):
         self._init_control_frames()
         self._init_settings_button()
         self._init_board_container()
-        self._init_grid()
+        self._init_canvas()
         self._init_digit_labels()
+        self._init_link_label()
 
         self.elapsed_seconds = 0
 
@@ -125,66 +151,39 @@ class BoardView(QWidget):
         frame.lower()
         self.board_container = frame
 
-    def _init_grid(self):
-        self.background_labels = []
-        for r in range(self.ROWS):
-            row_labels = []
-            for c in range(self.COLS):
-                lbl = QLabel(self)
-                lbl.setPixmap(
-                    QPixmap(self.BLOCK_IMAGES[(r + c) % 2])
-                    .scaled(self.CELL_SIZE, self.CELL_SIZE)
-                )
-                lbl.setGeometry(
-                    self.GRID_ORIGIN.x() + c * self.CELL_SIZE,
-                    self.GRID_ORIGIN.y() + r * self.CELL_SIZE,
-                    self.CELL_SIZE, self.CELL_SIZE
-                )
-                lbl.raise_()
-                row_labels.append(lbl)
-            self.background_labels.append(row_labels)
+    def _init_canvas(self):
+        # окно только показывает поле: ввода нет, сам виджет выключен
+        self.canvas = BoardCanvas(self, self.ROWS, self.COLS, self.CELL_SIZE, self.GRID_ORIGIN, self.BLOCK_IMAGES)
 
     def _init_digit_labels(self):
-        self.digit_labels = {'timer': [], 'score': []}
-
-    def _animate_fall(self, tile: TileLabel, target_row: int, finished=None):
-        start = tile.pos()
-        end = QPoint(start.x(),
-                     self.GRID_ORIGIN.y() + target_row * self.CELL_SIZE)
-
-        dist = end.y() - start.y()
-        dur = 100 + dist * 2
-        anim = QPropertyAnimation(tile, b'pos', self)
-        anim.setStartValue(start)
-        anim.setEndValue(end)
-        anim.setDuration(dur)
-        anim.setEasingCurve(QEasingCurve.OutBounce)
-
-        if finished:
-            anim.finished.connect(finished)
-        anim.start()
-        self.animations.append(anim)
+        self.digit_labels = {
+            'timer': DigitDisplay(self, 125, 95),
+            'score': DigitDisplay(self, 305, 95),
+        }
+
+    def _init_link_label(self):
+        self.link_label = QLabel(self)
+        self.link_label.setFont(QFont(self.font_family, 12))
+        self.link_label.setStyleSheet("color: #000;")
+        self.link_label.setAlignment(Qt.AlignCenter)
+        self.link_label.setGeometry(40, 240, 420, 30)
+        self.link_label.raise_()
+
+    def update_link(self, rtt: float | None, lag: float | None):
+        parts = []
+        if rtt is not None:
+            parts.append(f"Пинг: {rtt * 1000:.0f} мс")
+        if lag is not None:
+            parts.append(f"отставание: {lag * 1000:.0f} мс")
+        self.link_label.setText(" · ".join(parts))
 
     def display_number(self, kind, value, color: str = None, x=None, y=None):
-        _colors = ['blue', 'red', 'green', 'orange', 'purple', 'yellow']
         if color is None:
-            color = random.choice(_colors)
-        if x is None or y is None:
-            coords = {'timer': (125, 95), 'score': (305, 95)}
-            x, y = coords[kind]
-        for lbl in self.digit_labels[kind]:
-            lbl.deleteLater()
-        self.digit_labels[kind].clear()
-        for i, ch in enumerate(str(value)):
-            path = get_resource_path(f"assets/score/{color}/{ch}.png")
-            pix = QPixmap(path)
-            lbl = QLabel(self)
-            lbl.setPixmap(pix)
-            w, h = pix.width(), pix.height()
-            lbl.setGeometry(x + i * w, y, w, h)
-            lbl.raise_()
-            lbl.show()
-            self.digit_labels[kind].append(lbl)
+            color = random.choice(DIGIT_COLORS)
+        display = self.digit_labels[kind]
+        if x is not None and y is not None:
+            display.move(x, y)
+        display.show_number(value, color)
 
     def update_score(self, score: int):
         self.score = score
@@ -195,38 +194,86 @@ class BoardView(QWidget):
         self.display_number('timer', self.elapsed_seconds)
 
     def render_from_board(self, first=False):
-        for lbl in self.tile_labels.values():
-            lbl.deleteLater()
-        self.tile_labels.clear()
+        if not first:
+            self.canvas.sync_board(self.board)
+            return
+        self.canvas.clear_tiles()
 
         for r in range(self.ROWS):
             for c in range(self.COLS):
                 elem = self.board.cell(r, c)
-                pix = self._pix_for_elem(elem)
-                lbl = TileLabel(self, elem)
-                lbl.setPixmap(pix)
-                x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-                y = self.GRID_ORIGIN.y() + (-1 if first else r) * self.CELL_SIZE
-                lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-                lbl.raise_()
-                lbl.show()
-                self.tile_labels[(r, c)] = lbl
-                if first:
-                    self._animate_fall(lbl, r)
+                if elem is None:
+                    continue
+                tile = self.canvas.place_tile(elem, r, c, at_row=-1)
+                self.canvas.animate_fall(tile, r)
 
     def update_board(self, board: Board, first=False):
         self.board = board
         self.render_from_board(first)
 
-    def _pix_for_elem(self, elem):
-        if elem is None:
-            return None
-        root = "assets/elements"
-        if elem.bonus == Bonus.NONE:
-            img = f"{root}/{elem.color.value}.png"
-        elif elem.bonus == Bonus.BOMB:
-            img = f"{root}/bomb.png"
-        else:
-            axis = "h" if elem.bonus == Bonus.ROCKET_H else "v"
-            img = f"{root}/rocket_{axis}.png"
-        return QPixmap(get_resource_path(img)).scaled(self.CELL_SIZE, self.CELL_SIZE)
+    def post_board(self, board: Board):
+        if self._mailbox is not None:
+            self.mirror_dropped += 1
+        self._mailbox = board
+        if not self._mirror_timer.isActive():
+            self._mirror_timer.start(max(0, self._mirror_frame_ms - self._since_refresh.elapsed()))
+
+    def _flush_mailbox(self):
+        if self._mailbox is None:
+            return
+        waited = self._since_refresh.elapsed()
+        if (self.local_busy and self.local_busy()
+                and waited < self._mirror_frame_ms + self.MIRROR_MAX_DEFER_MS):
+            self._mirror_timer.start(self.MIRROR_POLL_MS)
+            return
+        board, self._mailbox = self._mailbox, None
+        self.update_board(board)
+        self._since_refresh.restart()
+
+    def play_replay(self, reader: ReplayReader, speed: float = 1.0, start: int = 0):
+        self.replay = reader
+        self.replay_speed = speed
+        self.setWindowTitle(f"Повтор: {reader.meta.get('nickname') or 'одиночная игра'}")
+        # у окна соперника закрытие отключено, повтор же смотрят отдельно
+        self.setWindowFlag(Qt.WindowCloseButtonHint, True)
+        self.update_board(reader.seek(start), True)
+        if self._replay_timer is None:
+            self._replay_timer = QTimer(self)
+            self._replay_timer.setSingleShot(True)
+            self._replay_timer.timeout.connect(self._replay_step)
+        self._show_replay_position()
+        self._schedule_replay()
+
+    def _schedule_replay(self):
+        pos = self.replay.position
+        if pos >= len(self.replay):
+            return
+        prev = self.replay.move(pos - 1).ms if pos else 0
+        pause = min((self.replay.move(pos).ms - prev) / 1000, self.REPLAY_MAX_PAUSE)
+        self._replay_timer.start(int(pause / self.replay_speed * 1000))
+
+    def _replay_step(self):
+        if self.replay.step() is None:
+            return
+        self.update_board(self.replay.board)
+        self._show_replay_position()
+        self._schedule_replay()
+
+    def _show_replay_position(self):
+        pos = self.replay.position
+        ms = self.replay.move(pos - 1).ms if pos else 0
+        self.tick_clock(ms // 1000)
+        text = f"Ход {pos} из {len(self.replay)}"
+        if pos >= len(self.replay):
+            text += " · конец записи"
+        if self.replay.mismatches and self.replay.mismatches[0] < pos:
+            text += " · расхождение с записью"
+        self.link_label.setText(text)
+
+    def closeEvent(self, event):
+        if self._replay_timer is not None:
+            self._replay_timer.stop()
+        self._mirror_timer.stop()
+        self._mailbox = None
+        self.canvas.stop_animations()
+        super().closeEvent(event)
@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import (
 )
 
 from GUI.game_window import GameWindow
+from GUI.net_bridge import NetBridge
 from core.audio_manager import AudioManager
 from core.server import Server
 from core.setting_deploy import get_resource_path
@@ -20,6 +21,7 @@ class CreateGameWindow(QDialog):
         super().__init__(parent)
         self.main_window = parent
         self.server = None
+        self.bridge = NetBridge(self)
         self.stop_event = threading.Event()
         self.selected_mode = None
         self.setWindowOpacity(0.0)
@@ -161,7 +163,8 @@ class CreateGameWindow(QDialog):
     def _on_generate(self):
         self.spin_time.setDisabled(True)
         self.server = Server(nickname=self.nick_edit.text(), mode=self.selected_mode,
-                             time=self.spin_time.value() if self.selected_mode == "time" else 999)
+                             time=self.spin_time.value() if self.selected_mode == "time" else 999,
+                             on_state=self.bridge.state_changed.emit)
         self.lbl_code.setText(f"Код доступа {self.server.session_code}")
         self.btn_generate.setVisible(False)
         self.players_list.show()
@@ -192,9 +195,9 @@ class CreateGameWindow(QDialog):
     def _on_start(self):
         audio.switch_to_game()
         logger.info("Начинаем игру")
-        self.server.gui = GameWindow(main_window=self.main_window)
-        self.server.gui.show()
-        self.server.gui.ctrl = self.server.ctrl
+        self.bridge.gui = GameWindow(main_window=self.main_window)
+        self.bridge.gui.show()
+        self.bridge.gui.ctrl = self.server.ctrl
         self.server.ctrl.new_game([self.server.nickname, *self.server.clients])
         self.accept()
         self.accept()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QLabel, QWidget
+
+from GUI.pixmap_cache import PixmapCache, DIGIT_COLORS, digit_asset
+
+# столько ячеек создаётся сразу; число длиннее добавит ячейки один раз и навсегда
+DIGIT_SLOTS = 4
+
+
+# счётчик из картинок-цифр: ячейки QLabel создаются один раз,
+# при обновлении в них лишь подставляются заранее загруженные картинки
+class DigitDisplay:
+    _glyphs: Dict[str, List[QPixmap]] = {}
+
+    @classmethod
+    def glyphs(cls, color: str) -> List[QPixmap]:
+        if not cls._glyphs:
+            cache = PixmapCache.instance()
+            for c in DIGIT_COLORS:
+                cls._glyphs[c] = [cache.get(digit_asset(c, str(d))) for d in range(10)]
+        return cls._glyphs[color]
+
+    def __init__(self, parent: QWidget, x: int, y: int):
+        self.parent = parent
+        self.x, self.y = x, y
+        self.slots: List[QLabel] = []
+        # что сейчас стоит в каждой ячейке: (цвет, цифра)
+        self._shown: List[Tuple[str, int] | None] = []
+        self._length = 0
+        for _ in range(DIGIT_SLOTS):
+            self._add_slot()
+
+    def _add_slot(self):
+        lbl = QLabel(self.parent)
+        lbl.hide()
+        lbl.raise_()
+        self.slots.append(lbl)
+        self._shown.append(None)
+
+    def move(self, x: int, y: int):
+        if (x, y) != (self.x, self.y):
+            self.x, self.y = x, y
+            self._shown = [None] * len(self.slots)
+
+    def show_number(self, value: int, color: str):
+        glyphs = self.glyphs(color)
+        text = str(value)
+        while len(self.slots) < len(text):
+            self._add_slot()
+        for i, ch in enumerate(text):
+            d = ord(ch) - 48
+            if self._shown[i] == (color, d):
+                continue
+            lbl = self.slots[i]
+            pix = glyphs[d]
+            lbl.setPixmap(pix)
+            w, h = pix.width(), pix.height()
+            lbl.setGeometry(self.x + i * w, self.y, w, h)
+            if self._shown[i] is None:
+                lbl.show()
+            self._shown[i] = (color, d)
+        for i in range(len(text), self._length):
+            self.slots[i].hide()
+            self._shown[i] = None
+        self._length = len(text)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Tuple
+
+from PyQt5.QtCore import QRect, Qt
+from PyQt5.QtGui import QImage, QPixmap, QPainter
+
+from core.enums import Color
+from core.setting_deploy import get_resource_path
+
+EXPLOSION_ROOT = "assets/elements/explosions"
+FRAME_COUNT = 60
+
+
+# все кадры взрыва одного цвета и размера в одной полосе: декодируются один раз на процесс,
+# каждый взрыв на BoardCanvas лишь рисует свой участок полосы
+class ExplosionAtlas:
+    _atlases: Dict[Tuple[str, int], ExplosionAtlas] = {}
+
+    @classmethod
+    def get(cls, name: str, size: int) -> ExplosionAtlas:
+        atlas = cls._atlases.get((name, size))
+        if atlas is None:
+            atlas = cls._atlases[(name, size)] = cls(name, size)
+        return atlas
+
+    @classmethod
+    def put(cls, name: str, size: int, sheet: QImage):
+        # полоса, собранная заранее (AssetLoader); QPixmap создаётся только в GUI-потоке
+        if (name, size) not in cls._atlases:
+            cls._atlases[(name, size)] = cls(name, size, QPixmap.fromImage(sheet))
+
+    @staticmethod
+    def atlas_names(cell_size: int) -> List[Tuple[str, int]]:
+        return [(color.value, cell_size) for color in Color] + [("bomb", cell_size * 2)]
+
+    def __init__(self, name: str, size: int, sheet: QPixmap | None = None):
+        self.size = size
+        self.sheet = sheet if sheet is not None else QPixmap.fromImage(self.render(name, size))
+
+    @classmethod
+    def render(cls, name: str, size: int) -> QImage:
+        # только QImage и QPainter по нему — можно вызывать из фонового потока
+        sheet = QImage(size * FRAME_COUNT, size, QImage.Format_ARGB32_Premultiplied)
+        sheet.fill(Qt.transparent)
+        painter = QPainter(sheet)
+        for i in range(FRAME_COUNT):
+            frame = QImage(cls._frame_path(name, i))
+            if not frame.isNull():
+                painter.drawImage(i * size, 0, frame.scaled(size, size))
+        painter.end()
+        return sheet
+
+    @staticmethod
+    def _frame_path(name: str, i: int) -> str:
+        # у цветных взрывов номера кадров двузначные (frame_00), у бомбы — нет (frame_0)
+        padded = get_resource_path(f"{EXPLOSION_ROOT}/{name}/frame_{i:02d}.png")
+        if os.path.exists(padded):
+            return padded
+        return get_resource_path(f"{EXPLOSION_ROOT}/{name}/frame_{i}.png")
+
+    def frame_rect(self, idx: int) -> QRect:
+        return QRect(idx * self.size, 0, self.size, self.size)
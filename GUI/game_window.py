@@ -1,26 +1,30 @@
 import random
 from typing import Set, Tuple, List
 
-from PyQt5.QtCore import QPoint, QSize, QPropertyAnimation, QEasingCurve, QParallelAnimationGroup, QTimer, Qt
+from PyQt5.QtCore import QPoint, QSize, QTimer, Qt
 from PyQt5.QtGui import QPixmap, QIcon, QFontDatabase, QFont
 from PyQt5.QtWidgets import (
     QLabel,
     QFrame, QPushButton, QMessageBox, QWidget
 )
 
+from GUI.board_canvas import BoardCanvas, Tile
 from GUI.board_view import BoardView
 from GUI.end_game_window import EndGameWindow
-from GUI.explosion_label import ExplosionLabel
+from GUI.digit_display import DigitDisplay
+from GUI.pixmap_cache import PixmapCache, DIGIT_COLORS
 from GUI.settings_window import SettingsWindow
-from GUI.tile_label import TileLabel
 from core.audio_manager import AudioManager
+from core import replay
 from core.board import Board
+from core.element import Element
 from core.enums import Bonus, Color
 from core.game_controller import GameController
 from core.setting_deploy import get_resource_path
 from logger import logger
 
 audio = AudioManager.instance()
+pixmaps = PixmapCache.instance()
 
 
 class GameWindow(QWidget):
@@ -39,8 +43,9 @@ class GameWindow(QWidget):
         name: get_resource_path(f"assets/elements/{name}.png")
         for name in ("orange", "purple", "red", "yellow")
     }
+    # пути для PixmapCache — относительно корня ресурсов
     BLOCK_IMAGES = [
-        get_resource_path(f"assets/block{i}.png")
+        f"assets/block{i}.png"
         for i in (1, 2)
     ]
 
@@ -49,8 +54,6 @@ class GameWindow(QWidget):
         self.solo_game = solo
         print(self.solo_game)
         self.end_game_window = None
-        self.pending_animations = 0
-        self._on_all_animations = None
         self.waiting_overlay = None
         self.opp_view = None
         self.old_b = None
@@ -59,9 +62,9 @@ class GameWindow(QWidget):
         self.main_window.hide()
         self.ctrl = ctrl
         self.board = None
-        self.animations = []
-        self.selected_tile = None
-        self.tile_labels = {}
+        # в сетевой игре поле пишет GameController, в одиночной — само окно
+        self.recorder = None
+        self._awaiting_outcome = False
 
         self._load_fonts()
         self._init_window()
@@ -70,10 +73,12 @@ class GameWindow(QWidget):
         self._init_control_frames()
         self._init_settings_button()
         self._init_board_container()
-        self._init_grid()
+        self._init_canvas()
         self._init_digit_labels()
         if self.solo_game:
-            self.board = Board()
+            seed = random.getrandbits(32)
+            self.board = Board(seed=seed)
+            self.recorder = replay.record_game(self.board, "solo", None, [], seed)
             self.render_from_board(first=True)
         self.elapsed_seconds = 0
 
@@ -148,49 +153,21 @@ class GameWindow(QWidget):
         frame.lower()
         self.board_container = frame
 
-    def _init_grid(self):
-        self.background_labels = []
-        for r in range(self.ROWS):
-            row_labels = []
-            for c in range(self.COLS):
-                lbl = QLabel(self)
-                lbl.setPixmap(
-                    QPixmap(self.BLOCK_IMAGES[(r + c) % 2])
-                    .scaled(self.CELL_SIZE, self.CELL_SIZE)
-                )
-                lbl.setGeometry(
-                    self.GRID_ORIGIN.x() + c * self.CELL_SIZE,
-                    self.GRID_ORIGIN.y() + r * self.CELL_SIZE,
-                    self.CELL_SIZE, self.CELL_SIZE
-                )
-                lbl.raise_()
-                row_labels.append(lbl)
-            self.background_labels.append(row_labels)
+    def _init_canvas(self):
+        # клетки, плитки и взрывы рисует один виджет; плитки — в self.canvas.tiles
+        self.canvas = BoardCanvas(self, self.ROWS, self.COLS, self.CELL_SIZE, self.GRID_ORIGIN,
+                                  self.BLOCK_IMAGES, on_swap=self.handle_swap_request)
 
     def _init_digit_labels(self):
-        self.digit_labels = {'timer': [], 'score': []}
-
-    def _animate_fall(self, tile: TileLabel, target_row: int, finished=None):
-        start = tile.pos()
-        end = QPoint(start.x(),
-                     self.GRID_ORIGIN.y() + target_row * self.CELL_SIZE)
-
-        dist = end.y() - start.y()
-        dur = 100 + dist * 2
-        anim = QPropertyAnimation(tile, b'pos', self)
-        anim.setStartValue(start)
-        anim.setEndValue(end)
-        anim.setDuration(dur)
-        anim.setEasingCurve(QEasingCurve.OutBounce)
-        self.pending_animations += 1
-        if finished:
-            anim.finished.connect(finished)
-            self.pending_animations -= 1
-            self._check_animations_done()
-        anim.start()
-        self.animations.append(anim)
-
-    def handle_swap_request(self, a_lbl: TileLabel, b_lbl: TileLabel):
+        self.digit_labels = {
+            'timer': DigitDisplay(self, 125, 95),
+            'score': DigitDisplay(self, 305, 95),
+        }
+
+    def _animate_fall(self, tile: Tile, target_row: int, finished=None):
+        self.canvas.animate_fall(tile, target_row, finished)
+
+    def handle_swap_request(self, a_lbl: Tile, b_lbl: Tile):
         if self.solo_game:
             pass
         else:
@@ -198,6 +175,21 @@ class GameWindow(QWidget):
                 return
         if abs(a_lbl.row - b_lbl.row) + abs(a_lbl.col - b_lbl.col) != 1:
             return
+        if not self.solo_game and self.ctrl.authoritative:
+            # каскад посчитает сервер, ждём outcome
+            if self._awaiting_outcome:
+                return
+            self._awaiting_outcome = True
+            audio.play_sound("swap")
+            self.ctrl.swap_intent((a_lbl.row, a_lbl.col), (b_lbl.row, b_lbl.col))
+            return
+        if not self.solo_game and self.ctrl.lockstep:
+            # сопернику уходит только обмен, каскад он посчитает сам
+            audio.play_sound("swap")
+            result = self.ctrl.play_move((a_lbl.row, a_lbl.col), (b_lbl.row, b_lbl.col))
+            self._animate_swap(a_lbl, b_lbl,
+                               lambda: self._play_outcome(a_lbl, b_lbl, result))
+            return
         audio.play_sound("swap")
         self.old_a = (a_lbl.row, a_lbl.col)
         self.old_b = (b_lbl.row, b_lbl.col)
@@ -220,20 +212,13 @@ class GameWindow(QWidget):
         if not bonuses and removed:
             self._update_score(len(removed))
             for r, c in removed:
-                lbl = self.tile_labels.pop((r, c), None)
-
-                if lbl and lbl.element.bonus in [Bonus.ROCKET_H, Bonus.ROCKET_V]:
-                    self._fire_rocket(r, c, lbl.element.bonus)
-                    lbl.deleteLater()
-                elif lbl:
-                    explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100,
-                                               bonus=lbl.element.bonus)
-
-                    lbl.deleteLater()
+                tile = self.canvas.remove_tile(r, c)
 
-                    explosion.raise_()
-                    explosion.show()
-                    if lbl.element.bonus == Bonus.BOMB:
+                if tile and tile.element.bonus in [Bonus.ROCKET_H, Bonus.ROCKET_V]:
+                    self.canvas.fire_rocket(r, c, tile.element.bonus)
+                elif tile:
+                    self.canvas.explode(tile.element.color.value, tile.pos(), tile.element.bonus)
+                    if tile.element.bonus == Bonus.BOMB:
                         audio.play_sound("boom")
                     else:
                         audio.play_sound("removed")
@@ -242,29 +227,15 @@ class GameWindow(QWidget):
 
         self._update_score(len(removed))
         for r, c in removed:
-            lbl = self.tile_labels.pop((r, c), None)
-            if not lbl:
+            tile = self.canvas.remove_tile(r, c)
+            if not tile:
                 continue
 
-            explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100)
-
-            lbl.deleteLater()
-
-            explosion.raise_()
-            explosion.show()
+            self.canvas.explode(tile.element.color.value, tile.pos())
             audio.play_sound("removed")
 
         for r, c, bonus in bonuses:
-            elem = self.board.cell(r, c)
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-            x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() + r * self.CELL_SIZE
-            lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-            self.tile_labels[(r, c)] = lbl
+            self.canvas.place_tile(self.board.cell(r, c), r, c)
             audio.play_sound("add_bonus")
 
         self._update_game()
@@ -272,43 +243,22 @@ class GameWindow(QWidget):
     def _update_game(self):
         fallen, spawned = self.board.collapse_and_fill()
 
-        fallen_to_send: list[Tuple[int, int, int, int]] = []
-
-        for elem, new_r, new_c in fallen:
-            for lbl in self.tile_labels.values():
-                if lbl.element is elem:
-                    fallen_to_send.append((lbl.row, lbl.col, new_r, new_c))
-                    break
+        falls = self._match_fallen(fallen)
+        fallen_to_send: list[Tuple[int, int, int, int]] = [
+            (tile.row, tile.col, new_r, new_c) for tile, new_r, new_c in falls
+        ]
         if not self.solo_game:
             if self.ctrl.mode == "chess":
                 self.ctrl.auto_swap(fallen=fallen_to_send, spawned=spawned)
 
-        for elem, new_r, new_c in fallen:
-            for lbl in self.tile_labels.values():
-                if lbl.element is elem:
-                    print(f"elem {elem}")
-                    print(f"lbl row {lbl.row}  lbl col {lbl.col}")
-                    lbl.row, lbl.col = new_r, new_c
-                    self.tile_labels.pop((elem.y, elem.x), None)  # до смены координат
-                    self.tile_labels[(new_r, new_c)] = lbl
-                    self._animate_fall(lbl, new_r)
-                    audio.play_sound("falling")
-                    break
+        for tile, new_r, new_c in falls:
+            self.canvas.move_tile(tile, new_r, new_c)
+            self._animate_fall(tile, new_r)
+            audio.play_sound("falling")
         for elem in spawned:
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-
-            x = self.GRID_ORIGIN.x() + elem.y * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() - elem.x * self.CELL_SIZE
-            print(f"x {x} y {y}")
-            lbl.setGeometry(x, y,
-                            self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-
-            self.tile_labels[(elem.x, elem.y)] = lbl
-            self._animate_fall(lbl, elem.x)
+            # у новых элементов x — строка, y — столбец
+            tile = self.canvas.place_tile(elem, elem.x, elem.y, at_row=-elem.x)
+            self._animate_fall(tile, elem.x)
             audio.play_sound("falling")
         if not self.solo_game:
             if self.ctrl.mode == "time":
@@ -318,182 +268,74 @@ class GameWindow(QWidget):
         while self.board.step():
             removed, bonuses = self.board.get_auto_matched()
             for r, c in removed:
-                lbl = self.tile_labels.pop((r, c), None)
-                if not lbl:
+                tile = self.canvas.remove_tile(r, c)
+                if not tile:
                     continue
 
-                explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100)
-
-                lbl.deleteLater()
-
-                explosion.raise_()
-                explosion.show()
+                self.canvas.explode(tile.element.color.value, tile.pos())
                 audio.play_sound("removed")
 
             for r, c, bonus in bonuses:
-                elem = self.board.cell(r, c)
-                lbl = TileLabel(self, elem)
-                pix = self._pix_for_elem(elem)
-                lbl.setPixmap(pix)
-                x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-                y = self.GRID_ORIGIN.y() + r * self.CELL_SIZE
-                lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-                lbl.raise_()
-                lbl.show()
-                self.tile_labels[(r, c)] = lbl
+                self.canvas.place_tile(self.board.cell(r, c), r, c)
                 audio.play_sound("add_bonus")
 
             fallen, spawned = self.board.collapse_and_fill()
-            fallen_to_send: list[Tuple[int, int, int, int]] = []
-
-            for elem, new_r, new_c in fallen:
-                for lbl in self.tile_labels.values():
-                    if lbl.element is elem:
-                        fallen_to_send.append((lbl.row, lbl.col, new_r, new_c))
-                        break
+            falls = self._match_fallen(fallen)
+            fallen_to_send: list[Tuple[int, int, int, int]] = [
+                (tile.row, tile.col, new_r, new_c) for tile, new_r, new_c in falls
+            ]
 
             if not self.solo_game:
                 if self.ctrl.mode == "chess":
                     self.ctrl.auto_swap_circle(fallen=fallen_to_send, spawned=spawned, bonuses=bonuses, removed=removed)
 
-            for elem, new_r, new_c in fallen:
-                for lbl in self.tile_labels.values():
-                    if lbl.element is elem:
-                        lbl.row, lbl.col = new_r, new_c
-                        self.tile_labels.pop((elem.y, elem.x), None)  # до смены координат
-                        self.tile_labels[(new_r, new_c)] = lbl
-                        self._animate_fall(lbl, new_r)
-                        audio.play_sound("falling")
-                        break
+            for tile, new_r, new_c in falls:
+                self.canvas.move_tile(tile, new_r, new_c)
+                self._animate_fall(tile, new_r)
+                audio.play_sound("falling")
 
             for elem in spawned:
-                lbl = TileLabel(self, elem)
-                pix = self._pix_for_elem(elem)
-                lbl.setPixmap(pix)
-
-                x = self.GRID_ORIGIN.x() + elem.y * self.CELL_SIZE
-                y = self.GRID_ORIGIN.y() - elem.x * self.CELL_SIZE
-                lbl.setGeometry(x, y,
-                                self.CELL_SIZE, self.CELL_SIZE)
-                lbl.raise_()
-                lbl.show()
-
-                self.tile_labels[(elem.x, elem.y)] = lbl
-                self._animate_fall(lbl, elem.x)
+                # у новых элементов x — строка, y — столбец
+                tile = self.canvas.place_tile(elem, elem.x, elem.y, at_row=-elem.x)
+                self._animate_fall(tile, elem.x)
                 audio.play_sound("falling")
             if not self.solo_game:
                 if self.ctrl.mode == "time":
                     self.ctrl.board = self.board
                     self.ctrl.board_update_for_opp()
 
-    def _animate_swap(self, t1: TileLabel, t2: TileLabel, on_finished=None):
-        group = QParallelAnimationGroup(self)
-        for tile, end in ((t1, t2.pos()), (t2, t1.pos())):
-            anim = QPropertyAnimation(tile, b'pos', self)
-            anim.setDuration(150)
-            anim.setEndValue(end)
-            anim.setEasingCurve(QEasingCurve.InOutQuad)
-            group.addAnimation(anim)
-
-        self.pending_animations += 1
+    def _match_fallen(self, fallen) -> list[Tuple[Tile, int, int]]:
+        # плитки упавших элементов — по индексу холста, за один проход
+        falls = []
+        for elem, new_r, new_c in fallen:
+            tile = self.canvas.tile_for(elem)
+            if tile is not None:
+                falls.append((tile, new_r, new_c))
+        return falls
 
+    def _animate_swap(self, t1: Tile, t2: Tile, on_finished=None):
         def _after_anim():
-            self._swap_tiles(t1, t2)
+            self.canvas.swap_tiles(t1, t2)
             if on_finished:
                 on_finished()
-            self.pending_animations -= 1
-            self._check_animations_done()
-
-        group.finished.connect(_after_anim)
-        group.start()
-        self.animations.append(group)
-        # чистим уже закончившиеся
-        self.animations = [g for g in self.animations if g.state() != QPropertyAnimation.Stopped]
-
-    def _pix_for_elem(self, elem):
-        if elem is None:
-            return None
-        root = "assets/elements"
-        if elem.bonus == Bonus.NONE:
-            img = f"{root}/{elem.color.value}.png"
-        elif elem.bonus == Bonus.BOMB:
-            img = f"{root}/bomb.png"
-        else:
-            axis = "h" if elem.bonus == Bonus.ROCKET_H else "v"
-            img = f"{root}/rocket_{axis}.png"
-        return QPixmap(get_resource_path(img)).scaled(self.CELL_SIZE, self.CELL_SIZE)
+
+        self.canvas.animate_swap(t1, t2, _after_anim)
 
     def render_from_board(self, first=False):
-        for lbl in self.tile_labels.values():
-            lbl.deleteLater()
-        self.tile_labels.clear()
+        if not first:
+            if self.canvas.sync_board(self.board):
+                audio.play_sound("falling", 1)
+            return
+        self.canvas.clear_tiles()
 
         for r in range(self.ROWS):
             for c in range(self.COLS):
                 elem = self.board.cell(r, c)
-                pix = self._pix_for_elem(elem)
-                lbl = TileLabel(self, elem)
+                if elem is None:
+                    continue
+                tile = self.canvas.place_tile(elem, r, c, at_row=-1)
                 audio.play_sound("falling", 1)
-                lbl.setPixmap(pix)
-                x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-                y = self.GRID_ORIGIN.y() + (-1 if first else r) * self.CELL_SIZE
-                lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-                lbl.raise_()
-                lbl.show()
-                self.tile_labels[(r, c)] = lbl
-                if first:
-                    self._animate_fall(lbl, r)
-
-    def _swap_tiles(self, tile1: TileLabel, tile2: TileLabel):
-        r1, c1 = tile1.row, tile1.col
-        r2, c2 = tile2.row, tile2.col
-
-        tile1.row, tile1.col, tile2.row, tile2.col = r2, c2, r1, c1
-
-        self.tile_labels.pop((r1, c1), None)
-        self.tile_labels.pop((r2, c2), None)
-        self.tile_labels[(tile1.row, tile1.col)] = tile1
-        self.tile_labels[(tile2.row, tile2.col)] = tile2
-
-    def _fire_rocket(self, r: int, c: int, orientation: Bonus):
-        rocket_img = "rocket_h.png" if orientation == Bonus.ROCKET_H else "rocket_v.png"
-        rocket_lbl = QLabel(self)
-        pix = QPixmap(get_resource_path(f"assets/elements/{rocket_img}")) \
-            .scaled(self.CELL_SIZE, self.CELL_SIZE)
-        rocket_lbl.setPixmap(pix)
-        start_x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-        start_y = self.GRID_ORIGIN.y() + r * self.CELL_SIZE
-        rocket_lbl.setGeometry(start_x, start_y, self.CELL_SIZE, self.CELL_SIZE)
-        rocket_lbl.show()
-        rocket_lbl.raise_()
-
-        anim = QPropertyAnimation(rocket_lbl, b"pos", self)
-        anim.setDuration(100)
-        anim.setEasingCurve(QEasingCurve.InQuad)
-        if orientation == Bonus.ROCKET_H:
-            end_x = self.GRID_ORIGIN.x()
-            anim.setStartValue(QPoint(start_x, start_y))
-            anim.setEndValue(QPoint(end_x, start_y))
-        else:
-            end_y = self.GRID_ORIGIN.y()
-            audio.play_sound("rocket")
-            anim.setStartValue(QPoint(start_x, start_y))
-            anim.setEndValue(QPoint(start_x, end_y))
-
-        def _on_rocket_done():
-            rocket_lbl.deleteLater()
-
-            explosion = ExplosionLabel(
-                parent=self,
-                color=Color.RED.value,
-                pos=rocket_lbl.pos(),
-                size=self.CELL_SIZE,
-                fps=100,
-                bonus=Bonus.NONE
-            )
-
-        anim.finished.connect(_on_rocket_done)
-        anim.start()
+                self._animate_fall(tile, r)
 
     def _update_score(self, score: int):
         self.score += score
@@ -509,25 +351,12 @@ class GameWindow(QWidget):
 
     def display_number(self, kind, value, color: str = None, x=None, y=None):
         value = 999 if value > 999 else value
-        _colors = ['blue', 'red', 'green', 'orange', 'purple', 'yellow']
         if color is None:
-            color = random.choice(_colors)
-        if x is None or y is None:
-            coords = {'timer': (125, 95), 'score': (305, 95)}
-            x, y = coords[kind]
-        for lbl in self.digit_labels[kind]:
-            lbl.deleteLater()
-        self.digit_labels[kind].clear()
-        for i, ch in enumerate(str(value)):
-            path = get_resource_path(f"assets/score/{color}/{ch}.png")
-            pix = QPixmap(path)
-            lbl = QLabel(self)
-            lbl.setPixmap(pix)
-            w, h = pix.width(), pix.height()
-            lbl.setGeometry(x + i * w, y, w, h)
-            lbl.raise_()
-            lbl.show()
-            self.digit_labels[kind].append(lbl)
+            color = random.choice(DIGIT_COLORS)
+        display = self.digit_labels[kind]
+        if x is not None and y is not None:
+            display.move(x, y)
+        display.show_number(value, color)
 
     def _open_settings(self):
         if hasattr(self, "_settings") and self._settings.isVisible():
@@ -577,13 +406,18 @@ class GameWindow(QWidget):
             self.render_from_board(first=True)
 
             if self.ctrl.mode == "time":
-                self.opp_view = BoardView()
+                # своё поле важнее: зеркало соперника ждёт, пока наши анимации не закончатся
+                self.opp_view = BoardView(local_busy=self.canvas.busy)
                 self.opp_view.show()
                 self.opp_view.update_board(self.board, True)
         elif command == "board":
-            self.opp_view.update_board(self.ctrl.opp_board)
+            self.opp_view.post_board(self.ctrl.opp_board)
         elif command == "time":
             self.opp_view.tick_clock(self.ctrl.opp_time)
+            self.opp_view.update_link(self.ctrl.rtt, self.ctrl.opp_lag)
+        elif command == "link":
+            if self.opp_view:
+                self.opp_view.update_link(self.ctrl.rtt, self.ctrl.opp_lag)
         elif command == "score":
             self.opp_view.update_score(self.ctrl.opp_score)
         elif command == "swap":
@@ -597,24 +431,32 @@ class GameWindow(QWidget):
             success = self.ctrl.success
             removed = self.ctrl.removed
             bonuses = self.ctrl.bonuses
-            a_tile = None
-            b_tile = None
-            for lbl in self.tile_labels.values():
-                if lbl.row == a_row and lbl.col == a_col:
-                    a_tile = lbl
-                elif lbl.row == b_row and lbl.col == b_col:
-                    b_tile = lbl
-                if a_tile and b_tile:
-                    break
+            a_tile = self.canvas.tiles.get((a_row, a_col))
+            b_tile = self.canvas.tiles.get((b_row, b_col))
 
             if a_tile and b_tile:
                 self.handle_swap_request_my_swap(a_tile, b_tile, success=success, removed=removed, bonuses=bonuses)
             else:
-                logger.warning(f"Не нашли соответствующие TileLabel для network step")
+                logger.warning(f"Не нашли соответствующие плитки для network step")
         elif command == "auto_swap":
             self.auto_swap()
         elif command == "auto_swap_circle":
             self.auto_swap_circle()
+        elif command == "outcome":
+            self.apply_outcome()
+        elif command == "resync":
+            self.ctrl.apply_board_message()
+            self.run_after_animations(lambda: self.render_from_board())
+        elif command == "peer":
+            if self.ctrl.away_player:
+                self._show_waiting_overlay(f"Игрок {self.ctrl.away_player} потерял связь,\nждём его возвращения…")
+            else:
+                self._hide_waiting_overlay()
+        elif command == "reconnecting":
+            if self.ctrl.reconnecting:
+                self._show_waiting_overlay("Связь с сервером потеряна,\nпереподключаемся…")
+            else:
+                self._hide_waiting_overlay()
         elif command == "end_game":
             if self.waiting_overlay:
                 self.waiting_overlay.close()
@@ -636,7 +478,7 @@ class GameWindow(QWidget):
                 self.end_game_window.close()
             self.close()
 
-    def handle_swap_request_my_swap(self, a_lbl: TileLabel, b_lbl: TileLabel, success: bool,
+    def handle_swap_request_my_swap(self, a_lbl: Tile, b_lbl: Tile, success: bool,
                                     removed: Set[Tuple[int, int]], bonuses: List[Tuple[int, int, Bonus]]):
         if abs(a_lbl.row - b_lbl.row) + abs(a_lbl.col - b_lbl.col) != 1:
             return
@@ -655,19 +497,12 @@ class GameWindow(QWidget):
         if not bonuses and removed:
             self._update_score(len(removed))
             for r, c in removed:
-                lbl = self.tile_labels.pop((r, c), None)
-                if lbl and lbl.element.bonus in [Bonus.ROCKET_H, Bonus.ROCKET_V]:
-                    self._fire_rocket(r, c, lbl.element.bonus)
-                    lbl.deleteLater()
-                elif lbl:
-                    explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100,
-                                               bonus=lbl.element.bonus)
-
-                    lbl.deleteLater()
-
-                    explosion.raise_()
-                    explosion.show()
-                    if lbl.element.bonus == Bonus.BOMB:
+                tile = self.canvas.remove_tile(r, c)
+                if tile and tile.element.bonus in [Bonus.ROCKET_H, Bonus.ROCKET_V]:
+                    self.canvas.fire_rocket(r, c, tile.element.bonus)
+                elif tile:
+                    self.canvas.explode(tile.element.color.value, tile.pos(), tile.element.bonus)
+                    if tile.element.bonus == Bonus.BOMB:
                         audio.play_sound("boom")
                     else:
                         audio.play_sound("removed")
@@ -680,82 +515,108 @@ class GameWindow(QWidget):
         self.board = self.ctrl.board
         self._update_score(len(removed))
         for r, c in removed:
-            lbl = self.tile_labels.pop((r, c), None)
-            if not lbl:
+            tile = self.canvas.remove_tile(r, c)
+            if not tile:
                 continue
 
-            explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100)
-
-            lbl.deleteLater()
-
-            explosion.raise_()
-            explosion.show()
+            self.canvas.explode(tile.element.color.value, tile.pos())
             audio.play_sound("removed")
 
         for bonus in bonuses:
             r = bonus["r"]
             c = bonus["c"]
-            elem = self.board.cell(r, c)
-            print(elem)
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-            x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() + r * self.CELL_SIZE
-            lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-            self.tile_labels[(r, c)] = lbl
+            self.canvas.place_tile(self.board.cell(r, c), r, c)
             audio.play_sound("add_bonus")
 
-    def print_matrix(self):
-        lines: List[str] = []
-        for r in range(self.ROWS):
-            row_chars: List[str] = []
-            for c in range(self.COLS):
-                lbl = self.tile_labels.get((r, c))
-                if lbl and lbl.element and lbl.element.color:
-                    char = lbl.element.color.name[0]
-                else:
-                    char = '.'
-                row_chars.append(char)
-            lines.append(' '.join(row_chars))
-        print('\n'.join(lines))
+    def apply_outcome(self):
+        if self.ctrl.lockstep:
+            # ход соперника применяем к полю здесь, в GUI-потоке
+            self.ctrl.apply_board_message()
+        a, b = self.ctrl.move_cells
+        result = self.ctrl.move_result
+        a_tile = self.canvas.tiles.get(a)
+        b_tile = self.canvas.tiles.get(b)
+        if not a_tile or not b_tile:
+            logger.warning(f"Не нашли плитки для outcome {a} {b}")
+            self._awaiting_outcome = False
+            self.ctrl.update_board()
+            self.board = self.ctrl.board
+            self.render_from_board()
+            return
+        audio.play_sound("swap")
+        self._animate_swap(a_tile, b_tile,
+                           lambda: self._play_outcome(a_tile, b_tile, result))
+
+    def _play_outcome(self, a_tile: Tile, b_tile: Tile, result):
+        self._awaiting_outcome = False
+        if not result.success:
+            self._animate_swap(a_tile, b_tile, on_finished=None)
+            return
+
+        audio.play_sound("nice_swap")
+        for i, step in enumerate(result.steps):
+            # цвет бонуса берём у плитки, которая стоит на его месте до удаления
+            new_bonuses = []
+            for r, c, bonus in step.bonuses:
+                base = self.canvas.tiles.get((r, c))
+                color = base.element.color if base else Color.RED
+                new_bonuses.append(Element(r, c, color, bonus))
+            self._explode_cells(step.removed, fire_bonuses=(i == 0 and not step.bonuses))
+            for elem in new_bonuses:
+                self.canvas.place_tile(elem, elem.x, elem.y)
+                audio.play_sound("add_bonus")
+            for old_r, old_c, new_r, new_c in step.fallen:
+                tile = self.canvas.tiles.get((old_r, old_c))
+                if not tile:
+                    continue
+                self.canvas.move_tile(tile, new_r, new_c)
+                self._animate_fall(tile, new_r)
+                audio.play_sound("falling")
+            for r, c, color in step.spawned:
+                tile = self.canvas.place_tile(Element(r, c, color), r, c, at_row=-r)
+                self._animate_fall(tile, r)
+                audio.play_sound("falling")
+
+        self.ctrl.update_board()
+        self.board = self.ctrl.board
+        if self.ctrl.authoritative:
+            my_score = self.ctrl.scores.get(self.ctrl.my_nickname, self.score)
+            if my_score != self.score:
+                self._update_score(my_score - self.score)
+        else:
+            self._update_score(len(result.steps[0].removed))
+        self.run_after_animations(lambda: self.render_from_board())
+
+    def _explode_cells(self, cells, fire_bonuses: bool):
+        for r, c in cells:
+            tile = self.canvas.remove_tile(r, c)
+            if not tile:
+                continue
+            bonus = tile.element.bonus
+            if fire_bonuses and bonus in (Bonus.ROCKET_H, Bonus.ROCKET_V):
+                self.canvas.fire_rocket(r, c, bonus)
+            else:
+                self.canvas.explode(tile.element.color.value, tile.pos(),
+                                    bonus if fire_bonuses else Bonus.NONE)
+                audio.play_sound("boom" if fire_bonuses and bonus == Bonus.BOMB else "removed")
 
     def auto_swap(self):
         self.ctrl.update_board()
         self.board = self.ctrl.board
         fallen, spawned = self.ctrl.fallen, self.ctrl.spawned
-        print(f"fallen {fallen}")
-        print("\n\n\n----------my board:-----------\n\n\n\n")
-        print(self.board)
-        print("\n\n\n----------self.tile_labels-----------\n\n\n\n")
-        self.print_matrix()
 
         for old_r, old_c, new_r, new_c in fallen:
-            lbl = self.tile_labels.pop((old_r, old_c), None)
-            if not lbl:
+            tile = self.canvas.tiles.get((old_r, old_c))
+            if not tile:
                 continue
-            lbl.row, lbl.col = new_r, new_c
-            self.tile_labels[(new_r, new_c)] = lbl
-            self._animate_fall(lbl, new_r)
+            self.canvas.move_tile(tile, new_r, new_c)
+            self._animate_fall(tile, new_r)
             audio.play_sound("falling")
 
         for elem in spawned:
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-
-            x = self.GRID_ORIGIN.x() + elem.y * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() - elem.x * self.CELL_SIZE
-            print(f"x {x} y {y}")
-            lbl.setGeometry(x, y,
-                            self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-
-            self.tile_labels[(elem.x, elem.y)] = lbl
-            self._animate_fall(lbl, elem.x)
+            # у новых элементов x — строка, y — столбец
+            tile = self.canvas.place_tile(elem, elem.x, elem.y, at_row=-elem.x)
+            self._animate_fall(tile, elem.x)
             audio.play_sound("falling")
 
         self.run_after_animations(lambda: self.render_from_board())
@@ -768,54 +629,29 @@ class GameWindow(QWidget):
         bonuses = self.ctrl.bonuses
 
         for r, c in removed:
-            lbl = self.tile_labels.pop((r, c), None)
-            if not lbl:
+            tile = self.canvas.remove_tile(r, c)
+            if not tile:
                 continue
 
-            explosion = ExplosionLabel(self, lbl.element.color.value, lbl.pos(), self.CELL_SIZE, fps=100)
-
-            lbl.deleteLater()
-
-            explosion.raise_()
-            explosion.show()
+            self.canvas.explode(tile.element.color.value, tile.pos())
             audio.play_sound("removed")
 
         for r, c, bonus in bonuses:
-            elem = self.board.cell(r, c)
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-            x = self.GRID_ORIGIN.x() + c * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() + r * self.CELL_SIZE
-            lbl.setGeometry(x, y, self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-            self.tile_labels[(r, c)] = lbl
+            self.canvas.place_tile(self.board.cell(r, c), r, c)
             audio.play_sound("add_bonus")
 
         for old_r, old_c, new_r, new_c in fallen:
-            lbl = self.tile_labels.pop((old_r, old_c), None)
-            if not lbl:
+            tile = self.canvas.tiles.get((old_r, old_c))
+            if not tile:
                 continue
-            lbl.row, lbl.col = new_r, new_c
-            self.tile_labels[(new_r, new_c)] = lbl
-            self._animate_fall(lbl, new_r)
+            self.canvas.move_tile(tile, new_r, new_c)
+            self._animate_fall(tile, new_r)
             audio.play_sound("falling")
 
         for elem in spawned:
-            lbl = TileLabel(self, elem)
-            pix = self._pix_for_elem(elem)
-            lbl.setPixmap(pix)
-
-            x = self.GRID_ORIGIN.x() + elem.y * self.CELL_SIZE
-            y = self.GRID_ORIGIN.y() - elem.x * self.CELL_SIZE
-            lbl.setGeometry(x, y,
-                            self.CELL_SIZE, self.CELL_SIZE)
-            lbl.raise_()
-            lbl.show()
-
-            self.tile_labels[(elem.x, elem.y)] = lbl
-            self._animate_fall(lbl, elem.x)
+            # у новых элементов x — строка, y — столбец
+            tile = self.canvas.place_tile(elem, elem.x, elem.y, at_row=-elem.x)
+            self._animate_fall(tile, elem.x)
             audio.play_sound("falling")
 
         self.run_after_animations(lambda: self.render_from_board())
@@ -826,6 +662,10 @@ class GameWindow(QWidget):
             event.ignore()
             return
 
+        if self.recorder is not None:
+            self.recorder.close()
+        self.canvas.stop_animations()
+        logger.info(f"Кэш картинок: {pixmaps.stats()}")
         super().closeEvent(event)
 
     def _show_waiting_overlay(self, text: str):
@@ -836,26 +676,25 @@ class GameWindow(QWidget):
                 'background: rgba(0,0,0,0.5); color: white; font-size: 24px;'
             )
             self.waiting_overlay.setGeometry(0, 0, self.width(), self.height())
+        self.waiting_overlay.setText(text)
         self.waiting_overlay.show()
         self.setEnabled(False)
 
-    def _check_animations_done(self):
-        if self.pending_animations == 0 and self._on_all_animations:
-            cb = self._on_all_animations
-            self._on_all_animations = None
-            cb()
+    def _hide_waiting_overlay(self):
+        if self.waiting_overlay:
+            self.waiting_overlay.hide()
+        self.setEnabled(True)
 
     def run_after_animations(self, callback):
-        if self.pending_animations > 0:
-            self._on_all_animations = callback
-        else:
-            callback()
+        # падения и обмены считает общий планировщик анимаций
+        self.canvas.when_idle(callback)
 
     def _on_settings_home(self):
         self._clock_timer.stop()
         if self.main_window:
             self.main_window.show()
-        self.ctrl.close_game()
+        if not self.solo_game:
+            self.ctrl.close_game()
         if self.opp_view:
             self.opp_view.close()
         if self.end_game_window:
@@ -1,14 +1,18 @@
 import threading
+import time
 
 from PyQt5.QtCore import Qt, QSize, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QIcon, QFont, QFontDatabase, QPixmap
 from PyQt5.QtWidgets import (
-    QDialog, QLabel, QLineEdit, QPushButton
+    QDialog, QLabel, QLineEdit, QPushButton, QListWidget, QListWidgetItem
 )
 
 from GUI.game_window import GameWindow
+from GUI.net_bridge import NetBridge
+from GUI.spectator_window import SpectatorWindow
 from core.audio_manager import AudioManager
 from core.client import Client
+from core.discovery import discover
 from core.setting_deploy import get_resource_path
 from logger import logger
 
@@ -21,6 +25,9 @@ class JoinGameWindow(QDialog):
         self.main_window = parent
         self.client = None
         self.server = None
+        self.bridge = NetBridge(self)
+        self.bridge.started.connect(self.start_game)
+        self.bridge.room_found.connect(self._on_room_found)
         self.stop_event = threading.Event()
         self.selected_mode = None
         self.setWindowOpacity(0.0)
@@ -89,18 +96,66 @@ class JoinGameWindow(QDialog):
 
         self.join_button = QPushButton("Присоединится к игре", self)
         self.join_button.setFont(QFont(self.font, 14))
-        self.join_button.setGeometry(50, 280, 300, 40)
+        self.join_button.setGeometry(50, 280, 200, 40)
         self.join_button.setStyleSheet(
             "background-color: rgb(254,243,219); border:2px solid #af5829; border-radius:6px;"
         )
         self.join_button.clicked.connect(self.join_game)
         self.join_button.hide()
 
+        # зритель подключается и к уже идущей партии
+        self.watch_button = QPushButton("Смотреть", self)
+        self.watch_button.setFont(QFont(self.font, 14))
+        self.watch_button.setGeometry(255, 280, 95, 40)
+        self.watch_button.setStyleSheet(
+            "background-color: rgb(254,243,219); border:2px solid #af5829; border-radius:6px;"
+        )
+        self.watch_button.clicked.connect(lambda: self.join_game(spectator=True))
+        self.watch_button.hide()
+
+        # игры в локальной сети: появляются по мере ответов серверов
+        self.rooms_list = QListWidget(self)
+        self.rooms_list.setFont(QFont(self.font, 12))
+        self.rooms_list.setStyleSheet(
+            "background-color: rgb(254,243,219); border:2px solid #af5829; border-radius:6px;"
+        )
+        self.rooms_list.setGeometry(50, 330, 300, 80)
+        self.rooms_list.itemClicked.connect(self._on_room_clicked)
+        self.rooms_list.hide()
+
         self.status_label = QLabel("", self)
         self.status_label.setFont(QFont(self.font, 14))
-        self.status_label.setGeometry(50, 340, 300, 80)
+        self.status_label.setGeometry(50, 415, 300, 75)
         self.status_label.setVisible(False)
         self._animate_show()
+        threading.Thread(target=self._browse_rooms, daemon=True).start()
+
+    def _browse_rooms(self):
+        # пока окно открыто, опрашиваем сеть раз в пару секунд
+        while not self.stop_event.is_set():
+            discover(timeout=1.0, on_found=self.bridge.room_found.emit, stop=self.stop_event.is_set)
+            self.stop_event.wait(1)
+
+    def _on_room_found(self, reply: dict):
+        for room in reply["rooms"]:
+            key = f"{reply.get('server')}/{room['code']}"
+            text = f"{room['code']} — {room['host'] or reply['host']} ({room['players']}/{room['capacity']})"
+            items = [self.rooms_list.item(i) for i in range(self.rooms_list.count())]
+            item = next((it for it in items if it.data(Qt.UserRole) == key), None)
+            if item is None:
+                item = QListWidgetItem(self.rooms_list)
+                item.setData(Qt.UserRole, key)
+                item.setData(Qt.UserRole + 1, room["code"])
+            item.setText(text)
+            item.setData(Qt.UserRole + 2, time.monotonic())
+        # комнаты, о которых давно не слышно, уже заняты или закрыты
+        for i in reversed(range(self.rooms_list.count())):
+            if time.monotonic() - self.rooms_list.item(i).data(Qt.UserRole + 2) > 5:
+                self.rooms_list.takeItem(i)
+        self.rooms_list.setVisible(self.rooms_list.count() > 0)
+
+    def _on_room_clicked(self, item: QListWidgetItem):
+        self.code_edit.setText(item.data(Qt.UserRole + 1))
 
     def _on_nick_changed(self, text):
         if len(text) >= 1:
@@ -111,12 +166,10 @@ class JoinGameWindow(QDialog):
             self.code_edit.hide()
 
     def _on_code_changed(self, text):
-        if len(text) >= 1:
-            self.join_button.show()
-        else:
-            self.join_button.hide()
+        self.join_button.setVisible(len(text) >= 1)
+        self.watch_button.setVisible(len(text) >= 1)
 
-    def join_game(self):
+    def join_game(self, spectator: bool = False):
         session_code = self.code_edit.text().strip()
         if not session_code:
             self.show_error("Введите код!")
@@ -125,7 +178,10 @@ class JoinGameWindow(QDialog):
         self.show_status("Подключение...")
 
         nickname = self.nick_edit.text()
-        self.client = Client(session_code, nickname, self)
+        self.client = Client(session_code, nickname, self,
+                             on_state=self.bridge.state_changed.emit,
+                             on_started=self.bridge.started.emit,
+                             spectator=spectator)
 
     def show_error(self, message):
         self.status_label.setText(message)
@@ -145,12 +201,22 @@ class JoinGameWindow(QDialog):
         self.status_label.setStyleSheet("font-size: 14px; color: blue; font-weight: bold;")
         self.status_label.setVisible(True)
 
+    def done(self, result):
+        self.stop_event.set()
+        super().done(result)
+
     def start_game(self):
+        if self.client.spectator:
+            self.bridge.gui = SpectatorWindow(self.client.ctrl, main_window=self.main_window)
+            self.bridge.gui.show()
+            logger.info("Spectating start")
+            self.accept()
+            return
         audio.switch_to_game()
-        self.client.gui = GameWindow(main_window=self.main_window)
-        self.client.gui.ctrl = self.client.ctrl
-        self.client.gui.apply_state("start_game")
-        self.client.gui.show()
+        self.bridge.gui = GameWindow(main_window=self.main_window)
+        self.bridge.gui.ctrl = self.client.ctrl
+        self.bridge.gui.apply_state("start_game")
+        self.bridge.gui.show()
         logger.info("Game start")
         self.accept()
 
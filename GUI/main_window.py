@@ -2,6 +2,7 @@ from PyQt5.QtCore import QSize, Qt
 from PyQt5.QtGui import QIcon, QFont, QPixmap, QFontDatabase
 from PyQt5.QtWidgets import QPushButton, QLabel, QWidget
 
+from GUI.asset_loader import AssetLoader
 from GUI.create_game_window import CreateGameWindow
 from GUI.game_window import GameWindow
 from GUI.join_game_window import JoinGameWindow
@@ -25,6 +26,7 @@ class MainWindow(QWidget):
         self._load_font()
         self._make_background()
         self._make_ui()
+        self._start_loading()
 
     def _load_font(self):
         fid = QFontDatabase.addApplicationFont(get_resource_path("assets/FontFont.otf"))
@@ -61,6 +63,27 @@ class MainWindow(QWidget):
         close = self._icon_btn("assets/buttons/exit.png", 60, 60,
                                15, 15, self.close)
 
+    def _start_loading(self):
+        # звуки, тайлы, цифры и взрывы декодируются в фоне, пока меню уже на экране
+        self.loading_label = QLabel(self)
+        self.loading_label.setFont(QFont(self.font_family, 14, QFont.Bold))
+        self.loading_label.setStyleSheet("color: #af5829;")
+        self.loading_label.setAlignment(Qt.AlignCenter)
+        self.loading_label.setGeometry(0, 485, self.WIDTH, 40)
+        self.loader = AssetLoader(GameWindow.CELL_SIZE, self)
+        self.loader.progress.connect(self._on_loading_progress)
+        self.loader.finished.connect(self.loading_label.hide)
+        self._on_loading_progress(0, self.loader.total, "")
+        self.loader.start()
+
+    def _on_loading_progress(self, done: int, total: int, what: str):
+        self.loading_label.setText(f"Загрузка ресурсов… {done * 100 // total}%")
+
+    def closeEvent(self, event):
+        # поток держит ссылки на окно — дожидаемся его
+        self.loader.wait()
+        super().closeEvent(event)
+
     def _menu_button(self, text, icon_path, ypos, func_handler=None):
         btn = QPushButton(self)
         btn.setIcon(QIcon(get_resource_path(icon_path)))
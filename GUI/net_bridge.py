@@ -0,0 +1,19 @@
+from PyQt5.QtCore import QObject, pyqtSignal, Qt
+
+
+# тонкий Qt-адаптер над core.server.Server / core.client.Client:
+# колбэки приходят из сетевого потока и доставляются в GUI-поток сигналами
+class NetBridge(QObject):
+    state_changed = pyqtSignal(str)
+    started = pyqtSignal()
+    room_found = pyqtSignal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.gui = None
+        self.state_changed.connect(self._apply_state, Qt.QueuedConnection)
+
+    def _apply_state(self, cmd: str):
+        if not self.gui:
+            return
+        self.gui.apply_state(cmd)
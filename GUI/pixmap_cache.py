@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import List, Tuple
+
+from PyQt5.QtGui import QPixmap
+
+from core.enums import Bonus, Color
+from core.setting_deploy import get_resource_path
+
+DIGIT_COLORS = ['blue', 'red', 'green', 'orange', 'purple', 'yellow']
+
+
+# общий на процесс кэш картинок, уже масштабированных под нужный размер.
+# QPixmap разделяется неявно, так что одну и ту же картинку можно ставить в сколько угодно QLabel
+class PixmapCache:
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if not cls._instance:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._items: OrderedDict[Tuple[str, int | None, int | None], QPixmap] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, asset: str, width: int | None = None, height: int | None = None) -> QPixmap:
+        # asset — путь относительно корня ресурсов; без размера картинка берётся как есть
+        if width is not None and height is None:
+            height = width
+        key = (asset, width, height)
+        pix = self._items.get(key)
+        if pix is not None:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return pix
+        self.misses += 1
+        pix = QPixmap(get_resource_path(asset))
+        if width is not None:
+            pix = pix.scaled(width, height)
+        self._items[key] = pix
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return pix
+
+    def put(self, asset: str, width: int | None, height: int | None, pix: QPixmap):
+        # картинка, декодированная заранее (AssetLoader); уже загруженную не подменяем
+        if width is not None and height is None:
+            height = width
+        key = (asset, width, height)
+        if key in self._items:
+            return
+        self._items[key] = pix
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+def element_asset(color: Color, bonus: Bonus) -> str:
+    root = "assets/elements"
+    if bonus == Bonus.NONE:
+        return f"{root}/{color.value}.png"
+    if bonus == Bonus.BOMB:
+        return f"{root}/bomb.png"
+    axis = "h" if bonus == Bonus.ROCKET_H else "v"
+    return f"{root}/rocket_{axis}.png"
+
+
+def digit_asset(color: str, ch: str) -> str:
+    return f"assets/score/{color}/{ch}.png"
+
+
+def game_assets(cell_size: int) -> List[Tuple[str, int | None]]:
+    # всё, что игровое окно ставит на поле и в счётчики
+    items: List[Tuple[str, int | None]] = [(element_asset(color, Bonus.NONE), cell_size) for color in Color]
+    items += [(element_asset(Color.RED, bonus), cell_size) for bonus in Bonus if bonus != Bonus.NONE]
+    items += [(f"assets/block{i}.png", cell_size) for i in (1, 2)]
+    items += [(digit_asset(color, str(d)), None) for color in DIGIT_COLORS for d in range(10)]
+    return items
+
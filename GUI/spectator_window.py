@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from PyQt5.QtWidgets import QMessageBox
+
+from GUI.board_view import BoardView
+from GUI.end_game_window import EndGameWindow
+from core.spectator import SpectatorController
+from logger import logger
+
+
+# просмотр чужой партии: по окну BoardView на каждое поле, ввода нет
+class SpectatorWindow:
+    def __init__(self, ctrl: SpectatorController, main_window=None):
+        self.ctrl = ctrl
+        self.main_window = main_window
+        self.views: Dict[str, BoardView] = {}
+        self.end_game_window = None
+
+    def show(self):
+        self.ctrl.apply_board_messages()
+        if self.ctrl.mode == "time":
+            owners = list(self.ctrl.queue)
+        else:
+            # общее поле одно — показываем его одним окном
+            owners = [self.ctrl.queue[0]]
+        for i, nick in enumerate(owners):
+            view = BoardView()
+            view.move(100 + i * 520, 100)
+            view.update_board(self.ctrl.boards[nick], True)
+            self.views[nick] = view
+            view.show()
+        self._update_titles()
+
+    def _view_of(self, nickname: str | None) -> BoardView | None:
+        if nickname in self.views:
+            return self.views[nickname]
+        if self.ctrl.mode != "time" and self.views:
+            return next(iter(self.views.values()))
+        return None
+
+    def _update_titles(self):
+        for nick, view in self.views.items():
+            if self.ctrl.mode == "time":
+                view.setWindowTitle(f"Зритель: {nick}")
+            else:
+                view.setWindowTitle(f"Зритель: ходит {self.ctrl.current}")
+
+    def apply_state(self, command: str):
+        if not self.views:
+            return
+        view = self._view_of(self.ctrl.last_player)
+        if command == "board":
+            for nick in self.ctrl.apply_board_messages():
+                changed = self._view_of(nick)
+                if changed:
+                    changed.update_board(changed.board)
+            self._update_titles()
+        elif command == "score":
+            for nick, v in self.views.items():
+                if self.ctrl.mode == "time":
+                    v.update_score(self.ctrl.scores.get(nick, 0))
+                elif self.ctrl.last_player:
+                    v.update_score(self.ctrl.scores.get(self.ctrl.last_player, 0))
+        elif command == "time":
+            if view:
+                view.tick_clock(self.ctrl.times.get(self.ctrl.last_player, 0))
+        elif command == "peer":
+            if self.ctrl.away_player:
+                logger.info(f"Игрок {self.ctrl.away_player} потерял связь")
+        elif command == "end_game":
+            parent = next(iter(self.views.values()))
+            self.end_game_window = EndGameWindow(parent, player_name=self.ctrl.winner_player,
+                                                 message="С победой", score=self.ctrl.winner_score)
+            self.end_game_window.exec_()
+            self.close()
+        elif command == "error":
+            parent = next(iter(self.views.values()))
+            QMessageBox.critical(parent, "Ошибка", "Соединение с сервером потеряно.")
+            self.close()
+
+    def close(self):
+        for view in self.views.values():
+            view.close()
+        self.views.clear()
+        if self.main_window:
+            self.main_window.show()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List
+
+from PyQt5.QtCore import QElapsedTimer, QEasingCurve, QTimer, Qt
+from PyQt5.QtWidgets import QWidget
+
+FRAME_MS = 16
+
+MOVE = 0     # sprite.x/y от (x0, y0) к (x1, y1)
+GLOW = 1     # sprite.glow: 0 → пик → 0
+FRAMES = 2   # sprite.frame: 0 → x1 - 1 равномерно
+
+
+class Tween:
+    __slots__ = ("kind", "owner", "sprite", "x0", "y0", "x1", "y1",
+                 "start", "duration", "curve", "on_done", "blocking")
+
+
+# все анимации процесса двигает один таймер: каждый кадр продвигаются все активные твины,
+# каждый затронутый холст перерисовывается один раз. Записи твинов переиспользуются.
+# blocking-твины (падения, обмены) считаются по владельцу — по ним when_idle узнаёт,
+# что поле успокоилось; взрывы, ракеты и подсветка ходу игры не мешают
+class TweenScheduler:
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if not cls._instance:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._active: List[Tween] = []
+        self._free: List[Tween] = []
+        self._busy: Dict[QWidget, int] = {}
+        self._idle: Dict[QWidget, List[Callable[[], None]]] = {}
+        self._curves: Dict[QEasingCurve.Type, QEasingCurve] = {}
+        self._clock = QElapsedTimer()
+        self._clock.start()
+        self._timer = QTimer()
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.setInterval(FRAME_MS)
+        self._timer.timeout.connect(self._tick)
+
+    def _curve(self, easing: QEasingCurve.Type) -> QEasingCurve:
+        curve = self._curves.get(easing)
+        if curve is None:
+            curve = self._curves[easing] = QEasingCurve(easing)
+        return curve
+
+    def add(self, kind: int, owner: QWidget, sprite, x0: float, y0: float, x1: float, y1: float,
+            duration: int, easing: QEasingCurve.Type = QEasingCurve.Linear,
+            on_done: Callable[[], None] | None = None, blocking: bool = False) -> Tween:
+        tw = self._free.pop() if self._free else Tween()
+        tw.kind, tw.owner, tw.sprite = kind, owner, sprite
+        tw.x0, tw.y0, tw.x1, tw.y1 = x0, y0, x1, y1
+        tw.start = self._clock.elapsed()
+        tw.duration = max(1, duration)
+        tw.curve = self._curve(easing)
+        tw.on_done = on_done
+        tw.blocking = blocking
+        if blocking:
+            self._busy[owner] = self._busy.get(owner, 0) + 1
+        self._active.append(tw)
+        if not self._timer.isActive():
+            self._timer.start()
+        return tw
+
+    def move(self, owner: QWidget, sprite, x: int, y: int, duration: int, easing: QEasingCurve.Type,
+             on_done: Callable[[], None] | None = None, blocking: bool = False) -> Tween:
+        return self.add(MOVE, owner, sprite, sprite.x, sprite.y, x, y, duration, easing, on_done, blocking)
+
+    def busy(self, owner: QWidget) -> bool:
+        return self._busy.get(owner, 0) > 0
+
+    def when_idle(self, owner: QWidget, callback: Callable[[], None]):
+        # колбэки вызываются по очереди, как только у владельца не осталось blocking-твинов
+        if self.busy(owner):
+            self._idle.setdefault(owner, []).append(callback)
+        else:
+            callback()
+
+    def cancel(self, owner: QWidget):
+        # окно закрыто: его твины снимаются без колбэков
+        kept = []
+        for tw in self._active:
+            if tw.owner is owner:
+                self._release(tw)
+            else:
+                kept.append(tw)
+        self._active = kept
+        self._busy.pop(owner, None)
+        self._idle.pop(owner, None)
+
+    def _release(self, tw: Tween):
+        tw.owner = tw.sprite = tw.on_done = None
+        self._free.append(tw)
+
+    @staticmethod
+    def _apply(tw: Tween, p: float):
+        v = tw.curve.valueForProgress(p)
+        sprite = tw.sprite
+        if tw.kind == MOVE:
+            sprite.x = round(tw.x0 + (tw.x1 - tw.x0) * v)
+            sprite.y = round(tw.y0 + (tw.y1 - tw.y0) * v)
+        elif tw.kind == GLOW:
+            sprite.glow = tw.x1 * (1 - abs(2 * v - 1))
+        else:
+            sprite.frame = min(int(tw.x1) - 1, int(tw.x1 * v))
+
+    def _tick(self):
+        now = self._clock.elapsed()
+        active, self._active = self._active, []
+        done: List[Tween] = []
+        dirty = set()
+        for tw in active:
+            p = (now - tw.start) / tw.duration
+            if p >= 1:
+                p = 1.0
+                done.append(tw)
+            else:
+                self._active.append(tw)
+            self._apply(tw, p)
+            dirty.add(tw.owner)
+        for owner in dirty:
+            owner.update()
+
+        # колбэки — после того как все твины кадра дошли до конечных значений;
+        # новые твины из колбэков попадают в следующий кадр
+        for tw in done:
+            owner, on_done, blocking = tw.owner, tw.on_done, tw.blocking
+            self._release(tw)
+            if on_done:
+                on_done()
+            if blocking and self._busy.get(owner):
+                self._busy[owner] -= 1
+                if not self._busy[owner]:
+                    del self._busy[owner]
+                    self._drain_idle(owner)
+
+        if not self._active:
+            self._timer.stop()
+
+    def _drain_idle(self, owner: QWidget):
+        waiting = self._idle.get(owner)
+        while waiting and not self.busy(owner):
+            waiting.pop(0)()
+        if not waiting:
+            self._idle.pop(owner, None)
@@ -1,4 +1,10 @@
+import time
+
+# отсчёт времени до первого окна — с самого начала, до тяжёлых импортов
+STARTED = time.perf_counter()
+
 import sys
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 from GUI.main_window import MainWindow
 from core.audio_manager import AudioManager
@@ -16,6 +22,9 @@ def main():
         app = QApplication(sys.argv)
         window = MainWindow()
         window.show()
+        # срабатывает на первой итерации цикла событий — окно уже нарисовано
+        QTimer.singleShot(0, lambda: logger.info(
+            f"Первое окно через {(time.perf_counter() - STARTED) * 1000:.0f} мс"))
         sys.exit(app.exec_())
     except Exception as e:
         logger.exception("Error while starting")
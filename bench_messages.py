@@ -0,0 +1,68 @@
+import argparse
+import json
+import time
+
+from core import protocol as proto
+from core import replay
+from core.board import Board
+from core.game_controller import GameController
+
+# микробенчмарк разбора сообщений: сколько кадров в секунду проходит
+# путь клиента json.loads -> proto.decode -> GameController.handle_command
+
+
+def sample_frames(board: Board) -> dict[str, bytes]:
+    matrix = board.to_matrix()
+    frames = {
+        "score": proto.score(score_=123),
+        "time": proto.time(time_=42, ts=time.time()),
+        "board": proto.board(board_=matrix),
+        "swap": proto.swap(a_lbl=(0, 0), b_lbl=(1, 0), next_player="b", removed={(2, 0), (3, 0)},
+                           bonuses=[], success=True, board=matrix),
+        "auto_swap": proto.auto_swap(fallen=[(0, 0, 1, 0)], spawned=[], board=matrix),
+        "peer": proto.peer("b", "back"),
+        "end_game": proto.end_game(winner="b", score_=10),
+    }
+    # как после рассылки комнатой: с номером и автором
+    return {cmd: proto.stamp(proto.dumps(msg), i + 1, "b") for i, (cmd, msg) in enumerate(frames.items())}
+
+
+def make_controller(board: Board) -> GameController:
+    ctrl = GameController(mode="time", time=60, nickname="a")
+    ctrl.handle_command(proto.start_game("time", ["a", "b"], ["a", "b"], board.to_matrix(), 60))
+    return ctrl
+
+
+def measure(fn, frames: list[bytes], duration: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for raw in frames:
+            fn(raw)
+        count += len(frames)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность разбора сообщений")
+    parser.add_argument("--duration", type=float, default=1.0, help="длительность замера на команду, с")
+    args = parser.parse_args()
+    # кадры "board" иначе пишутся в журнал повтора сотнями тысяч
+    replay.enabled = False
+
+    board = Board()
+    ctrl = make_controller(board)
+    frames = sample_frames(board)
+
+    print(f"{'команда':<12}{'decode, сообщ./с':>20}{'handle_command, сообщ./с':>28}")
+    for cmd, raw in frames.items():
+        decode_rate = measure(lambda r: proto.decode(json.loads(r)), [raw], args.duration)
+        handle_rate = measure(lambda r: ctrl.handle_command(json.loads(r)), [raw], args.duration)
+        print(f"{cmd:<12}{decode_rate:>20,.0f}{handle_rate:>28,.0f}")
+    mixed = measure(lambda r: ctrl.handle_command(json.loads(r)), list(frames.values()), args.duration)
+    print(f"{'смесь':<12}{'':>20}{mixed:>28,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,135 @@
+import threading
+import time
+
 import pygame
 from core.setting_deploy import get_resource_path
 
+SFX_NAMES = ["click", "swap", "rocket", "falling", "boom", "add_bonus", "nice_swap", "removed"]
+MUSIC_TRACKS = {"lobby": "assets/music/lobby.wav", "game": "assets/music/in_game.wav"}
+MUSIC_VOLUME = 0.4
+# свои каналы у каждого эффекта; эффекты, которые сыплются каскадом, получают по два.
+# Всего одновременно звучит не больше суммы — это и есть предел голосов
+EFFECT_VOICES = {"falling": 2, "removed": 2, "boom": 2}
+# повтор того же эффекта в пределах окна не запускает новый звук, а делает текущий громче
+COALESCE_MS = 60
+COALESCE_BUMP = 0.1
+
 
+# instance() ничего не грузит: микшер поднимается в init_mixer, звуки и музыку
+# декодирует AssetLoader в фоне (или load_all, если окна нет). Пока эффект не загружен,
+# play_sound молчит; музыка заиграет, как только декодируется нужная дорожка
 class AudioManager:
     _instance = None
 
     @classmethod
     def instance(cls):
         if not cls._instance:
-            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
             cls._instance = cls()
         return cls._instance
 
     def __init__(self):
-        # музыка
-        pygame.mixer.music.load(get_resource_path("assets/music/lobby.wav"))
-        pygame.mixer.music.set_volume(0.4)
-        pygame.mixer.music.play(-1)  # зацикливание
-
         self.music_on = True
         self.sound_on = True
-        # sfx
-        self._effects = {
-            name: pygame.mixer.Sound(get_resource_path(f"assets/sfx/{name}.wav"))
-            for name in ["click", "swap", "rocket", "falling", "boom", "add_bonus", "nice_swap", "removed"]
-        }
+        self._mixer_ready = False
+        self._effects = {}
+        # дорожки целиком в памяти: переключение лобби/игра не читает диск
+        self._music = {}
+        self._track = "lobby"
+        self._music_lock = threading.Lock()
+        self._music_channel = None
+        self._channels = {}
+        # эффект → (канал, время запуска, громкость) последнего запуска
+        self._last = {}
+        self.coalesced = 0
+
+    def init_mixer(self):
+        if self._mixer_ready:
+            return
+        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+        # все каналы зарезервированы: pygame сам их не раздаёт, каждый эффект играет только на своих,
+        # последний — под музыку
+        voices = sum(EFFECT_VOICES.get(name, 1) for name in SFX_NAMES)
+        pygame.mixer.set_num_channels(voices + 1)
+        pygame.mixer.set_reserved(voices + 1)
+        n = 0
+        for name in SFX_NAMES:
+            k = EFFECT_VOICES.get(name, 1)
+            self._channels[name] = [pygame.mixer.Channel(i) for i in range(n, n + k)]
+            n += k
+        self._music_channel = pygame.mixer.Channel(voices)
+        self._music_channel.set_volume(MUSIC_VOLUME)
+        self._mixer_ready = True
+
+    def load_effect(self, name: str):
+        self._effects[name] = pygame.mixer.Sound(get_resource_path(f"assets/sfx/{name}.wav"))
+
+    def load_music(self, track: str):
+        snd = pygame.mixer.Sound(get_resource_path(MUSIC_TRACKS[track]))
+        with self._music_lock:
+            self._music[track] = snd
+            if track == self._track:
+                self._play_track()
+
+    def load_all(self):
+        self.init_mixer()
+        for name in SFX_NAMES:
+            self.load_effect(name)
+        for track in MUSIC_TRACKS:
+            self.load_music(track)
+
+    def _play_track(self):
+        snd = self._music.get(self._track)
+        if snd is None or not self.music_on:
+            return
+        self._music_channel.play(snd, loops=-1)  # зацикливание
+        self._music_channel.set_volume(MUSIC_VOLUME)
+
+    def _switch(self, track: str):
+        with self._music_lock:
+            self._track = track
+            if self._music_channel is not None:
+                self._music_channel.stop()
+                self._play_track()
 
     def toggle_music(self, on: bool):
         self.music_on = on
-        if on:
-            pygame.mixer.music.unpause()
-        else:
-            pygame.mixer.music.pause()
+        if self._music_channel is None:
+            return
+        with self._music_lock:
+            if not on:
+                self._music_channel.pause()
+            elif self._music_channel.get_busy():
+                self._music_channel.unpause()
+            else:
+                self._play_track()
 
     def switch_to_lobby(self):
-        pygame.mixer.music.load(get_resource_path("assets/music/lobby.wav"))
-        if self.music_on:
-            pygame.mixer.music.play(-1)
+        self._switch("lobby")
 
     def switch_to_game(self):
-        pygame.mixer.music.load(get_resource_path("assets/music/in_game.wav"))
-        if self.music_on:
-            pygame.mixer.music.play(-1)
+        self._switch("game")
 
     def toggle_sound(self, on: bool):
         self.sound_on = on
 
     def play_sound(self, name: str, volume: float = 0.8):
-        if self.sound_on and name in self._effects:
-            snd = self._effects[name]
-            snd.set_volume(volume)
-            snd.play()
+        if not self.sound_on or name not in self._effects:
+            return
+        now = time.monotonic()
+        last = self._last.get(name)
+        if last is not None and (now - last[1]) * 1000 < COALESCE_MS and last[0].get_busy():
+            ch, started, vol = last
+            vol = min(1.0, max(vol, volume) + COALESCE_BUMP)
+            ch.set_volume(vol)
+            self._last[name] = (ch, started, vol)
+            self.coalesced += 1
+            return
+        channels = self._channels[name]
+        ch = next((c for c in channels if not c.get_busy()), None)
+        if ch is None:
+            # все голоса эффекта заняты — перезапускаем самый старый
+            ch = channels[0]
+            channels.append(channels.pop(0))
+        ch.play(self._effects[name])
+        ch.set_volume(volume)
+        self._last[name] = (ch, now, volume)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Set
+
+from core import protocol as proto
+from core.board import Board, MoveResult
+from logger import logger
+
+
+# серверная симуляция партии: клиенты присылают только намерение обмена,
+# каскад и счёт считаются здесь, игрокам уходит готовый результат
+class AuthoritativeMatch:
+    def __init__(self, mode: str, queue: List[str], board: List[List[str]]):
+        self.mode = mode
+        self.queue = queue[:]
+        self.current = self.queue[0]
+        self.scores: Dict[str, int] = {nick: 0 for nick in self.queue}
+        self.finished: Set[str] = set()
+        self.ended = False
+        # ходы хоста приходят из GUI-потока, ходы клиентов — из сетевого
+        self._lock = threading.Lock()
+        if mode == "time":
+            # у каждого своё поле, стартовое — общее
+            self.boards = {nick: Board.from_matrix(board) for nick in self.queue}
+        else:
+            shared = Board.from_matrix(board)
+            self.boards = {nick: shared for nick in self.queue}
+
+    def apply_intent(self, nickname: str, intent: proto.SwapIntent) -> proto.Outcome | None:
+        if nickname not in self.boards:
+            logger.warning(f"Ход от постороннего игрока {nickname}")
+            return None
+        try:
+            intent.validate()
+        except proto.ProtocolError as e:
+            logger.warning(f"Некорректный ход от {nickname}: {e}")
+            return None
+        a, b = (intent.a[0], intent.a[1]), (intent.b[0], intent.b[1])
+
+        with self._lock:
+            if self.mode != "time" and nickname != self.current:
+                logger.warning(f"{nickname} ходит не в свою очередь")
+                return None
+            board = self.boards[nickname]
+            result = board.play_move(a, b)
+            if result.success:
+                self.scores[nickname] += len(result.steps[0].removed)
+            if self.mode != "time":
+                idx = (self.queue.index(self.current) + 1) % len(self.queue)
+                self.current = self.queue[idx]
+            return proto.outcome(player=nickname, a=a, b=b, result=result,
+                                 board_=board.to_matrix(), scores=dict(self.scores),
+                                 next_player=self.current)
+
+    def rejection(self, nickname: str, intent: proto.SwapIntent) -> proto.Outcome | None:
+        # ответ на отклонённый ход: поле и счёт без изменений, чтобы автор не ждал результата вечно
+        if nickname not in self.boards:
+            return None
+        try:
+            intent.validate()
+        except proto.ProtocolError:
+            return None
+        with self._lock:
+            return proto.outcome(player=nickname, a=intent.a, b=intent.b, result=MoveResult(False, []),
+                                 board_=self.boards[nickname].to_matrix(), scores=dict(self.scores),
+                                 next_player=self.current)
+
+    def finish(self, nickname: str) -> proto.EndGame | None:
+        # итог подводится по серверному счёту, когда закончили все
+        with self._lock:
+            if nickname in self.boards:
+                self.finished.add(nickname)
+            if self.ended or self.finished != set(self.queue):
+                return None
+            self.ended = True
+            winner = max(self.queue, key=lambda nick: self.scores[nick])
+            return proto.end_game(winner=winner, score_=self.scores[winner])
@@ -1,6 +1,8 @@
 # core/board.py
 from __future__ import annotations
 import random
+import zlib
+from dataclasses import dataclass, field
 from typing import List, Tuple, Dict, Iterable, Set
 
 from core.enums import Color, Bonus
@@ -8,15 +10,61 @@ from core.element import Element
 from logger import logger
 
 
+@dataclass
+class CascadeStep:
+    removed: Set[Tuple[int, int]]
+    bonuses: List[Tuple[int, int, Bonus]]
+    # (old_r, old_c, new_r, new_c)
+    fallen: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    # (r, c, color) — новые элементы всегда без бонуса
+    spawned: List[Tuple[int, int, Color]] = field(default_factory=list)
+    # контрольная сумма поля после шага — для сверки в режиме lockstep
+    checksum: int = 0
+
+
+@dataclass
+class MoveResult:
+    success: bool
+    # шаг 0 — сам обмен, дальше — автоматические совпадения после осыпания
+    steps: List[CascadeStep] = field(default_factory=list)
+
+
 class Board:
     ROWS, COLS = 8, 7
     COLORS = list(Color)
 
-    def __init__(self):
+    def __init__(self, fill: bool = True, seed: int | None = None):
+        # у каждого поля свой генератор: с общим seed соперники получают одинаковые каскады
+        self.rng = random.Random(seed)
+        # ReplayRecorder из core/replay.py, если партия записывается
+        self.recorder = None
         self.grid: List[List[Element | None]] = [
             [None] * self.COLS for _ in range(self.ROWS)
         ]
-        self._fill_start_board()
+        if fill:
+            self._fill_start_board()
+
+    @classmethod
+    def from_matrix(cls, mat: list[list[str]] | list[str], seed: int | None = None) -> Board:
+        board = cls(fill=False, seed=seed)
+        board.board_from_matrix(mat)
+        return board
+
+    def reseed(self, seed: int | None):
+        self.rng.seed(seed)
+        if self.recorder is not None:
+            self.recorder.reseed(seed)
+
+    def checksum(self) -> int:
+        state = bytearray()
+        for row in self.grid:
+            for e in row:
+                if e is None:
+                    state += b"\0\0"
+                else:
+                    state.append(self.COLORS.index(e.color) + 1)
+                    state.append(e.bonus.value)
+        return zlib.crc32(state)
 
     def cell(self, r: int, c: int) -> Element | None:
         return self.grid[r][c]
@@ -25,6 +73,8 @@ class Board:
              a: Tuple[int, int],
              b: Tuple[int, int]
              ) -> Tuple[bool, Set[Tuple[int, int]], List[Tuple[int, int, Bonus]]]:
+        if self.recorder is not None:
+            self.recorder.swap(a, b)
         r1, c1 = a
         r2, c2 = b
         self.grid[r1][c1], self.grid[r2][c2] = self.grid[r2][c2], self.grid[r1][c1]
@@ -55,6 +105,29 @@ class Board:
 
         return True, matched, bonus_cells
 
+    def play_move(self, a: Tuple[int, int], b: Tuple[int, int]) -> MoveResult:
+        # тот же порядок, что и в GameWindow: обмен, осыпание, затем авто-совпадения
+        success, removed, bonuses = self.swap(a, b)
+        if not success:
+            return MoveResult(False)
+        steps = [CascadeStep(removed, bonuses, *self._collapse_tracked(), self.checksum())]
+        while self.step():
+            removed, bonuses = self.get_auto_matched()
+            steps.append(CascadeStep(removed, bonuses, *self._collapse_tracked(), self.checksum()))
+        return MoveResult(True, steps)
+
+    def _collapse_tracked(self) -> tuple[list[tuple[int, int, int, int]], list[tuple[int, int, Color]]]:
+        before = {
+            id(e): (r, c)
+            for r, row in enumerate(self.grid)
+            for c, e in enumerate(row)
+            if e is not None
+        }
+        fallen, spawned = self.collapse_and_fill()
+        moves = [(*before[id(e)], r, c) for e, r, c in fallen]
+        new = [(e.x, e.y, e.color) for e in spawned]
+        return moves, new
+
     def _create_bonuses(self,
                         matched: Set[Tuple[int, int]],
                         a: Tuple[int, int],
@@ -74,7 +147,7 @@ class Board:
             base = self.grid[r][c]
             col = base.color
             if size == 4:
-                bonus = random.choice([Bonus.ROCKET_H, Bonus.ROCKET_V])
+                bonus = self.rng.choice([Bonus.ROCKET_H, Bonus.ROCKET_V])
             else:
                 bonus = Bonus.BOMB
             self.grid[r][c] = Element(r, c, col, bonus)
@@ -124,7 +197,7 @@ class Board:
         while True:
             for r in range(self.ROWS):
                 for c in range(self.COLS):
-                    self.grid[r][c] = Element(r, c, random.choice(self.COLORS))
+                    self.grid[r][c] = Element(r, c, self.rng.choice(self.COLORS))
             if not self._collect_matches() and self.has_move():
                 break
 
@@ -225,13 +298,15 @@ class Board:
         for c in range(self.COLS):
             for r in range(self.ROWS):
                 if self.grid[r][c] is None:
-                    new = Element(r, c, random.choice(self.COLORS))
+                    new = Element(r, c, self.rng.choice(self.COLORS))
                     self.grid[r][c] = new
                     spawned.append(new)
 
         if not self.has_move():
-            e = random.choice([e for row in self.grid for e in row])
-            e.color = random.choice([c for c in self.COLORS if c != e.color])
+            e = self.rng.choice([e for row in self.grid for e in row])
+            e.color = self.rng.choice([c for c in self.COLORS if c != e.color])
+        if self.recorder is not None:
+            self.recorder.cascade(self.checksum())
         return fallen, spawned
 
     def _will_match(self, a, b) -> bool:
@@ -283,10 +358,10 @@ class Board:
             n = len(run)
             if n < 4:
                 return
-            r, c = random.choice(run)
+            r, c = self.rng.choice(run)
             base = self.grid[r][c]
             if n == 4:
-                bonus = random.choice([Bonus.ROCKET_H, Bonus.ROCKET_V])
+                bonus = self.rng.choice([Bonus.ROCKET_H, Bonus.ROCKET_V])
             else:  # n ≥ 5
                 bonus = Bonus.BOMB
             self.grid[r][c] = Element(r, c, base.color, bonus)
@@ -324,6 +399,11 @@ class Board:
         self._last_auto_bonuses = bonuses  # запоминаем для get_auto_matched
         return bonuses
 
+    # символ матрицы -> цвет/бонус (цвет бонусов в матрице не сохраняется)
+    _COLOR_OF = {'r': Color.RED, 'o': Color.ORANGE, 'p': Color.PURPLE, 'y': Color.YELLOW,
+                 'h': Color.RED, 'v': Color.ORANGE, 'b': Color.PURPLE}
+    _BONUS_OF = {'h': Bonus.ROCKET_H, 'v': Bonus.ROCKET_V, 'b': Bonus.BOMB}
+
     def board_from_matrix(self, mat: list[list[str]]):
         for r, row in enumerate(mat):
             for c, ch in enumerate(row):
@@ -332,13 +412,11 @@ class Board:
                     self.grid[r][c] = None
                 else:
                     ch_low = ch.lower()
-                    color_map = {'r': Color.RED, 'o': Color.ORANGE, 'p': Color.PURPLE, 'y': Color.YELLOW,
-                                 'h': Color.RED, 'v': Color.ORANGE, 'b': Color.PURPLE}
-                    bonus_map = {'h': Bonus.ROCKET_H, 'v': Bonus.ROCKET_V, 'b': Bonus.BOMB}
-
-                    color = color_map[ch_low]
-                    bonus = bonus_map.get(ch_low, Bonus.NONE)
+                    color = self._COLOR_OF[ch_low]
+                    bonus = self._BONUS_OF.get(ch_low, Bonus.NONE)
                     self.grid[r][c] = Element(r, c, color, bonus)
+        if self.recorder is not None:
+            self.recorder.board(mat)
 
     def to_matrix(self) -> list[list[str]]:
         matrix: list[list[str]] = []
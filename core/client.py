@@ -1,91 +1,186 @@
+from __future__ import annotations
+
+import asyncio
 import json
-import socket
 import threading
+from typing import Callable, List
 
-from PyQt5.QtCore import QObject, pyqtSignal, Qt
-
+from core import protocol as proto
 from core.game_controller import GameController
-from core.network_utils import find_server_by_port
+from core.rooms import RESUME_GRACE
+from core.spectator import SpectatorController
+from core.discovery import find_server_by_code
+from core.transport import Connection, LoopThread, READ_LIMIT
 from logger import logger
 
+CONNECT_TIMEOUT = 10
 
-class Client(QObject):
-    gui_cmd = pyqtSignal(str)
-    gui_requested = pyqtSignal(int)
 
-    def __init__(self, session_code, nickname, join_window):
-        super().__init__()
-        self.gui = None
+# сетевой клиент без зависимостей от Qt: о смене состояния и старте партии
+# сообщает через on_state/on_started (в GUI их связывает NetBridge)
+class Client:
+    def __init__(self, session_code, nickname, join_window,
+                 on_state: Callable[[str], None] | None = None,
+                 on_started: Callable[[], None] | None = None,
+                 spectator: bool = False):
         self.join_window = join_window
         self.nickname = nickname
-
-        self.ctrl = GameController(
-            mode="",
-            time=0,
-            nickname=nickname,
-            on_send=self._send_to_srv,
-            on_close=self.close
-        )
-
-        self.gui_requested.connect(self.join_window.start_game)
-        self.ctrl.state_ready = self.gui_cmd.emit
-        self.gui_cmd.connect(self._apply_state, Qt.QueuedConnection)
-
-        self.server_ip, self.server_port = find_server_by_port(int(session_code))
+        self.spectator = spectator
+        self.session_code = session_code
+        self.conn: Connection | None = None
+        self.on_started = on_started
+        # для возвращения в партию после обрыва: токен от сервера и номер последнего сообщения
+        self.token: str | None = None
+        self.last_seq = 0
+        self._closing = False
+        self._reconnecting = False
+        self._outbox: List[bytes] = []
+        self._send_lock = threading.Lock()
+
+        if spectator:
+            self.ctrl = SpectatorController(nickname)
+        else:
+            self.ctrl = GameController(
+                mode="",
+                time=0,
+                nickname=nickname,
+                on_send=self._send_to_srv,
+                on_close=self.close
+            )
+        self.ctrl.state_ready = on_state
+
+        self.server_ip, self.server_port = find_server_by_code(session_code)
         if not self.server_ip:
             return self.join_window.show_error("Ошибка: сервер не найден!")
 
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.net = LoopThread(name="client-net")
+        self.net.start()
         try:
-            self.sock.connect((self.server_ip, self.server_port))
+            resp = self.net.submit(self._connect(nickname)).result(CONNECT_TIMEOUT)
             self.join_window.show_status("Подключение установлено...")
         except Exception:
+            self.net.stop()
             return self.join_window.show_error("Ошибка подключения к серверу!")
 
-        self.send_message(nickname)
-        resp = self.sock.recv(1024).decode("utf-8")
-        if resp == "INVALID_NICKNAME":
-            return self.join_window.show_error("Никнейм уже занят!")
-
-        self.join_window.show_success("Вы успешно подключились! Ожидайте начала игры.")
-
-        threading.Thread(target=self._recv_loop, daemon=True).start()
+        if resp != "WELCOME":
+            self.close()
+            self.net.stop()
+            errors = {
+                "INVALID_NICKNAME": "Никнейм уже занят!",
+                "ROOM_NOT_FOUND": "Комната с таким кодом не найдена!",
+                "ROOM_FULL": "Комната уже заполнена!",
+            }
+            return self.join_window.show_error(errors.get(resp, "Ошибка подключения к серверу!"))
+
+        if spectator:
+            self.join_window.show_success("Вы зритель. Ожидайте начала игры.")
+        else:
+            self.join_window.show_success("Вы успешно подключились! Ожидайте начала игры.")
+
+        self.net.submit(self._recv_loop())
+
+    async def _connect(self, nickname: str) -> str:
+        reader, writer = await asyncio.open_connection(self.server_ip, self.server_port, limit=READ_LIMIT)
+        self.conn = Connection(reader, writer)
+        self.conn.send(proto.dumps(proto.join(self.session_code, nickname, spectator=self.spectator)))
+        resp = await self.conn.read_line()
+        return resp.decode("utf-8").strip() if resp else ""
 
     def send_message(self, msg: str):
-        self.sock.send(msg.encode("utf-8"))
+        self.conn.send(msg.encode("utf-8") + b"\n")
 
-    def _recv_loop(self):
+    async def _recv_loop(self):
         while True:
-            try:
-                raw = self.sock.recv(32768)
-                if not raw:
-                    self.ctrl.handle_error()
-                    break
-            except ConnectionResetError:
-
+            await self._read_conn()
+            if self._closing:
+                break
+            # связь оборвалась не по нашей воле — пробуем вернуться в партию
+            if self.token is None or not await self._reconnect():
                 self.ctrl.handle_error()
                 break
+        self.net.stop()
 
+    async def _read_conn(self):
+        self.conn.on_link = self.ctrl.update_link
+        heartbeat = asyncio.create_task(self.conn.heartbeat())
+        try:
+            while True:
+                raw = await self.conn.read_line()
+                if raw is None:
+                    return
+
+                try:
+                    data = json.loads(raw.decode("utf-8"))
+                    logger.info(f"Принята команда {data}")
+                except Exception:
+                    continue
+                if self.conn.handle_heartbeat(data):
+                    continue
+                try:
+                    msg = proto.decode(data)
+                except proto.ProtocolError as e:
+                    logger.warning(f"Отброшено сообщение сервера: {e}")
+                    continue
+                if type(msg) is proto.Session:
+                    self.token = msg.token
+                    continue
+                if msg.seq is not None:
+                    if msg.seq <= self.last_seq:
+                        # уже получено до обрыва
+                        continue
+                    self.last_seq = msg.seq
+
+                started = self.ctrl.handle_command(msg)
+                if started and self.on_started:
+                    self.on_started()
+        finally:
+            heartbeat.cancel()
+            self.conn.close()
+
+    async def _reconnect(self) -> bool:
+        with self._send_lock:
+            self._reconnecting = True
+        self.ctrl.set_reconnecting(True)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RESUME_GRACE
+        while loop.time() < deadline and not self._closing:
             try:
-                data = json.loads(raw.decode("utf-8"))
-                logger.info(f"Принята команда {data}")
-            except Exception:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.server_ip, self.server_port, limit=READ_LIMIT), 3)
+                conn = Connection(reader, writer)
+                conn.send(proto.dumps(proto.join(self.session_code, self.nickname, self.token, self.last_seq)))
+                resp = await asyncio.wait_for(conn.read_line(), 3)
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(1)
                 continue
-
-            players = self.ctrl.handle_command(data)
-            if players:
-                self.gui_requested.emit(players)
+            if resp is None or resp.strip() != b"WELCOME":
+                # комната закрыта или ник уже не наш — возвращаться некуда
+                conn.close()
+                logger.info(f"Переподключение отклонено: {resp}")
+                break
+            logger.info(f"Переподключились, продолжаем с сообщения {self.last_seq + 1}")
+            with self._send_lock:
+                self.conn = conn
+                self._reconnecting = False
+                for raw in self._outbox:
+                    conn.send(raw)
+                self._outbox.clear()
+            self.ctrl.set_reconnecting(False)
+            return True
+        with self._send_lock:
+            self._reconnecting = False
+            self._outbox.clear()
+        return False
 
     def _send_to_srv(self, raw: bytes):
-        self.sock.sendall(raw)
+        with self._send_lock:
+            if self._reconnecting:
+                # отправим, как только вернёмся в партию
+                self._outbox.append(raw)
+                return
+            self.conn.send(raw)
 
     def close(self):
-        try:
-            self.sock.close()
-        except OSError:
-            logger.error("Error on close sock", OSError)
-
-    def _apply_state(self, cmd: str):
-        if not self.gui:
-            return
-        self.gui.apply_state(cmd)
+        self._closing = True
+        if self.conn:
+            self.conn.close()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import socket
+import time
+from typing import Callable, Dict, List, Tuple
+
+from core import protocol as proto
+from core.network_utils import DISCOVERY_PORT, broadcast_addresses, invalidate_interfaces
+from logger import logger
+
+# повторы probe от начала поиска, с: UDP может потеряться, а ответы
+# приходят за единицы миллисекунд, так что первые повторы идут часто
+PROBE_SCHEDULE = (0.0, 0.05, 0.2, 0.5, 1.0)
+_probe_ids = itertools.count(1)
+
+
+# серверная сторона: сокет ждёт probe в общем event loop и отвечает сразу,
+# пока никто не ищет игры — ничего не делает
+class DiscoveryResponder(asyncio.DatagramProtocol):
+    def __init__(self, describe: Callable[[str | None, str], proto.Rooms]):
+        self.describe = describe
+        self.transport: asyncio.DatagramTransport | None = None
+
+    @staticmethod
+    def bind(port: int = DISCOVERY_PORT) -> socket.socket | None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # несколько серверов на одной машине слушают один порт, broadcast получает каждый
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT") and os.name != "nt":
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            sock.bind(("", port))
+        except OSError as e:
+            logger.error(f"Поиск игр в сети недоступен, порт {port} занят: {e}")
+            sock.close()
+            return None
+        sock.setblocking(False)
+        return sock
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        try:
+            msg = proto.loads(data)
+        except ValueError:
+            return
+        if msg.get("command") != "probe":
+            return
+        code = msg.get("code")
+        reply = self.describe(str(code) if code else None, addr[0])
+        if code and not reply.rooms:
+            # ищут конкретную комнату, а у нас её нет — молчим
+            return
+        reply.id = msg.get("id")
+        self.transport.sendto(proto.dumps(reply), addr)
+
+
+def _probe_targets(port: int) -> List[Tuple[str, int]]:
+    # широковещательный адрес каждого подключённого сегмента + локальная машина
+    addresses = ["255.255.255.255", "127.0.0.1"] + broadcast_addresses()
+    return [(address, port) for address in dict.fromkeys(addresses)]
+
+
+# клиентская сторона: рассылает probe и отдаёт ответы по мере прихода;
+# с кодом комнаты возвращается на первом совпадении
+def discover(code: str | None = None,
+             timeout: float = 1.5,
+             on_found: Callable[[Dict], None] | None = None,
+             port: int = DISCOVERY_PORT,
+             stop: Callable[[], bool] | None = None) -> List[Dict]:
+    probe_id = next(_probe_ids)
+    probe = proto.dumps(proto.probe(code, probe_id))
+    targets = _probe_targets(port)
+    found: Dict[str, Dict] = {}
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+        udp.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        started = time.monotonic()
+        deadline = started + timeout
+        schedule = list(PROBE_SCHEDULE)
+        while True:
+            now = time.monotonic()
+            if now >= deadline or (stop and stop()):
+                break
+            while schedule and now - started >= schedule[0]:
+                schedule.pop(0)
+                for target in targets:
+                    try:
+                        udp.sendto(probe, target)
+                    except OSError:
+                        # интерфейс мог пропасть — при следующем поиске перечитаем список
+                        invalidate_interfaces()
+            wait = deadline - now
+            if schedule:
+                wait = min(wait, started + schedule[0] - now)
+            udp.settimeout(max(wait, 0.001))
+            try:
+                data, addr = udp.recvfrom(8192)
+            except socket.timeout:
+                continue
+            except OSError:
+                continue
+            try:
+                reply = proto.loads(data)
+            except ValueError:
+                continue
+            if reply.get("command") != "rooms" or reply.get("id") != probe_id:
+                continue
+            # один сервер отвечает и на broadcast, и на loopback — берём первый ответ
+            key = reply.get("server") or f"{reply['host']}:{reply['port']}"
+            if key in found:
+                continue
+            found[key] = reply
+            logger.info(f"Найден сервер {reply['host']}:{reply['port']} за {(time.monotonic() - started) * 1000:.0f} мс")
+            if on_found:
+                on_found(reply)
+            if code and any(room["code"] == str(code) for room in reply["rooms"]):
+                break
+    return list(found.values())
+
+
+def find_server_by_code(session_code, port: int = DISCOVERY_PORT, timeout: float = 3.0):
+    for reply in discover(str(session_code), timeout=timeout, port=port):
+        if any(room["code"] == str(session_code) for room in reply["rooms"]):
+            return reply["host"], reply["port"]
+    return None, None
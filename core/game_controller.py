@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 import random
+import time as _time
+from collections import deque
 from typing import Callable
 from typing import Set, List, Tuple
 
 from core import protocol as proto
-from core.board import Board
+from core import replay
+from core.authority import AuthoritativeMatch
+from core.board import Board, MoveResult
 from core.element import Element
 from core.enums import Color, Bonus
 from logger import logger
@@ -18,7 +22,8 @@ class GameController:
                  nickname: str,
                  is_client: bool = True,
                  on_send: Callable[[bytes], None] | None = None,
-                 on_close: Callable[[], None] | None = None):
+                 on_close: Callable[[], None] | None = None,
+                 authoritative: bool = False):
         self.is_opp_finish = False
         self.winner_score = None
         self.my_score = None
@@ -54,6 +59,52 @@ class GameController:
         self.score = 0
         self.is_my_step = False
         self.current = ""
+        # режим, в котором каскад считает сервер, а клиенты шлют только намерения
+        self.authoritative = authoritative
+        self.authority: AuthoritativeMatch | None = None
+        self.move_result: MoveResult | None = None
+        self.move_cells: Tuple[Tuple[int, int], Tuple[int, int]] | None = None
+        self.scores: dict[str, int] = {}
+        # lockstep (шахматный режим): по сети идут только координаты обмена,
+        # каскад каждая сторона считает сама на поле с общим seed
+        self.lockstep = False
+        self.last_mover: str | None = None
+        self._resync_pending = False
+        # Move/Desync/Resync приходят в сетевом потоке, а поле принадлежит GUI-потоку:
+        # сообщения ждут здесь, пока GUI не применит их через apply_board_message
+        self.board_inbox: deque[proto.Message] = deque()
+        self._board_appliers = {
+            proto.Move: self._apply_move,
+            proto.Desync: self._apply_desync,
+            proto.Resync: self._apply_resync,
+        }
+        # канал до собеседника (сервера либо, у хоста, клиента) по ping/pong
+        self.rtt: float | None = None
+        self.clock_offset: float | None = None
+        # насколько устарело то, что мы видим от соперника
+        self.opp_lag: float | None = None
+        # обрывы связи: соперник, которого ждём, и наше собственное переподключение
+        self.away_player: str | None = None
+        self.reconnecting = False
+        # запись своего поля в журнал повтора (см. core/replay.py)
+        self.recorder: replay.ReplayRecorder | None = None
+        self._handlers = {
+            proto.StartGame: self.handle_start_game,
+            proto.Swap: self.handle_swap,
+            proto.AutoSwap: self.handle_auto_swap,
+            proto.AutoSwapCircle: self.handle_auto_swap_circle,
+            proto.EndGame: self.end_game,
+            proto.Score: self.handle_score,
+            proto.BoardState: self.handle_board,
+            proto.Time: self.handle_time,
+            proto.Finish: self.handle_finish,
+            proto.Outcome: self.handle_outcome,
+            proto.Move: self.handle_move,
+            proto.Desync: self.handle_desync,
+            proto.Resync: self.handle_resync,
+            proto.Peer: self.handle_peer,
+            proto.ResumeGap: self.handle_resume_gap,
+        }
 
     def _dispatch(self, cmd: str) -> None:
         if self.state_ready:
@@ -68,13 +119,23 @@ class GameController:
         random.shuffle(self.queue)
         self.current = self.queue[0]
         self.is_my_step = self.my_nickname == self.current
+        if self.authoritative:
+            self.authority = AuthoritativeMatch(self.mode, self.queue, self.board.to_matrix())
+        self.lockstep = self.mode == "chess" and not self.authoritative
+        seed = None
+        if self.lockstep:
+            seed = random.getrandbits(32)
+            self.board.reseed(seed)
+        self._start_recording(seed)
 
         msg = proto.start_game(
             mode=self.mode,
             queue=self.queue,
             nicknames=self.nicknames,
             board=self.board.to_matrix(),
-            time_limit=self.time
+            time_limit=self.time,
+            authoritative=self.authoritative,
+            seed=seed
         )
 
         if self._send:
@@ -115,91 +176,214 @@ class GameController:
             self._send(proto.dumps(proto.auto_swap_circle(fallen=fallen, spawned=spawned,
                                                           board_=self.board.to_matrix(), bonuses=bonuses, removed=removed)))
 
-    def handle_command(self, data):
-        if data["command"] == "start_game":
-            self.handle_start_game(data)
-            return True
-        elif data["command"] == "swap":
-            self.handle_swap(data)
-        elif data["command"] == "auto_swap":
-            self.handle_auto_swap(data)
-        elif data["command"] == "end_game":
-            self.end_game(data)
-        elif data["command"] == "score":
-            self.handle_score(data)
-        elif data["command"] == "board":
-            self.handle_board(data)
-        elif data["command"] == "time":
-            self.handle_time(data)
-        elif data["command"] == "finish":
-            self.handle_finish(data)
-        elif data["command"] == "auto_swap_circle":
-            self.handle_auto_swap_circle(data)
-        elif data["command"] == "end_game":
-            self.end_game(data)
-
-    def handle_start_game(self, data):
-        self.queue = data.get("queue_players")
-        self.current = data.get("current_player")
+    def handle_command(self, data) -> bool:
+        # с провода приходит словарь, от хоста и сервера — уже готовое сообщение
+        msg = data if isinstance(data, proto.Message) else proto.decode(data)
+        handler = self._handlers.get(type(msg))
+        if handler is not None:
+            handler(msg)
+        return type(msg) is proto.StartGame
+
+    def handle_start_game(self, msg: proto.StartGame):
+        self.queue = msg.queue_players
+        self.current = msg.current_player
         self.is_my_step = self.my_nickname == self.current
-        self.board = Board()
-        self.time = data.get("time_limit")
-        self.board.board_from_matrix(data.get("board"))
-        self.nicknames = data.get("nicknames")
-        self.mode = data.get("mode")
-
-    def handle_auto_swap(self, data):
+        self.time = msg.time_limit
+        self.board = Board.from_matrix(msg.board, seed=msg.seed)
+        self.lockstep = msg.seed is not None
+        self.nicknames = msg.nicknames
+        self.mode = msg.mode
+        self.authoritative = msg.authoritative
+        self._start_recording(msg.seed)
+
+    def _start_recording(self, seed: int | None):
+        self._stop_recording()
+        if self.my_nickname is None:
+            # комната выделенного сервера: своего поля у неё нет
+            return
+        self.recorder = replay.record_game(self.board, self.mode, self.my_nickname, self.queue, seed)
+
+    def _stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def handle_auto_swap(self, msg: proto.AutoSwap):
         self.fallen = [
             (f["old_r"], f["old_c"], f["new_r"], f["new_c"])
-            for f in data["fallen"]
+            for f in msg.fallen
         ]
         self.spawned = [
             Element(d["x"], d["y"], Color(d["color"]), Bonus[d["bonus"]])
-            for d in data["spawned"]
+            for d in msg.spawned
         ]
         self.is_my_step = self.my_nickname == self.current
         if self.mode == "time":
             self.is_my_step = True
-        self.new_board = data.get("board")
-        self.current = data.get("next_player")
+        self.new_board = msg.board
         self._dispatch("auto_swap")
 
-    def handle_auto_swap_circle(self, data):
+    def handle_auto_swap_circle(self, msg: proto.AutoSwapCircle):
         self.fallen = [
             (f["old_r"], f["old_c"], f["new_r"], f["new_c"])
-            for f in data["fallen"]
+            for f in msg.fallen
         ]
         self.spawned = [
             Element(d["x"], d["y"], Color(d["color"]), Bonus[d["bonus"]])
-            for d in data["spawned"]
+            for d in msg.spawned
         ]
-        self.new_board = data.get("board")
-        self.bonuses = data.get("bonuses")
+        self.new_board = msg.board
+        self.bonuses = msg.bonuses
         self.is_my_step = self.my_nickname == self.current
         if self.mode == "time":
             self.is_my_step = True
         self._dispatch("auto_swap")
 
-    def handle_swap(self, data):
-        self.a_row = data.get("a_row")
-        self.a_col = data.get("a_col")
-        self.b_row = data.get("b_row")
-        self.b_col = data.get("b_col")
-        self.current = data.get("next_player")
+    def handle_swap(self, msg: proto.Swap):
+        self.a_row = msg.a_row
+        self.a_col = msg.a_col
+        self.b_row = msg.b_row
+        self.b_col = msg.b_col
+        self.current = msg.next_player
         self.is_my_step = self.my_nickname == self.current
         if self.mode == "time":
             self.is_my_step = True
 
-        self.removed = data.get("removed")
-        self.bonuses = data.get("bonuses")
-        self.success = data.get("success")
-        self.new_board = data.get("board")
+        self.removed = msg.removed
+        self.bonuses = msg.bonuses
+        self.success = msg.success
+        self.new_board = msg.board
         self.swap_occurred = True
         self._dispatch("swap")
 
-    def end_game(self, data):
-        self.winner_player = data.get("winner")
-        self.winner_score = data.get("score")
+    def swap_intent(self, a: Tuple[int, int], b: Tuple[int, int]):
+        if self.authority:
+            self.apply_intent(self.my_nickname, proto.swap_intent(a, b))
+        elif self._send:
+            self._send(proto.dumps(proto.swap_intent(a, b)))
+
+    def apply_intent(self, nickname: str, msg: proto.SwapIntent) -> proto.Outcome | None:
+        # возвращает отказ, если ход не принят: его получает только автор хода
+        outcome = self.authority.apply_intent(nickname, msg)
+        if outcome is None:
+            rejection = self.authority.rejection(nickname, msg)
+            if rejection is not None and nickname == self.my_nickname:
+                self.handle_outcome(rejection)
+            return rejection
+        if self._send:
+            self._send(proto.dumps(outcome))
+        if self.my_nickname is not None:
+            self.handle_outcome(outcome)
+        return None
+
+    def handle_outcome(self, msg: proto.Outcome):
+        self.current = msg.next_player
+        self.is_my_step = self.my_nickname == self.current
+        if self.mode == "time":
+            self.is_my_step = True
+        self.scores = msg.scores
+        if self.mode == "time" and msg.player != self.my_nickname:
+            # чужое поле в режиме на время — только зеркало соперника
+            self.opp_board = Board.from_matrix(msg.board)
+            self.opp_score = self.scores.get(msg.player, self.opp_score)
+            self._dispatch("board")
+            self._dispatch("score")
+            return
+        self.move_cells = (tuple(msg.a), tuple(msg.b))
+        self.move_result = proto.outcome_result(msg)
+        self.new_board = msg.board
+        self.swap_occurred = True
+        self._dispatch("outcome")
+
+    def play_move(self, a: Tuple[int, int], b: Tuple[int, int]) -> MoveResult:
+        result = self.board.play_move(a, b)
+        self.last_mover = self.my_nickname
+        self.current = self._next_player()
+        self.is_my_step = self.my_nickname == self.current
+        if self._send:
+            self._send(proto.dumps(proto.move(a, b, self.current, [step.checksum for step in result.steps])))
+        return result
+
+    def handle_move(self, msg: proto.Move):
+        # пока ход соперника не применён к полю, ходить нельзя
+        self.is_my_step = False
+        self.board_inbox.append(msg)
+        self._dispatch("outcome")
+
+    def handle_desync(self, msg: proto.Desync):
+        self.board_inbox.append(msg)
+        self._dispatch("resync")
+
+    def handle_resync(self, msg: proto.Resync):
+        self.board_inbox.append(msg)
+        self._dispatch("resync")
+
+    def apply_board_message(self):
+        # вызывается из GUI-потока, по одному разу на каждое "outcome"/"resync" lockstep-режима
+        msg = self.board_inbox.popleft()
+        self._board_appliers[type(msg)](msg)
+
+    def _apply_move(self, msg: proto.Move):
+        a, b = tuple(msg.a), tuple(msg.b)
+        result = self.board.play_move(a, b)
+        # ходил тот, чья была очередь
+        self.last_mover = self.current
+        expected = msg.checksums
+        got = [step.checksum for step in result.steps]
+        if got != expected and not self._resync_pending:
+            step = next((i for i, (x, y) in enumerate(zip(got, expected)) if x != y), min(len(got), len(expected)))
+            logger.warning(f"Расхождение поля на шаге {step}, запрашиваем синхронизацию")
+            self._resync_pending = True
+            if self._send:
+                self._send(proto.dumps(proto.desync(step)))
+        self.current = msg.next_player
+        # пока поле не синхронизировано, ходить нельзя
+        self.is_my_step = self.my_nickname == self.current and not self._resync_pending
+        self.move_cells = (a, b)
+        self.move_result = result
+        self.swap_occurred = False
+
+    def _apply_desync(self, msg: proto.Desync):
+        # поле восстанавливает тот, чей ход разошёлся (step -1 — соперник пропустил ходы при обрыве)
+        if self.last_mover != self.my_nickname and msg.step != -1:
+            return
+        seed = random.getrandbits(32)
+        matrix = self.board.to_matrix()
+        # перечитываем своё поле из той же матрицы, чтобы обе стороны начали с одинакового состояния
+        self.board.board_from_matrix(matrix)
+        self.board.reseed(seed)
+        if self._send:
+            self._send(proto.dumps(proto.resync(matrix, seed)))
+
+    def _apply_resync(self, msg: proto.Resync):
+        self.board.board_from_matrix(msg.board)
+        self.board.reseed(msg.seed)
+        self._resync_pending = False
+        self.is_my_step = self.my_nickname == self.current
+
+    def handle_peer(self, msg: proto.Peer):
+        if msg.nickname == self.my_nickname:
+            # о своём же обрыве узнаём из журнала при возвращении
+            return
+        self.away_player = msg.nickname if msg.status == "away" else None
+        self._dispatch("peer")
+
+    def handle_resume_gap(self, msg: proto.ResumeGap):
+        # пропущенные ходы в журнал сервера не поместились — просим у соперника поле целиком
+        if self.lockstep and not self._resync_pending:
+            self._resync_pending = True
+            self.is_my_step = False
+            if self._send:
+                self._send(proto.dumps(proto.desync(-1)))
+
+    def set_reconnecting(self, value: bool):
+        self.reconnecting = value
+        self._dispatch("reconnecting")
+
+    def end_game(self, msg: proto.EndGame):
+        self.winner_player = msg.winner
+        self.winner_score = msg.score
+        self._stop_recording()
         self._dispatch("end_game")
 
     def _compute_and_end_game(self):
@@ -212,11 +396,13 @@ class GameController:
         self.end_game(proto.end_game(winner=winner, score_=winning_score))
 
     def close_game(self):
+        self._stop_recording()
         if self._close_net:
             self._close_net()
 
     def handle_error(self, nickname: str | None = None):
         self.exit_nickname = nickname
+        self._stop_recording()
         self._dispatch("error")
 
     def update_board(self):
@@ -224,30 +410,51 @@ class GameController:
             self.swap_occurred = False
             self.board.board_from_matrix(self.new_board)
 
+    def _server_time(self) -> float | None:
+        # метки времени идут по часам сервера: у хоста это его собственные часы,
+        # клиент переводит свои через смещение до сервера (пока оно неизвестно — метки нет)
+        if not self.is_client:
+            return _time.time()
+        if self.clock_offset is None:
+            return None
+        return _time.time() + self.clock_offset
+
     def time_update(self, time: int):
         if self._send:
-            self._send(proto.dumps(proto.time(time_=time)))
+            self._send(proto.dumps(proto.time(time_=time, ts=self._server_time())))
 
-    def handle_time(self, data):
-        self.opp_time = data.get("time")
+    def handle_time(self, msg: proto.Time):
+        self.opp_time = msg.time
+        now = self._server_time()
+        if msg.ts is not None and now is not None:
+            self.opp_lag = max(0.0, now - msg.ts)
         self._dispatch("time")
 
+    def update_link(self, rtt: float, clock_offset: float):
+        self.rtt = rtt
+        self.clock_offset = clock_offset
+        self._dispatch("link")
+
     def score_update(self, score: int):
         print("update score")
+        if self.authoritative:
+            # счёт считает сервер и рассылает в outcome
+            return
         if self._send:
             self._send(proto.dumps(proto.score(score_=score)))
 
-    def handle_score(self, data):
-        self.opp_score = data.get("score")
+    def handle_score(self, msg: proto.Score):
+        self.opp_score = msg.score
         self._dispatch("score")
 
     def board_update_for_opp(self):
+        if self.authoritative:
+            return
         if self._send:
             self._send(proto.dumps(proto.board(board_=self.board.to_matrix())))
 
-    def handle_board(self, data):
-        self.opp_board = Board()
-        self.opp_board.board_from_matrix(data.get("board"))
+    def handle_board(self, msg: proto.BoardState):
+        self.opp_board = Board.from_matrix(msg.board)
         self._dispatch("board")
 
     @property
@@ -259,12 +466,29 @@ class GameController:
 
     def finish(self, score: int):
         self.my_score = score
-        if self.is_opp_finish:
+        if self.authority is not None:
+            self.my_score = self.authority.scores.get(self.my_nickname, score)
+            if self._send:
+                self._send(proto.dumps(proto.finish(score_=self.my_score)))
+            self.finish_player(self.my_nickname)
+        elif self.authoritative:
+            # итог подведёт сервер, по своему счёту
+            if self._send:
+                self._send(proto.dumps(proto.finish(score_=score)))
+        elif self.is_opp_finish:
             self._compute_and_end_game()
         else:
             if self._send:
                 self._send(proto.dumps(proto.finish(score_=score)))
 
-    def handle_finish(self, data):
+    def finish_player(self, nickname: str):
+        end = self.authority.finish(nickname)
+        if end is None:
+            return
+        if self._send:
+            self._send(proto.dumps(end))
+        self.end_game(end)
+
+    def handle_finish(self, msg: proto.Finish):
         self.is_opp_finish = True
-        self.opp_score = data.get("score")
+        self.opp_score = msg.score
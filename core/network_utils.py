@@ -1,39 +1,161 @@
+from __future__ import annotations
+
+import ipaddress
+import os
 import socket
+import struct
+import threading
 import time
+from dataclasses import dataclass
+from typing import List
 
 from logger import logger
 
+# порт игрового сервера; на нём же (UDP) серверы отвечают на поиск игр, см. core/discovery.py
+DISCOVERY_PORT = 8080
+
+# список интерфейсов меняется редко (подключили кабель, сменили Wi-Fi)
+INTERFACES_TTL = 30.0
+
+
+@dataclass(frozen=True)
+class Interface:
+    name: str
+    address: str
+    netmask: str
+    broadcast: str
+
+    @property
+    def network(self) -> ipaddress.IPv4Network:
+        return ipaddress.IPv4Network(f"{self.address}/{self.netmask}", strict=False)
+
+    @property
+    def is_loopback(self) -> bool:
+        return ipaddress.IPv4Address(self.address).is_loopback
+
+
+def _make_interface(name: str, address: str, netmask: str, broadcast: str | None = None) -> Interface:
+    if not broadcast or broadcast == "0.0.0.0":
+        broadcast = str(ipaddress.IPv4Network(f"{address}/{netmask}", strict=False).broadcast_address)
+    return Interface(name, address, netmask, broadcast)
+
+
+def _linux_interfaces() -> List[Interface]:
+    import fcntl
+
+    SIOCGIFADDR, SIOCGIFBRDADDR, SIOCGIFNETMASK = 0x8915, 0x8919, 0x891B
+
+    def ioctl_addr(sock, request, name: bytes) -> str:
+        res = fcntl.ioctl(sock.fileno(), request, struct.pack("256s", name[:15]))
+        return socket.inet_ntoa(res[20:24])
+
+    result = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            raw = name.encode()
+            try:
+                address = ioctl_addr(sock, SIOCGIFADDR, raw)
+            except OSError:
+                # интерфейс без IPv4
+                continue
+            netmask = ioctl_addr(sock, SIOCGIFNETMASK, raw)
+            try:
+                broadcast = ioctl_addr(sock, SIOCGIFBRDADDR, raw)
+            except OSError:
+                broadcast = None
+            result.append(_make_interface(name, address, netmask, broadcast))
+    return result
+
+
+def _windows_interfaces() -> List[Interface]:
+    import ctypes
+    from ctypes import wintypes
+
+    class MIB_IPADDRROW(ctypes.Structure):
+        _fields_ = [("dwAddr", wintypes.DWORD), ("dwIndex", wintypes.DWORD),
+                    ("dwMask", wintypes.DWORD), ("dwBCastAddr", wintypes.DWORD),
+                    ("dwReasmSize", wintypes.DWORD), ("unused1", wintypes.USHORT),
+                    ("wType", wintypes.USHORT)]
+
+    get_table = ctypes.windll.iphlpapi.GetIpAddrTable
+    size = wintypes.ULONG(0)
+    get_table(None, ctypes.byref(size), False)
+    buf = ctypes.create_string_buffer(size.value)
+    if get_table(buf, ctypes.byref(size), False) != 0:
+        raise OSError("GetIpAddrTable failed")
+    count = wintypes.DWORD.from_buffer(buf).value
+    rows = (MIB_IPADDRROW * count).from_buffer(buf, ctypes.sizeof(wintypes.DWORD))
+
+    def to_str(value: int) -> str:
+        # адреса в таблице хранятся в сетевом порядке байт
+        return socket.inet_ntoa(struct.pack("<I", value))
 
-def get_local_ip():
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-        s.connect(("8.8.8.8", 80))
-        return s.getsockname()[0]
+    return [_make_interface(str(row.dwIndex), to_str(row.dwAddr), to_str(row.dwMask))
+            for row in rows if row.dwAddr]
+
+
+def _hostname_interfaces() -> List[Interface]:
+    # запасной вариант без маски: считаем сеть /24
+    addresses = {info[4][0] for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)}
+    return [_make_interface("host", address, "255.255.255.0") for address in sorted(addresses)]
+
+
+_cache: List[Interface] | None = None
+_cache_time = 0.0
+_cache_lock = threading.Lock()
+
+
+def invalidate_interfaces():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def local_interfaces() -> List[Interface]:
+    # все IPv4-интерфейсы машины; внешний маршрут (и вообще сеть) не нужен
+    global _cache, _cache_time
+    with _cache_lock:
+        if _cache is not None and time.monotonic() - _cache_time < INTERFACES_TTL:
+            return _cache
+        result: List[Interface] = []
+        for probe in ((_windows_interfaces,) if os.name == "nt" else (_linux_interfaces,)) + (_hostname_interfaces,):
+            try:
+                result = probe()
+            except (OSError, ImportError, AttributeError, ValueError) as e:
+                logger.warning(f"Не удалось получить интерфейсы через {probe.__name__}: {e}")
+                continue
+            if result:
+                break
+        if not any(iface.is_loopback for iface in result):
+            result.append(_make_interface("lo", "127.0.0.1", "255.0.0.0"))
+        _cache, _cache_time = result, time.monotonic()
+        return result
+
+
+def get_local_ip() -> str:
+    lan = [iface for iface in local_interfaces() if not iface.is_loopback]
+    # приоритет — частные сети: через них обычно и играют по LAN
+    lan.sort(key=lambda iface: not ipaddress.IPv4Address(iface.address).is_private)
+    return lan[0].address if lan else "127.0.0.1"
+
+
+def broadcast_addresses() -> List[str]:
+    return [iface.broadcast for iface in local_interfaces() if not iface.is_loopback]
+
+
+def address_for_peer(peer_ip: str) -> str:
+    # наш адрес в том же сегменте, что и собеседник
+    try:
+        peer = ipaddress.IPv4Address(peer_ip)
+    except ValueError:
+        return get_local_ip()
+    for iface in local_interfaces():
+        if peer in iface.network:
+            return iface.address
+    return get_local_ip()
 
 
 def get_free_port():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind(("", 0))
         return s.getsockname()[1]
-
-
-def find_server_by_port(port):
-    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    try:
-        udp.bind(("", port))
-    except OSError as e:
-        logger.error(f"Ошибка при привязке к порту {port}: {e}")
-        return None, None
-
-    timeout = time.time() + 15
-    while time.time() < timeout:
-        try:
-            udp.settimeout(5)
-            data, addr = udp.recvfrom(1024)
-            code, ip, srv_port = data.decode().split(":")
-            if code == str(port):
-                return ip, int(srv_port)
-        except socket.timeout:
-            continue
-
-    return None, None
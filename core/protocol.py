@@ -1,8 +1,12 @@
+from __future__ import annotations
+
 import json
-from typing import Dict, List, Tuple, Any, Set, Union
+from dataclasses import dataclass, fields, MISSING
+from typing import Dict, List, Tuple, Any, Set, ClassVar
 
+from core.board import Board, CascadeStep, MoveResult
 from core.element import Element
-from core.enums import Bonus
+from core.enums import Bonus, Color
 
 
 def _elem_to_dict(e: Element) -> Dict[str, Any]:
@@ -18,30 +22,339 @@ def _dict_to_elem(d: Dict[str, Any]) -> Element:
     return e
 
 
-def dumps(msg: Dict[str, Any]) -> bytes:
-    return json.dumps(msg, ensure_ascii=False).encode()
+# сообщения разделяются переводом строки: json.dumps экранирует \n внутри строк
+FRAME_END = b"\n"
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+# типы полей по аннотации (с from __future__ аннотации — строки)
+_FIELD_TYPES = {"int": int, "float": (int, float), "str": str, "bool": bool, "List": list, "Dict": dict}
+_BOARD_CHARS = frozenset("ROPYBHV.roypbhv")
+# команда -> класс сообщения
+MESSAGES: Dict[str, type] = {}
+
+
+def _valid_cell(cell) -> bool:
+    return (isinstance(cell, (list, tuple)) and len(cell) == 2
+            and all(type(v) is int for v in cell)
+            and 0 <= cell[0] < Board.ROWS and 0 <= cell[1] < Board.COLS)
+
+
+def _adjacent(a, b) -> bool:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1
+
+
+def _valid_board(rows) -> bool:
+    # строки поля приходят и списками символов, и строками (outcome, resync)
+    return (isinstance(rows, list) and len(rows) == Board.ROWS
+            and all(isinstance(row, (list, str)) and len(row) == Board.COLS
+                    and all(ch in _BOARD_CHARS for ch in row) for row in rows))
+
+
+# одно сообщение протокола: на проводе — JSON-объект с command первым полем
+# (см. transport.peek_command), seq и from дописывает комната при рассылке
+@dataclass(slots=True, kw_only=True)
+class Message:
+    command: ClassVar[str] = ""
+    # (атрибут, ключ на проводе)
+    _wire: ClassVar[Tuple[Tuple[str, str], ...]] = ()
+    # (атрибут, ключ, допустимые типы, обязательное)
+    _checks: ClassVar[Tuple[Tuple[str, str, Any, bool], ...]] = ()
+    _validated: ClassVar[bool] = False
+
+    seq: int | None = None
+    sender: str | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        msg = {"command": self.command}
+        for attr, key in self._wire:
+            value = getattr(self, attr)
+            if value is not None:
+                msg[key] = value
+        return msg
+
+    def validate(self):
+        pass
+
+
+def _wire_key(name: str) -> str:
+    # from — ключевое слово Python
+    return "from" if name == "sender" else name
+
+
+def _field_check(annotation: str):
+    base = annotation.split("|")[0].split("[")[0].strip()
+    return _FIELD_TYPES.get(base)
+
+
+def message(command: str):
+    def register(cls):
+        cls = dataclass(slots=True, kw_only=True)(cls)
+        cls.command = command
+        own = [f for f in fields(cls) if f.name not in ("seq", "sender")]
+        base = [f for f in fields(cls) if f.name in ("seq", "sender")]
+        cls._wire = tuple((f.name, _wire_key(f.name)) for f in own + base)
+        cls._checks = tuple(
+            (f.name, _wire_key(f.name), _field_check(f.type),
+             f.default is MISSING and f.default_factory is MISSING)
+            for f in own + base
+        )
+        cls._validated = cls.validate is not Message.validate
+        MESSAGES[command] = cls
+        return cls
+    return register
+
+
+def decode(data: Dict[str, Any]) -> Message:
+    # единственная точка, где словарь с провода становится сообщением: всё,
+    # что дальше попадает на поле, уже проверено здесь
+    try:
+        cls = MESSAGES[data["command"]]
+    except (KeyError, TypeError):
+        raise ProtocolError(f"Неизвестная команда в {str(data)[:80]}") from None
+    kwargs = {}
+    for attr, key, types, required in cls._checks:
+        value = data.get(key)
+        if value is None:
+            if required:
+                raise ProtocolError(f"{cls.command}: нет поля {key}")
+        elif types is None or isinstance(value, types):
+            kwargs[attr] = value
+        else:
+            raise ProtocolError(f"{cls.command}: поле {key} не {cls.__annotations__.get(attr, '?')}")
+    msg = cls(**kwargs)
+    if cls._validated:
+        msg.validate()
+    return msg
+
+
+def dumps(msg: Message | Dict[str, Any]) -> bytes:
+    if isinstance(msg, Message):
+        msg = msg.to_dict()
+    return json.dumps(msg, ensure_ascii=False).encode() + FRAME_END
 
 
 def loads(raw: bytes) -> Dict[str, Any]:
     return json.loads(raw.decode())
 
 
+@message("start_game")
+class StartGame(Message):
+    mode: str
+    queue_players: List[str]
+    current_player: str
+    nicknames: List[str]
+    board: List[List[str]]
+    time_limit: int
+    authoritative: bool = False
+    seed: int | None = None
+
+    def validate(self):
+        if not _valid_board(self.board):
+            raise ProtocolError("start_game: некорректное поле")
+        if self.current_player not in self.queue_players:
+            raise ProtocolError("start_game: первый игрок не в очереди")
+
+
+@message("swap")
+class Swap(Message):
+    a_row: int
+    a_col: int
+    b_row: int
+    b_col: int
+    next_player: str
+    board: List[List[str]]
+    success: bool
+    removed: List[List[int]]
+    bonuses: List[Dict[str, Any]]
+
+    def validate(self):
+        if not (_valid_cell((self.a_row, self.a_col)) and _valid_cell((self.b_row, self.b_col))):
+            raise ProtocolError("swap: клетка вне поля")
+        if not _valid_board(self.board):
+            raise ProtocolError("swap: некорректное поле")
+
+
+@message("auto_swap")
+class AutoSwap(Message):
+    fallen: List[Dict[str, int]]
+    spawned: List[Dict[str, Any]]
+    board: List[List[str]]
+
+    def validate(self):
+        if not _valid_board(self.board):
+            raise ProtocolError("auto_swap: некорректное поле")
+
+
+@message("board")
+class BoardState(Message):
+    board: List[List[str]]
+
+    def validate(self):
+        if not _valid_board(self.board):
+            raise ProtocolError("board: некорректное поле")
+
+
+@message("score")
+class Score(Message):
+    score: int
+
+
+@message("time")
+class Time(Message):
+    time: int
+    ts: float | None = None
+
+
+@message("auto_swap_circle")
+class AutoSwapCircle(Message):
+    fallen: List[Dict[str, int]]
+    removed: List[List[int]]
+    spawned: List[Dict[str, Any]]
+    bonuses: List[Dict[str, Any]]
+    board: List[List[str]]
+
+    def validate(self):
+        if not _valid_board(self.board):
+            raise ProtocolError("auto_swap_circle: некорректное поле")
+
+
+@message("end_game")
+class EndGame(Message):
+    winner: str
+    score: int
+
+
+@message("finish")
+class Finish(Message):
+    score: int
+
+
+@message("join")
+class Join(Message):
+    code: str
+    nickname: str
+    token: str | None = None
+    last_seq: int | None = None
+    # "spectator" — зритель: только получает ход партии
+    role: str | None = None
+
+
+@message("swap_intent")
+class SwapIntent(Message):
+    a: List[int]
+    b: List[int]
+
+    def validate(self):
+        if not (_valid_cell(self.a) and _valid_cell(self.b) and _adjacent(self.a, self.b)):
+            raise ProtocolError(f"swap_intent: некорректный ход {self.a} {self.b}")
+
+
+@message("outcome")
+class Outcome(Message):
+    player: str
+    a: List[int]
+    b: List[int]
+    ok: bool
+    steps: List[Dict[str, Any]]
+    board: List[str]
+    scores: Dict[str, int]
+    next_player: str
+
+    def validate(self):
+        if not (_valid_cell(self.a) and _valid_cell(self.b)):
+            raise ProtocolError("outcome: клетка вне поля")
+        if not _valid_board(self.board):
+            raise ProtocolError("outcome: некорректное поле")
+
+
+@message("move")
+class Move(Message):
+    a: List[int]
+    b: List[int]
+    next_player: str
+    checksums: List[int]
+
+    def validate(self):
+        if not (_valid_cell(self.a) and _valid_cell(self.b) and _adjacent(self.a, self.b)):
+            raise ProtocolError(f"move: некорректный ход {self.a} {self.b}")
+
+
+@message("desync")
+class Desync(Message):
+    step: int
+
+
+@message("resync")
+class Resync(Message):
+    board: List[str]
+    seed: int
+
+    def validate(self):
+        if not _valid_board(self.board):
+            raise ProtocolError("resync: некорректное поле")
+
+
+@message("ping")
+class Ping(Message):
+    # номер ping передаётся в seq
+    t0: float
+
+
+@message("pong")
+class Pong(Message):
+    t0: float
+    t1: float
+
+
+@message("probe")
+class Probe(Message):
+    code: str | None = None
+    id: int | None = None
+
+
+@message("rooms")
+class Rooms(Message):
+    # server отличает сервер, ответивший на probe сразу по нескольким адресам
+    server: str
+    host: str
+    port: int
+    rooms: List[Dict[str, Any]]
+    id: int | None = None
+
+
+@message("session")
+class Session(Message):
+    token: str
+
+
+@message("peer")
+class Peer(Message):
+    # status: "away" — игрок потерял связь и может вернуться, "back" — вернулся
+    nickname: str
+    status: str
+
+
+@message("resume_gap")
+class ResumeGap(Message):
+    # пропущенное не поместилось в журнал комнаты: пришли только последние состояния
+    pass
+
+
 def start_game(
         mode: str,
         queue: List[str],
         nicknames: List[str],
         board: List[List[str]],
-        time_limit: int
-) -> Dict[str, Any]:
-    return {
-        "command": "start_game",
-        "mode": mode,
-        "queue_players": queue,
-        "current_player": queue[0],
-        "nicknames": nicknames,
-        "board": board,
-        "time_limit": time_limit
-    }
+        time_limit: int,
+        authoritative: bool = False,
+        seed: int | None = None
+) -> StartGame:
+    return StartGame(mode=mode, queue_players=queue, current_player=queue[0], nicknames=nicknames,
+                     board=board, time_limit=time_limit, authoritative=authoritative, seed=seed)
 
 
 def swap(
@@ -52,63 +365,53 @@ def swap(
         bonuses: List[Tuple[int, int, Bonus]],
         success: bool,
         board: List[List[str]]
-) -> Dict[str, Any]:
+) -> Swap:
     a_row, a_col = a_lbl
     b_row, b_col = b_lbl
-    return {
-        "command": "swap",
-        "a_row": a_row,
-        "a_col": a_col,
-        "b_row": b_row,
-        "b_col": b_col,
-        "next_player": next_player,
-        "board": board,
-        "success": success,
-        "removed": [[r, c] for (r, c) in sorted(removed)],
-        "bonuses": [
+    return Swap(
+        a_row=a_row,
+        a_col=a_col,
+        b_row=b_row,
+        b_col=b_col,
+        next_player=next_player,
+        board=board,
+        success=success,
+        removed=[[r, c] for (r, c) in sorted(removed)],
+        bonuses=[
             {"r": r, "c": c, "bonus": bonus.name}
             for (r, c, bonus) in bonuses
         ]
-    }
+    )
 
 
 def auto_swap(
         fallen: List[Tuple[int, int, int, int]],
         spawned: List[Element],
         board: List[List[str]]
-) -> Dict[str, Any]:
-    return {
-        "command": "auto_swap",
-        "fallen": [
+) -> AutoSwap:
+    return AutoSwap(
+        fallen=[
             {"old_r": o_r, "old_c": o_c, "new_r": n_r, "new_c": n_c}
             for o_r, o_c, n_r, n_c in fallen
         ],
-        "spawned": [
+        spawned=[
             _elem_to_dict(e) for e in spawned
         ],
-        "board": board,
-    }
+        board=board,
+    )
 
 
-def board(board_: List[List[str]]) -> Dict[str, Any]:
-    return {
-        "command": "board",
-        "board": board_,
-    }
+def board(board_: List[List[str]]) -> BoardState:
+    return BoardState(board=board_)
 
 
-def score(score_: int) -> Dict[str, Any]:
-    return {
-        "command": "score",
-        "score": score_,
-    }
+def score(score_: int) -> Score:
+    return Score(score=score_)
 
 
-def time(time_: int) -> Dict[str, Any]:
-    return {
-        "command": "time",
-        "time": time_,
-    }
+def time(time_: int, ts: float | None = None) -> Time:
+    # ts — часы отправителя, по ним получатель оценивает отставание
+    return Time(time=time_, ts=ts)
 
 
 def auto_swap_circle(
@@ -117,28 +420,137 @@ def auto_swap_circle(
         removed: Set[Tuple[int, int]],
         bonuses: List[Tuple[int, int, Bonus]],
         board_: List[List[str]]
-) -> Dict[str, Any]:
-    return {
-        "command": "auto_swap_circle",
-        "fallen": [
+) -> AutoSwapCircle:
+    return AutoSwapCircle(
+        fallen=[
             {"old_r": o_r, "old_c": o_c, "new_r": n_r, "new_c": n_c}
             for o_r, o_c, n_r, n_c in fallen
         ],
-        "removed": [[r, c] for (r, c) in sorted(removed)],
-        "spawned": [
+        removed=[[r, c] for (r, c) in sorted(removed)],
+        spawned=[
             _elem_to_dict(e) for e in spawned
         ],
-        "bonuses": [
+        bonuses=[
             {"r": r, "c": c, "bonus": bonus.name}
             for (r, c, bonus) in bonuses
         ],
-        "board": board_,
+        board=board_,
+    )
+
+
+def end_game(winner: str, score_: int) -> EndGame:
+    return EndGame(winner=winner, score=score_)
+
+
+def finish(score_: int) -> Finish:
+    return Finish(score=score_)
+
+
+def join(code: str, nickname: str, token: str | None = None, last_seq: int | None = None,
+         spectator: bool = False) -> Join:
+    msg = Join(code=code, nickname=nickname)
+    if spectator:
+        # зритель только получает ход партии, его сообщения сервер не пересылает
+        msg.role = "spectator"
+    if token is not None:
+        # повторный вход в идущую партию после обрыва связи
+        msg.token = token
+        msg.last_seq = last_seq or 0
+    return msg
+
+
+def swap_intent(a: Tuple[int, int], b: Tuple[int, int]) -> SwapIntent:
+    return SwapIntent(a=list(a), b=list(b))
+
+
+def _step_to_dict(step: CascadeStep) -> Dict[str, Any]:
+    return {
+        "removed": [[r, c] for (r, c) in sorted(step.removed)],
+        "bonuses": [[r, c, bonus.name] for (r, c, bonus) in step.bonuses],
+        "fallen": [list(f) for f in step.fallen],
+        "spawned": [[r, c, color.value] for (r, c, color) in step.spawned],
     }
 
 
-def end_game(winner: str, score_: int) -> Dict:
-    return {"command": "end_game", "winner": winner, "score": score_}
+def _dict_to_step(d: Dict[str, Any]) -> CascadeStep:
+    return CascadeStep(
+        removed={(r, c) for r, c in d["removed"]},
+        bonuses=[(r, c, Bonus[name]) for r, c, name in d["bonuses"]],
+        fallen=[tuple(f) for f in d["fallen"]],
+        spawned=[(r, c, Color(value)) for r, c, value in d["spawned"]],
+    )
+
+
+def outcome(
+        player: str,
+        a: Tuple[int, int],
+        b: Tuple[int, int],
+        result: MoveResult,
+        board_: List[List[str]],
+        scores: Dict[str, int],
+        next_player: str
+) -> Outcome:
+    return Outcome(
+        player=player,
+        a=list(a),
+        b=list(b),
+        ok=result.success,
+        steps=[_step_to_dict(step) for step in result.steps],
+        board=["".join(row) for row in board_],
+        scores=scores,
+        next_player=next_player,
+    )
+
+
+def outcome_result(msg: Outcome) -> MoveResult:
+    return MoveResult(msg.ok, [_dict_to_step(d) for d in msg.steps])
+
+
+def move(a: Tuple[int, int], b: Tuple[int, int], next_player: str, checksums: List[int]) -> Move:
+    # lockstep: каскад соперник считает сам по общему seed, сверяя суммы шагов
+    return Move(a=list(a), b=list(b), next_player=next_player, checksums=checksums)
+
+
+def desync(step: int) -> Desync:
+    return Desync(step=step)
+
+
+def resync(board_: List[List[str]], seed: int) -> Resync:
+    return Resync(board=["".join(row) for row in board_], seed=seed)
+
+
+def ping(seq: int, t0: float) -> Ping:
+    return Ping(seq=seq, t0=t0)
+
+
+def pong(seq: int, t0: float, t1: float) -> Pong:
+    # t0 — часы отправителя ping, t1 — часы ответившего
+    return Pong(seq=seq, t0=t0, t1=t1)
+
+
+def probe(code: str | None, probe_id: int) -> Probe:
+    return Probe(code=code, id=probe_id)
+
+
+def rooms(server_id: str, host: str, port: int, rooms_: List[Dict[str, Any]]) -> Rooms:
+    return Rooms(server=server_id, host=host, port=port, rooms=rooms_)
+
+
+def stamp(data: bytes, seq: int, sender: str | None = None) -> bytes:
+    # номер и автора дописываем в уже готовый кадр, без повторной сериализации
+    tail = b', "seq": %d' % seq
+    if sender is not None:
+        tail += b', "from": ' + json.dumps(sender, ensure_ascii=False).encode()
+    return data[:-2] + tail + b"}\n"
+
+
+def session(token: str) -> Session:
+    return Session(token=token)
+
+
+def peer(nickname: str, status: str) -> Peer:
+    return Peer(nickname=nickname, status=status)
 
 
-def finish(score_: int) -> Dict:
-    return {"command": "finish", "score": score_}
+def resume_gap() -> ResumeGap:
+    return ResumeGap()
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import queue
+import random
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Tuple
+
+from core.board import Board, MoveResult
+from core.element import Element
+from logger import logger
+
+# запись партии в бинарный журнал, только дозапись:
+#   заголовок MAGIC + версия, затем записи [тип u8][длина u16][данные].
+# Ход занимает 9 байт (+7 на каждый шаг каскада с контрольной суммой).
+# Поле при старте и seed полного генератора позволяют переиграть партию бит в бит
+MAGIC = b"M3RP"
+VERSION = 1
+REPLAY_DIR = "replays"
+# бенчмарки и тесты выключают запись, чтобы не засорять каталог
+enabled = True
+
+REC_START = 1    # seed u32, время начала (unix) f64, поле ROWS*COLS байт, мета в JSON
+REC_SWAP = 2     # мс от начала u32, клетка a u8, клетка b u8 (r * COLS + c)
+REC_CASCADE = 3  # crc32 поля после осыпания u32
+REC_BOARD = 4    # поле целиком, навязанное извне (сервер, resync)
+REC_SEED = 5     # есть ли seed u8, seed u32
+REC_END = 6      # мс от начала u32
+
+HEADER = MAGIC + bytes([VERSION])
+RECORD = struct.Struct("<BH")
+_START = struct.Struct("<Id")
+_SWAP = struct.Struct("<IBB")
+_U32 = struct.Struct("<I")
+_SEED = struct.Struct("<?I")
+
+
+def pack_board(mat: list[list[str]] | list[str]) -> bytes:
+    return "".join("".join(row) for row in mat).encode("ascii")
+
+
+def unpack_board(data: bytes) -> list[str]:
+    text = data.decode("ascii")
+    return [text[r * Board.COLS:(r + 1) * Board.COLS] for r in range(Board.ROWS)]
+
+
+def _cell(rc: Tuple[int, int]) -> int:
+    return rc[0] * Board.COLS + rc[1]
+
+
+def _rc(cell: int) -> Tuple[int, int]:
+    return divmod(cell, Board.COLS)
+
+
+class ReplayRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.closed = False
+        self._t0 = time.monotonic()
+        # игровой цикл только кладёт байты в очередь, на диск пишет отдельный поток
+        self._queue: queue.SimpleQueue[bytes | None] = queue.SimpleQueue()
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._queue.put(HEADER)
+        self._thread = threading.Thread(target=self._write_loop, name="replay-writer", daemon=True)
+        self._thread.start()
+
+    def _ms(self) -> int:
+        return int((time.monotonic() - self._t0) * 1000) & 0xFFFFFFFF
+
+    def _put(self, kind: int, payload: bytes):
+        if not self.closed:
+            self._queue.put(RECORD.pack(kind, len(payload)) + payload)
+
+    def start(self, board: Board, seed: int, meta: dict):
+        self._put(REC_START, _START.pack(seed, time.time()) + pack_board(board.to_matrix())
+                  + json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def swap(self, a: Tuple[int, int], b: Tuple[int, int]):
+        self._put(REC_SWAP, _SWAP.pack(self._ms(), _cell(a), _cell(b)))
+
+    def cascade(self, checksum: int):
+        self._put(REC_CASCADE, _U32.pack(checksum))
+
+    def board(self, mat: list[list[str]] | list[str]):
+        self._put(REC_BOARD, pack_board(mat))
+
+    def reseed(self, seed: int | None):
+        self._put(REC_SEED, _SEED.pack(seed is not None, seed or 0))
+
+    def close(self):
+        if self.closed:
+            return
+        self._put(REC_END, _U32.pack(self._ms()))
+        self.closed = True
+        self._queue.put(None)
+
+    def _write_loop(self):
+        stop = False
+        try:
+            while not stop:
+                batch = [self._queue.get()]
+                # всё, что успело накопиться, пишем одним вызовом
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    stop = True
+                    batch.pop()
+                self._file.write(b"".join(batch))
+                self._file.flush()
+        except OSError as e:
+            logger.warning(f"Запись повтора {self.path} прервана: {e}")
+        finally:
+            self._file.close()
+
+
+def _safe_name(text: str) -> str:
+    return re.sub(r"[^\w-]", "_", text)[:32] or "player"
+
+
+def record_game(board: Board, mode: str, nickname: str | None, queue_players: List[str],
+                seed: int | None = None) -> ReplayRecorder | None:
+    if not enabled:
+        return None
+    if seed is None:
+        # без seed спавн не воспроизвести; свой seed на игру не влияет
+        seed = random.getrandbits(32)
+    # генератор с этого момента должен совпадать с Random(seed) у того, кто переигрывает
+    board.reseed(seed)
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{mode or 'solo'}-{_safe_name(nickname or 'solo')}"
+    try:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        path = os.path.join(REPLAY_DIR, stem + ".m3r")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(REPLAY_DIR, f"{stem}-{n}.m3r")
+            n += 1
+        recorder = ReplayRecorder(path)
+    except OSError as e:
+        logger.warning(f"Не удалось начать запись повтора: {e}")
+        return None
+    recorder.start(board, seed, {"mode": mode, "nickname": nickname, "queue": queue_players,
+                                 "rows": Board.ROWS, "cols": Board.COLS})
+    board.recorder = recorder
+    logger.info(f"Запись повтора: {recorder.path}")
+    return recorder
+
+
+class ReplayError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class ReplayMove:
+    index: int
+    # мс от начала партии
+    ms: int
+    a: Tuple[int, int]
+    b: Tuple[int, int]
+
+
+# снимок поля для перемотки: элементы с цветом бонусов (матрица его теряет) и состояние генератора
+@dataclass(slots=True)
+class Keyframe:
+    event: int
+    cells: tuple
+    rng_state: tuple
+
+
+class ReplayReader:
+    # через сколько ходов запоминать снимок: перемотка — не больше стольких ходов пересчёта
+    KEYFRAME_EVERY = 32
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ReplayError(f"{path}: пустой файл")
+        if self._map[:len(HEADER)] != HEADER:
+            self._map.close()
+            raise ReplayError(f"{path}: не журнал повтора")
+        # (тип, смещение данных, длина) каждой записи; сами данные читаем из mmap по требованию
+        self._events: List[Tuple[int, int, int]] = []
+        self._moves: List[int] = []
+        self.seed = 0
+        self.started_at = 0.0
+        self.start_board: list[str] = []
+        self.meta: dict = {}
+        self.duration_ms = 0
+        self.finished = False
+        self._scan()
+        self.keyframes: List[Keyframe] = []
+        # ходы, после которых каскад не сошёлся с записанными контрольными суммами
+        self.mismatches: List[int] = []
+        self._pending: List[int] = []
+        self._restore_start()
+        self._build_keyframes()
+
+    def _scan(self):
+        data = self._map
+        pos = len(HEADER)
+        while pos + RECORD.size <= len(data):
+            kind, length = RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            if start + length > len(data):
+                # хвост, не дописанный до аварийного выхода
+                break
+            if kind == REC_START:
+                self.seed, self.started_at = _START.unpack_from(data, start)
+                cells = start + _START.size
+                self.start_board = unpack_board(data[cells:cells + Board.ROWS * Board.COLS])
+                self.meta = json.loads(data[cells + Board.ROWS * Board.COLS:start + length].decode("utf-8"))
+            elif kind == REC_SWAP:
+                self._moves.append(len(self._events))
+                self.duration_ms = _SWAP.unpack_from(data, start)[0]
+            elif kind == REC_END:
+                self.duration_ms = _U32.unpack_from(data, start)[0]
+                self.finished = True
+            self._events.append((kind, start, length))
+            pos = start + length
+        if not self.start_board:
+            raise ReplayError(f"{self.path}: нет начала партии")
+
+    def __len__(self) -> int:
+        return len(self._moves)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def move(self, index: int) -> ReplayMove:
+        _, start, _ = self._events[self._moves[index]]
+        ms, a, b = _SWAP.unpack_from(self._map, start)
+        return ReplayMove(index, ms, _rc(a), _rc(b))
+
+    @property
+    def position(self) -> int:
+        return self._pos
+
+    def _restore_start(self):
+        self.board = Board.from_matrix(self.start_board, seed=self.seed)
+        self._event = 0
+        self._pos = 0
+        self._pending = []
+
+    def _build_keyframes(self):
+        # один проход при открытии: дальше любая перемотка пересчитывает не больше KEYFRAME_EVERY ходов
+        self._advance(len(self._moves))
+        self._restore_start()
+
+    def _snapshot(self):
+        if self._pos % self.KEYFRAME_EVERY or self._pos // self.KEYFRAME_EVERY < len(self.keyframes):
+            return
+        cells = tuple(None if e is None else (e.color, e.bonus) for row in self.board.grid for e in row)
+        self.keyframes.append(Keyframe(self._event, cells, self.board.rng.getstate()))
+
+    def _restore(self, index: int):
+        frame = self.keyframes[index]
+        board = Board(fill=False)
+        for i, cell in enumerate(frame.cells):
+            if cell is not None:
+                r, c = divmod(i, Board.COLS)
+                board.grid[r][c] = Element(c, r, *cell)
+        board.rng.setstate(frame.rng_state)
+        self.board = board
+        self._event = frame.event
+        self._pos = index * self.KEYFRAME_EVERY
+        self._pending = []
+
+    def _apply(self, kind: int, start: int, length: int) -> MoveResult | None:
+        data = self._map
+        if kind == REC_SWAP:
+            _, a, b = _SWAP.unpack_from(data, start)
+            result = self.board.play_move(_rc(a), _rc(b))
+            self._pending = [step.checksum for step in result.steps]
+            self._pos += 1
+            return result
+        if kind == REC_CASCADE:
+            expected = _U32.unpack_from(data, start)[0]
+            got = self._pending.pop(0) if self._pending else None
+            if got != expected and self._pos - 1 not in self.mismatches:
+                self.mismatches.append(self._pos - 1)
+        elif kind == REC_BOARD:
+            self.board.board_from_matrix(unpack_board(data[start:start + length]))
+        elif kind == REC_SEED:
+            has_seed, seed = _SEED.unpack_from(data, start)
+            self.board.reseed(seed if has_seed else None)
+        return None
+
+    def _advance(self, target: int):
+        # события до хода target (не включая его обмен), попутно снимки
+        end = self._moves[target] if target < len(self._moves) else len(self._events)
+        while self._event < end:
+            if self._events[self._event][0] == REC_SWAP:
+                self._snapshot()
+            self._apply(*self._events[self._event])
+            self._event += 1
+
+    def seek(self, index: int) -> Board:
+        # поле после index ходов; возвращается рабочее поле читателя — не изменять
+        index = max(0, min(index, len(self._moves)))
+        # ближайший уже известный снимок не дальше index
+        known = min(index // self.KEYFRAME_EVERY, len(self.keyframes) - 1)
+        if index < self._pos or known * self.KEYFRAME_EVERY > self._pos:
+            if known >= 0:
+                self._restore(known)
+            else:
+                self._restore_start()
+        self._advance(index)
+        return self.board
+
+    def step(self) -> Tuple[ReplayMove, MoveResult] | None:
+        if self._pos >= len(self._moves):
+            return None
+        self._advance(self._pos)
+        self._snapshot()
+        move = self.move(self._pos)
+        result = self._apply(*self._events[self._event])
+        self._event += 1
+        # контрольные суммы каскада идут сразу за обменом
+        self._advance(self._pos)
+        return move, result
+
+    def play(self, speed: float | None = 1.0, start: int = 0,
+             sleep: Callable[[float], None] = time.sleep) -> Iterator[Tuple[ReplayMove, MoveResult]]:
+        # speed=None — без пауз, для пакетного разбора
+        self.seek(start)
+        last_ms = self.move(start).ms if start < len(self._moves) else 0
+        while True:
+            if speed and self._pos < len(self._moves):
+                ms = self.move(self._pos).ms
+                sleep(max(0, ms - last_ms) / 1000 / speed)
+                last_ms = ms
+            item = self.step()
+            if item is None:
+                return
+            yield item
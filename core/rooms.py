@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import secrets
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Deque, Dict, List, Tuple
+
+from core import protocol as proto
+from core.game_controller import GameController
+from core.transport import Connection, Fanout, SUPERSEDED, peek_command
+from logger import logger
+
+# сколько последних сообщений комнаты хранить для переподключившихся
+LOG_SIZE = 1024
+# сколько ждать игрока, потерявшего связь посреди партии, с
+RESUME_GRACE = 30.0
+# зрителей на комнату
+MAX_SPECTATORS = 64
+
+
+@dataclass
+class RoomMetrics:
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    messages_in: int = 0
+    messages_out: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    peak_clients: int = 0
+    peak_spectators: int = 0
+    resumes: int = 0
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+class Room:
+    def __init__(self,
+                 code: str,
+                 mode: str,
+                 time_limit: int,
+                 capacity: int,
+                 host_nickname: str | None = None,
+                 on_close: Callable[[Room], None] | None = None,
+                 authoritative: bool = False,
+                 loop: asyncio.AbstractEventLoop | None = None):
+        self.code = code
+        self.mode = mode
+        self.time = time_limit
+        # сколько удалённых игроков ждём; хост (если есть) играет локально
+        self.capacity = capacity
+        self.host_nickname = host_nickname
+        self.clients: Dict[str, Connection] = {}
+        self.started = False
+        self.finished = False
+        self.metrics = RoomMetrics()
+        self._on_close = on_close
+        self.on_state: Callable[[str], None] | None = None
+        # seq, журнал и снимки меняются только в потоке event loop сервера
+        self.loop = loop
+        # журнал исходящих: (seq, кому не слали, кадр); snapshot — последние состояния
+        self.seq = 0
+        self.log: Deque[Tuple[int, str | None, bytes]] = deque(maxlen=LOG_SIZE)
+        self.snapshot: Dict[Tuple[str | None, bytes], Tuple[int, str | None, bytes]] = {}
+        # lockstep: поле меняют только ходы, снимком его не передать. Храним последнюю
+        # синхронизацию и все ходы после неё (до первой синхронизации — ходы от старта)
+        self.chain: List[Tuple[int, bytes]] = []
+        self.tokens: Dict[str, str] = {}
+        # игроки, потерявшие связь: ник -> крайний срок возвращения
+        self.away: Dict[str, float] = {}
+        # зрители получают те же кадры, что и игроки, но через свою рассылку
+        self.fanout: Fanout | None = None
+        self.start_frame: bytes | None = None
+
+        self.ctrl = GameController(
+            mode=mode,
+            time=time_limit,
+            nickname=host_nickname,
+            is_client=False,
+            on_send=self._send_from_ctrl,
+            on_close=self.close,
+            authoritative=authoritative
+        )
+        self.ctrl.state_ready = self._on_ctrl_state
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.clients) >= self.capacity
+
+    @property
+    def is_open(self) -> bool:
+        return not self.started and not self.is_full
+
+    @property
+    def spectators(self) -> Dict[str, Connection]:
+        return self.fanout.subscribers if self.fanout else {}
+
+    @property
+    def nicknames(self) -> List[str]:
+        players = [self.host_nickname] if self.host_nickname is not None else []
+        return players + list(self.clients)
+
+    def describe(self) -> Dict:
+        return {
+            "code": self.code,
+            "mode": self.mode,
+            "time": self.time,
+            "players": len(self.nicknames),
+            "capacity": self.capacity + (1 if self.host_nickname is not None else 0),
+            "host": self.host_nickname,
+            "started": self.started,
+            "spectators": len(self.spectators),
+        }
+
+    def join(self, nickname: str, conn: Connection, token: str | None = None) -> str:
+        if token is not None:
+            # возвращение в партию: ник подтверждается токеном, выданным при первом входе
+            if token != self.tokens.get(nickname) or (nickname not in self.away and nickname not in self.clients):
+                return "INVALID_NICKNAME"
+            stale = self.clients.get(nickname)
+            if stale is not None:
+                # обрыв ещё не замечен сервером — старое соединение больше не нужно
+                stale.close()
+            self.away.pop(nickname, None)
+            conn.nickname = nickname
+            self.clients[nickname] = conn
+            self.metrics.resumes += 1
+            logger.info(f"Комната {self.code}: игрок {nickname} вернулся в партию")
+            return "WELCOME"
+        if not nickname or nickname in self.nicknames or nickname in self.away or nickname in self.spectators:
+            return "INVALID_NICKNAME"
+        if self.started or self.is_full:
+            return "ROOM_FULL"
+        conn.nickname = nickname
+        self.clients[nickname] = conn
+        self.tokens[nickname] = secrets.token_hex(8)
+        self.metrics.peak_clients = max(self.metrics.peak_clients, len(self.clients))
+        logger.info(f"Комната {self.code}: игрок {nickname} присоединился")
+        return "WELCOME"
+
+    def add_spectator(self, nickname: str, conn: Connection) -> str:
+        if not nickname or nickname in self.nicknames or nickname in self.away or nickname in self.spectators:
+            return "INVALID_NICKNAME"
+        if self.finished or len(self.spectators) >= MAX_SPECTATORS:
+            return "ROOM_FULL"
+        if self.fanout is None:
+            self.fanout = Fanout()
+        conn.nickname = nickname
+        self.fanout.subscribers[nickname] = conn
+        self.metrics.peak_spectators = max(self.metrics.peak_spectators, len(self.spectators))
+        logger.info(f"Комната {self.code}: зритель {nickname} присоединился")
+        return "WELCOME"
+
+    def remove_spectator(self, nickname: str, conn: Connection):
+        if self.spectators.get(nickname) is conn:
+            del self.spectators[nickname]
+            logger.info(f"Комната {self.code}: зритель {nickname} ушёл")
+
+    def catch_up(self) -> List[bytes]:
+        # зритель, пришедший посреди партии: старт и весь журнал после него;
+        # если журнал уже затёрт — последние состояния, а в lockstep ещё и цепочка ходов
+        if self.start_frame is None:
+            return []
+        log = list(self.log)
+        if not log or log[0][0] == 1:
+            return [self.start_frame] + [data for _, _, data in log]
+        frames = [(seq, data) for seq, _, data in self.snapshot.values()]
+        if self.ctrl.lockstep:
+            frames += self.chain
+        return [self.start_frame] + [data for _, data in sorted(frames)]
+
+    def maybe_autostart(self):
+        # без хоста партия начинается, как только комната заполнилась
+        if self.host_nickname is None and self.is_full and not self.started:
+            self.ctrl.new_game(self.nicknames)
+
+    def leave(self, nickname: str, conn: Connection) -> bool:
+        if self.clients.get(nickname) is not conn:
+            return False
+        del self.clients[nickname]
+        logger.info(f"Комната {self.code}: игрок {nickname} отключился")
+        return True
+
+    def mark_away(self, nickname: str, grace: float = RESUME_GRACE):
+        self.away[nickname] = time.monotonic() + grace
+        self.notify(proto.peer(nickname, "away"))
+
+    def mark_back(self, nickname: str):
+        self.notify(proto.peer(nickname, "back"))
+
+    def notify(self, msg: proto.Message):
+        # служебное сообщение всем, включая хоста
+        self.broadcast(proto.dumps(msg))
+        if self.host_nickname is not None:
+            self.ctrl.handle_command(msg)
+
+    def missed_messages(self, nickname: str, last_seq: int) -> List[bytes]:
+        if not self.log or last_seq + 1 >= self.log[0][0]:
+            return [data for seq, skip, data in self.log if seq > last_seq and skip != nickname]
+        # журнал уже затёрт: отдаём последние состояния и предупреждаем о дыре
+        latest = sorted(entry for entry in self.snapshot.values() if entry[0] > last_seq and entry[1] != nickname)
+        return [data for _, _, data in latest] + [proto.dumps(proto.resume_gap())]
+
+    def _send_from_ctrl(self, data: bytes):
+        # хост ходит из GUI-потока: его кадры нумеруем и рассылаем в потоке loop,
+        # иначе seq и журнал меняли бы два потока сразу
+        if self.loop is not None and not self._on_loop():
+            self.loop.call_soon_threadsafe(self.broadcast, data)
+        else:
+            self.broadcast(data)
+
+    def _on_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def broadcast(self, data: bytes, exclude: Connection | None = None):
+        cmd = peek_command(data)
+        if cmd == b"start_game":
+            # старт хоста доходит сюда уже после того, как GUI-поток пометил комнату начатой
+            self.start_frame = data
+        elif self.started and data.endswith(b"}\n"):
+            self.seq += 1
+            skip = exclude.nickname if exclude else None
+            # автор нужен зрителям: у них поля всех игроков сразу
+            data = proto.stamp(data, self.seq, skip or self.host_nickname)
+            self.log.append((self.seq, skip, data))
+            if cmd in SUPERSEDED:
+                self.snapshot[(skip, cmd)] = (self.seq, skip, data)
+            elif cmd == b"resync":
+                self.chain = [(self.seq, data)]
+            elif cmd == b"move":
+                self.chain.append((self.seq, data))
+        for conn in list(self.clients.values()):
+            if conn is exclude:
+                continue
+            conn.send(data)
+            self.metrics.messages_out += 1
+            self.metrics.bytes_out += len(data)
+        if self.fanout is not None:
+            self.fanout.push(data)
+
+    # команды, результат которых в авторитетном режиме вычисляет сервер
+    AUTHORITY_OWNED = ("score", "board", "swap", "auto_swap", "auto_swap_circle", "outcome", "end_game")
+
+    def handle_message(self, conn: Connection, raw: bytes, data: Dict):
+        self.metrics.messages_in += 1
+        self.metrics.bytes_in += len(raw)
+        try:
+            msg = proto.decode(data)
+        except proto.ProtocolError as e:
+            # битое сообщение дальше комнаты не уходит
+            logger.warning(f"Комната {self.code}: отброшено сообщение от {conn.nickname}: {e}")
+            return
+        if self.ctrl.authority is not None:
+            if type(msg) is proto.SwapIntent:
+                rejection = self.ctrl.apply_intent(conn.nickname, msg)
+                if rejection is not None:
+                    conn.send(proto.dumps(rejection))
+                return
+            if msg.command in self.AUTHORITY_OWNED:
+                return
+            if type(msg) is proto.Finish:
+                msg.score = self.ctrl.authority.scores.get(conn.nickname, 0)
+                raw = proto.dumps(msg)
+        # остальные игроки комнаты получают сообщение как есть
+        self.broadcast(raw, exclude=conn)
+        if self.host_nickname is not None:
+            self.ctrl.handle_command(msg)
+        elif type(msg) is proto.EndGame:
+            self._on_ctrl_state("end_game")
+        if self.ctrl.authority is not None and type(msg) is proto.Finish:
+            self.ctrl.finish_player(conn.nickname)
+
+    def _on_ctrl_state(self, cmd: str):
+        if cmd == "start_game" and not self.started:
+            self.started = True
+            self.metrics.started_at = time.time()
+        elif cmd == "end_game":
+            self.finished = True
+            self.metrics.finished_at = time.time()
+        if self.on_state:
+            self.on_state(cmd)
+
+    def close(self):
+        for conn in list(self.clients.values()):
+            conn.close()
+        self.clients.clear()
+        if self.fanout is not None:
+            self.fanout.close()
+        if self._on_close:
+            self._on_close(self)
+
+
+class RoomManager:
+    CODE_DIGITS = 4
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self.rooms: Dict[str, Room] = {}
+        self.loop = loop
+
+    def _new_code(self) -> str:
+        low, high = 10 ** (self.CODE_DIGITS - 1), 10 ** self.CODE_DIGITS - 1
+        while True:
+            code = str(random.randint(low, high))
+            if code not in self.rooms:
+                return code
+
+    def create(self,
+               mode: str,
+               time_limit: int,
+               capacity: int,
+               host_nickname: str | None = None,
+               on_close: Callable[[Room], None] | None = None,
+               authoritative: bool = False) -> Room:
+        room = Room(self._new_code(), mode, time_limit, capacity, host_nickname, on_close, authoritative, self.loop)
+        self.rooms[room.code] = room
+        logger.info(f"Создана комната {room.code} (режим {mode}, мест {capacity})")
+        return room
+
+    def get(self, code: str) -> Room | None:
+        return self.rooms.get(code)
+
+    def remove(self, code: str) -> Room | None:
+        room = self.rooms.pop(code, None)
+        if room:
+            logger.info(f"Комната {code} закрыта: {room.metrics.as_dict()}")
+        return room
+
+    def open_rooms(self) -> List[Room]:
+        return [room for room in list(self.rooms.values()) if room.is_open]
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {
+            code: {**room.metrics.as_dict(),
+                   "clients": len(room.clients),
+                   "queues": {nick: conn.queue_metrics() for nick, conn in list(room.clients.items())},
+                   "spectators": len(room.spectators),
+                   "fanout": room.fanout.stats if room.fanout else None,
+                   "started": room.started,
+                   "finished": room.finished}
+            for code, room in list(self.rooms.items())
+        }
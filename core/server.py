@@ -1,146 +1,291 @@
+from __future__ import annotations
+
+import asyncio
 import json
+import os
 import socket
-import threading
-
-from PyQt5.QtCore import QObject, pyqtSignal, Qt
+import time
+import uuid
+from typing import Callable
 
-from core.game_controller import GameController
-# from core.game_controller import GameController
-from core.network_utils import get_local_ip
+from core import protocol as proto
+from core.discovery import DiscoveryResponder
+from core.network_utils import get_local_ip, address_for_peer, DISCOVERY_PORT
+from core.rooms import Room, RoomManager, RESUME_GRACE
+from core.transport import (Connection, READ_LIMIT, SEND_HIGH_WATER, SEND_HARD_LIMIT,
+                            SPECTATOR_HIGH_WATER, SPECTATOR_HARD_LIMIT)
 from logger import logger
 
 
-class Server(QObject):
-    gui_cmd = pyqtSignal(str)
-
-    def __init__(self, nickname=None, mode=None, time=999):
-        super().__init__()
-        self.gui = None
+# сетевой сервер без зависимостей от Qt/pygame: его же запускает dedicated_server.py;
+# GUI подписывается на смену состояния через on_state (см. GUI/net_bridge.py)
+class Server:
+    def __init__(self, nickname=None, mode=None, time=999, port=DISCOVERY_PORT,
+                 on_state: Callable[[str], None] | None = None, host: str | None = None,
+                 authoritative: bool = False, discovery_port: int = DISCOVERY_PORT,
+                 send_high_water: int = SEND_HIGH_WATER, send_hard_limit: int = SEND_HARD_LIMIT):
         self.time = time
         self.mode = mode
         self.nickname = nickname
-        self.game_started = False
-        self.ctrl = GameController(
-            mode=self.mode,
-            time=self.time,
-            nickname=nickname,
-            is_client=False,
-            on_send=self._broadcast,
-            on_close=self.shutdown
-        )
-
-        self.ctrl.state_ready = self.gui_cmd.emit
-        self.gui_cmd.connect(self._apply_state, Qt.QueuedConnection)
-        self.game_started = False
-        self.host = get_local_ip()
+        # без явного адреса слушаем все интерфейсы, чтобы к нам могли прийти из любого сегмента
+        self.bind_host = host or "0.0.0.0"
+        self.host = host or get_local_ip()
+        self._explicit_host = host is not None
         # self.port = get_free_port()
-        self.port = 8080
-        self.session_code = str(self.port)
-        self.value_players = 1
-        self.clients = {}
-        self.broadcasting = True
+        self.port = port
+        self.send_high_water = send_high_water
+        self.send_hard_limit = send_hard_limit
+        self.server_id = uuid.uuid4().hex[:12]
+        # выделенный сервер держит наготове несколько свободных комнат
+        self._open_rooms_target = 0
+        self._room_template = None
+
+        # один event loop на все соединения; крутится в потоке, вызвавшем start()
+        self._loop = asyncio.new_event_loop()
+        self.rooms = RoomManager(self._loop)
+        self._stopping = None
+        self._tasks: set[asyncio.Task] = set()
+
+        # комната игрока, запустившего сервер из GUI
+        self.room: Room | None = None
+        if nickname is not None:
+            self.room = self.rooms.create(mode, time, capacity=1, host_nickname=nickname,
+                                          on_close=lambda _room: self.shutdown(),
+                                          authoritative=authoritative)
+            self.room.on_state = on_state
 
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(self.value_players)
-        logger.info(f"Сервер запущен на {self.host}:{self.port} с кодом сессии: {self.session_code}")
+        if os.name != "nt":
+            # на Windows SO_REUSEADDR позволяет захватить чужой порт
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.bind_host, self.port))
+        self.server_socket.listen(128)
+        self.server_socket.setblocking(False)
+        logger.info(f"Сервер запущен на {self.host}:{self.port}")
 
-        self.broadcast_thread = threading.Thread(target=self.broadcast_session_code, daemon=True)
-        self.broadcast_thread.start()
+        # на probe клиентов отвечаем из того же event loop, отдельный поток не нужен
+        self.discovery_socket = DiscoveryResponder.bind(discovery_port)
 
-    def _broadcast(self, data: bytes):
-        for sock in self.clients.values():
-            try:
-                sock.sendall(data)
-            except OSError:
-                pass
+    @property
+    def ctrl(self):
+        return self.room.ctrl
 
-    def broadcast_session_code(self):
-        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        message = f"{self.session_code}:{self.host}:{self.port}"
-        parts = self.host.split(".")
-        bcast = ".".join(parts[:3] + ["255"])
-        while True:
-            if len(self.clients) < self.value_players:
-                try:
-                    udp_socket.sendto(message.encode(), (bcast, self.port))
-                    logger.info(f"Отправлен код сессии {self.session_code} по адресу {bcast}:{self.port}")
-                except Exception as e:
-                    logger.error(f"Ошибка отправки broadcast: {e}")
-            threading.Event().wait(5)
+    @property
+    def session_code(self) -> str:
+        return self.room.code
+
+    @property
+    def clients(self):
+        return self.room.clients
 
-    def handle_client(self, client_socket, address):
-        logger.info(f"Клиент {address} подключился.")
+    @property
+    def value_players(self) -> int:
+        return self.room.capacity
+
+    @property
+    def game_started(self) -> bool:
+        return self.room.started
+
+    def create_room(self, mode: str, time: int, capacity: int = 2, authoritative: bool = False) -> Room:
+        return self.rooms.create(mode, time, capacity, on_close=self._close_room, authoritative=authoritative)
+
+    def keep_open_rooms(self, count: int, mode: str, time: int, capacity: int = 2, authoritative: bool = False):
+        self._open_rooms_target = count
+        self._room_template = (mode, time, capacity, authoritative)
+        self._replenish_rooms()
+
+    def _replenish_rooms(self):
+        if not self._room_template:
+            return
+        missing = self._open_rooms_target - len(self.rooms.open_rooms())
+        for _ in range(max(0, missing)):
+            self.create_room(*self._room_template)
+
+    def _close_room(self, room: Room):
+        self.rooms.remove(room.code)
+        self._replenish_rooms()
+
+    def room_metrics(self):
+        return self.rooms.metrics()
+
+    def describe_rooms(self, code: str | None = None, peer_ip: str | None = None):
+        if code is not None:
+            room = self.rooms.get(code)
+            # по коду находим и идущую партию — к ней можно подключиться зрителем
+            rooms = [room] if room is not None and not room.finished else []
+        else:
+            rooms = self.rooms.open_rooms()
+        host = self.host
+        if peer_ip and not self._explicit_host:
+            # отвечаем адресом из сегмента того, кто спрашивал
+            host = address_for_peer(peer_ip)
+        return proto.rooms(self.server_id, host, self.port, [room.describe() for room in rooms])
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = Connection(reader, writer, self.send_high_water, self.send_hard_limit)
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        logger.info(f"Клиент {conn.peer} подключился.")
+        room = None
+        nickname = None
+        heartbeat = None
+        spectator = False
         try:
-            nickname = client_socket.recv(1024).decode("utf-8")
-            if nickname == self.nickname or nickname in self.clients:
-                client_socket.send("INVALID_NICKNAME".encode("utf-8"))
-                client_socket.close()
+            line = await conn.read_line()
+            if line is None:
                 return
+            try:
+                hello = proto.decode(proto.loads(line))
+            except ValueError:
+                hello = None
+            if type(hello) is not proto.Join:
+                logger.error(f"Некорректное приветствие от {conn.peer}")
+                return
+            code, nickname = hello.code, hello.nickname
+            token, last_seq = hello.token, hello.last_seq or 0
+            spectator = hello.role == "spectator"
 
-            self.clients[nickname] = client_socket
-            client_socket.send("WELCOME".encode("utf-8"))
-
-            if len(self.clients) == self.value_players:
-                logger.info("Достигнуто максимальное количество игроков. Остановка broadcast.")
-                self.broadcasting = False
+            room = self.rooms.get(code)
+            if room is None:
+                conn.send(b"ROOM_NOT_FOUND\n")
+                return
+            if spectator:
+                conn.high_water, conn.hard_limit = SPECTATOR_HIGH_WATER, SPECTATOR_HARD_LIMIT
+                resp = room.add_spectator(nickname, conn)
+            else:
+                resp = room.join(nickname, conn, token)
+            conn.send(resp.encode("utf-8") + b"\n")
+            if resp != "WELCOME":
+                room, nickname = None, None
+                return
+            if spectator:
+                for data in room.catch_up():
+                    conn.send(data)
+            elif token is not None:
+                # догоняем: всё, что ушло в комнату после последнего полученного номера
+                for data in room.missed_messages(nickname, last_seq):
+                    conn.send(data)
+                room.mark_back(nickname)
+            else:
+                conn.send(proto.dumps(proto.session(room.tokens[nickname])))
+            if room.host_nickname is not None and not spectator:
+                conn.on_link = room.ctrl.update_link
+            heartbeat = asyncio.create_task(conn.heartbeat())
+            if not spectator:
+                room.maybe_autostart()
+                self._replenish_rooms()
 
             while True:
-                raw = client_socket.recv(32768)
-                if not raw:
+                raw = await conn.read_line()
+                if raw is None:
                     break
                 try:
                     data = json.loads(raw.decode("utf-8"))
-                    logger.info(f"Команда {data}")
-                    self.ctrl.handle_command(data)
+                    if conn.handle_heartbeat(data) or spectator:
+                        continue
+                    logger.info(f"Комната {room.code}: команда {data}")
+                    room.handle_message(conn, raw, data)
                 except Exception as e:
                     logger.error(e)
-        except:
-            pass
         finally:
-            self.remove_client(client_socket, nickname)
+            if heartbeat:
+                heartbeat.cancel()
+            if spectator:
+                conn.close()
+                if room is not None:
+                    room.remove_spectator(nickname, conn)
+            else:
+                self.remove_client(room, conn, nickname)
+            self._tasks.discard(task)
 
-    def remove_client(self, client_socket, nickname=None):
-        if nickname in self.clients:
-            del self.clients[nickname]
-        client_socket.close()
+    def remove_client(self, room: Room | None, conn: Connection, nickname=None):
+        conn.close()
+        if room is None or not room.leave(nickname, conn):
+            return
         logger.info(f"Клиент {nickname} отключился.")
 
-        if not self.game_started:
-            if len(self.clients) < self.value_players:
-                logger.info("Игрок отключился. Возобновление broadcast.")
-                self.broadcasting = True
-        else:
+        if self._stopping is not None and self._stopping.is_set():
+            return
+        if not room.started:
+            logger.info(f"Комната {room.code}: игрок отключился, ждём нового.")
+        elif not room.finished:
+            logger.info(f"Комната {room.code}: {nickname} потерял связь, ждём {RESUME_GRACE:.0f} с.")
+            room.mark_away(nickname)
+            self._loop.call_later(RESUME_GRACE, self._expire_away, room, nickname)
+        elif room.host_nickname is None and not room.clients:
+            room.close()
+
+    def _expire_away(self, room: Room, nickname: str):
+        deadline = room.away.get(nickname)
+        if deadline is None:
+            return
+        if time.monotonic() < deadline:
+            # успел вернуться и снова пропасть — срок отсчитывается заново
+            self._loop.call_later(deadline - time.monotonic(), self._expire_away, room, nickname)
+            return
+        del room.away[nickname]
+        if room.host_nickname is not None:
             logger.info("Отключение во время игры — аварийное завершение.")
-            self.ctrl.handle_error(nickname)
+            room.ctrl.handle_error(nickname)
+        else:
+            logger.info(f"Комната {room.code}: {nickname} не вернулся — партия прервана.")
+            room.close()
 
-    def start(self):
+    def start(self, metrics_interval: float | None = None):
         logger.info("Для остановки сервера нажмите CTRL+C")
-        while True:
+        asyncio.set_event_loop(self._loop)
+        main = self._loop.create_task(self._serve(metrics_interval))
+        try:
             try:
-                client_socket, address = self.server_socket.accept()
-                threading.Thread(target=self.handle_client, args=(client_socket, address), daemon=True).start()
-            except OSError:
-                break
+                self._loop.run_until_complete(main)
+            except KeyboardInterrupt:
+                logger.info("Остановка по CTRL+C")
+                self._stop_serving()
+                self._loop.run_until_complete(main)
+        finally:
+            self._loop.close()
+
+    async def _log_metrics(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Метрики комнат: {self.room_metrics()}")
+
+    async def _serve(self, metrics_interval: float | None = None):
+        self._stopping = asyncio.Event()
+        srv = await asyncio.start_server(self.handle_client, sock=self.server_socket, limit=READ_LIMIT)
+        discovery = None
+        if self.discovery_socket is not None:
+            discovery, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: DiscoveryResponder(self.describe_rooms), sock=self.discovery_socket)
+        reporter = None
+        if metrics_interval:
+            reporter = asyncio.create_task(self._log_metrics(metrics_interval))
+        async with srv:
+            await self._stopping.wait()
+            if reporter:
+                reporter.cancel()
+            if discovery:
+                discovery.close()
+            for room in list(self.rooms.rooms.values()):
+                for conn in list(room.clients.values()) + list(room.spectators.values()):
+                    conn.close()
+                room.clients.clear()
+            # даём обработчикам дочитать EOF и завершиться
+            if self._tasks:
+                await asyncio.wait(list(self._tasks), timeout=2)
 
     def shutdown(self, *_):
         logger.info("Завершаем сервер...")
-        try:
-            self.server_socket.close()
-        except OSError:
-            pass
-
-        for sock in list(self.clients.values()):
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._stop_serving)
+            return
+        for sock in (self.server_socket, self.discovery_socket):
             try:
-                sock.close()
+                if sock is not None:
+                    sock.close()
             except OSError:
                 pass
-        self.clients.clear()
 
-    def _apply_state(self, cmd: str):
-        if cmd == "start_game":
-            self.game_started = True
-        if not self.gui:
-            return
-        self.gui.apply_state(cmd)
+    def _stop_serving(self):
+        if self._stopping is not None:
+            self._stopping.set()
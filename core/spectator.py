@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Dict, List, Set
+
+from core import protocol as proto
+from core.board import Board
+from logger import logger
+
+
+# контроллер зрителя: только восстанавливает ход партии по кадрам комнаты,
+# сам ничего не отправляет. Интерфейс для Client тот же, что у GameController
+class SpectatorController:
+    def __init__(self, nickname: str):
+        self.my_nickname = nickname
+        self.state_ready: Callable[[str], None] | None = None
+        self.mode = ""
+        self.time = 0
+        self.nicknames: List[str] = []
+        self.queue: List[str] = []
+        self.current = ""
+        self.authoritative = False
+        self.lockstep = False
+        # в режиме на время у каждого игрока своё поле, в шахматном — одно общее
+        self.boards: Dict[str, Board] = {}
+        self.scores: Dict[str, int] = {}
+        self.times: Dict[str, int] = {}
+        # чьё поле/счёт/время изменилось последним
+        self.last_player: str | None = None
+        self.away_player: str | None = None
+        self.winner_player = None
+        self.winner_score = None
+        self.exit_nickname = None
+        self.rtt: float | None = None
+        self.clock_offset: float | None = None
+        self.reconnecting = False
+        # кадры, меняющие поля: приходят в сетевом потоке, а применяются в GUI-потоке,
+        # который эти поля рисует (apply_board_messages)
+        self.board_inbox: deque[proto.Message] = deque()
+        self._board_appliers = {
+            proto.Swap: self._apply_board,
+            proto.AutoSwap: self._apply_board,
+            proto.AutoSwapCircle: self._apply_board,
+            proto.BoardState: self._apply_board,
+            proto.Outcome: self._apply_outcome,
+            proto.Move: self._apply_move,
+            proto.Resync: self._apply_resync,
+        }
+        self._handlers = {
+            proto.StartGame: self.handle_start_game,
+            proto.Swap: self.handle_board,
+            proto.AutoSwap: self.handle_board,
+            proto.AutoSwapCircle: self.handle_board,
+            proto.BoardState: self.handle_board,
+            proto.Outcome: self.handle_outcome,
+            proto.Move: self.handle_move,
+            proto.Resync: self.handle_resync,
+            proto.Score: self.handle_score,
+            proto.Finish: self.handle_score,
+            proto.Time: self.handle_time,
+            proto.Peer: self.handle_peer,
+            proto.EndGame: self.end_game,
+        }
+
+    def _dispatch(self, cmd: str) -> None:
+        if self.state_ready:
+            self.state_ready(cmd)
+
+    def _board_of(self, nickname: str | None) -> Board | None:
+        if nickname in self.boards:
+            return self.boards[nickname]
+        if self.mode != "time" and self.boards:
+            return next(iter(self.boards.values()))
+        return None
+
+    def handle_command(self, data) -> bool:
+        msg = data if isinstance(data, proto.Message) else proto.decode(data)
+        handler = self._handlers.get(type(msg))
+        if handler is not None:
+            handler(msg)
+        return type(msg) is proto.StartGame
+
+    def handle_start_game(self, msg: proto.StartGame):
+        self.mode = msg.mode
+        self.time = msg.time_limit
+        self.nicknames = msg.nicknames
+        self.queue = msg.queue_players
+        self.current = msg.current_player
+        self.authoritative = msg.authoritative
+        self.lockstep = msg.seed is not None
+        self.board_inbox.clear()
+        if self.mode == "time":
+            self.boards = {nick: Board.from_matrix(msg.board) for nick in self.queue}
+        else:
+            shared = Board.from_matrix(msg.board, seed=msg.seed)
+            self.boards = {nick: shared for nick in self.queue}
+        self.scores = {nick: 0 for nick in self.queue}
+        self.times = {nick: 0 for nick in self.queue}
+
+    def handle_board(self, msg: proto.Swap | proto.AutoSwap | proto.AutoSwapCircle | proto.BoardState):
+        if self.lockstep:
+            # матрица теряет цвет бонусов, а поле зрителя должно совпадать с полем игроков бит в бит
+            return
+        self.board_inbox.append(msg)
+        self._dispatch("board")
+
+    def handle_outcome(self, msg: proto.Outcome):
+        self.board_inbox.append(msg)
+        self._dispatch("board")
+        self._dispatch("score")
+
+    def handle_move(self, msg: proto.Move):
+        self.board_inbox.append(msg)
+        self._dispatch("board")
+
+    def handle_resync(self, msg: proto.Resync):
+        self.board_inbox.append(msg)
+        self._dispatch("board")
+
+    def apply_board_messages(self) -> Set[str | None]:
+        # вызывается из GUI-потока; применяет всё, что накопилось, — в том числе кадры,
+        # пришедшие до того, как открылось окно. Возвращает, чьи поля изменились
+        changed = set()
+        while self.board_inbox:
+            msg = self.board_inbox.popleft()
+            self._board_appliers[type(msg)](msg)
+            changed.add(self.last_player)
+        return changed
+
+    def _apply_board(self, msg: proto.Swap | proto.AutoSwap | proto.AutoSwapCircle | proto.BoardState):
+        self.last_player = msg.sender
+        board = self._board_of(self.last_player)
+        if board is None:
+            return
+        board.board_from_matrix(msg.board)
+        if type(msg) is proto.Swap:
+            self.current = msg.next_player
+
+    def _apply_outcome(self, msg: proto.Outcome):
+        self.last_player = msg.player
+        board = self._board_of(self.last_player)
+        if board is not None:
+            board.board_from_matrix(msg.board)
+        self.scores.update(msg.scores)
+        self.current = msg.next_player
+
+    def _apply_move(self, msg: proto.Move):
+        # lockstep: каскад считаем сами на поле с общим seed, как и игроки
+        self.last_player = msg.sender or self.current
+        board = self._board_of(self.current)
+        result = board.play_move(tuple(msg.a), tuple(msg.b))
+        if [step.checksum for step in result.steps] != msg.checksums:
+            # запросить синхронизацию зритель не может — дождётся resync игроков
+            logger.warning("Поле зрителя разошлось с полем игроков")
+        self.current = msg.next_player
+
+    def _apply_resync(self, msg: proto.Resync):
+        board = self._board_of(self.current)
+        board.board_from_matrix(msg.board)
+        board.reseed(msg.seed)
+
+    def handle_score(self, msg: proto.Score | proto.Finish):
+        self.last_player = msg.sender
+        if self.last_player is not None:
+            self.scores[self.last_player] = msg.score
+        self._dispatch("score")
+
+    def handle_time(self, msg: proto.Time):
+        self.last_player = msg.sender
+        if self.last_player is not None:
+            self.times[self.last_player] = msg.time
+        self._dispatch("time")
+
+    def handle_peer(self, msg: proto.Peer):
+        self.away_player = msg.nickname if msg.status == "away" else None
+        self._dispatch("peer")
+
+    def end_game(self, msg: proto.EndGame):
+        self.winner_player = msg.winner
+        self.winner_score = msg.score
+        self._dispatch("end_game")
+
+    def handle_error(self, nickname: str | None = None):
+        self.exit_nickname = nickname
+        self._dispatch("error")
+
+    def update_link(self, rtt: float, clock_offset: float):
+        self.rtt = rtt
+        self.clock_offset = clock_offset
+
+    def set_reconnecting(self, value: bool):
+        self.reconnecting = value
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable, Coroutine, Any, Deque, Dict, List
+
+from core import protocol as proto
+from logger import logger
+
+# одна строка = одно сообщение, см. protocol.dumps
+READ_LIMIT = 1 << 18
+
+# ping раз в секунду; соединение, молчащее дольше таймаута, считаем мёртвым
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 5.0
+# сглаживание RTT и сдвига часов (как SRTT в TCP)
+LINK_SMOOTHING = 0.125
+
+# очередь на отправку: выше HIGH_WATER выбрасываем вытесняемые сообщения,
+# выше HARD_LIMIT клиент считается зависшим и отключается
+SEND_HIGH_WATER = 256 * 1024
+SEND_HARD_LIMIT = 1024 * 1024
+# зрителям хватает очереди поменьше: отставший зритель теряет промежуточные
+# состояния раньше игрока и отключается раньше, не раздувая память сервера
+SPECTATOR_HIGH_WATER = 64 * 1024
+SPECTATOR_HARD_LIMIT = 256 * 1024
+# состояние, которое следующее сообщение того же типа полностью заменяет
+SUPERSEDED = frozenset({b"board", b"time", b"score"})
+_COMMAND_PREFIX = b'{"command": "'
+
+
+def peek_command(data: bytes) -> bytes:
+    # тип сообщения без разбора JSON: proto.dumps всегда ставит command первым
+    if not data.startswith(_COMMAND_PREFIX):
+        return b""
+    end = data.find(b'"', len(_COMMAND_PREFIX))
+    return data[len(_COMMAND_PREFIX):end] if end > 0 else b""
+
+
+# одно TCP-соединение внутри общего event loop; send можно вызывать из любого
+# потока и он никогда не блокирует: сообщения копятся в очереди соединения,
+# а в сокет их пишет отдельная задача с учётом обратного давления
+class Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 high_water: int = SEND_HIGH_WATER, hard_limit: int = SEND_HARD_LIMIT):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.peer = writer.get_extra_info("peername")
+        self.nickname: str | None = None
+        self.closed = False
+        # состояние канала по ping/pong
+        self.rtt: float | None = None
+        self.clock_offset: float | None = None
+        self.last_seen = time.monotonic()
+        self.timed_out = False
+        self._ping_seq = 0
+        self.on_link: Callable[[float, float], None] | None = None
+        # очередь отправки: элементы [ключ вытеснения, data]; более новое состояние подменяет data на месте
+        self.high_water = high_water
+        self.hard_limit = hard_limit
+        self._queue: Deque[List] = deque()
+        self._latest: Dict[bytes, List] = {}
+        self._queued_bytes = 0
+        self._live = 0
+        self._wakeup = asyncio.Event()
+        self.stats = {"sent": 0, "bytes_sent": 0, "merged": 0, "dropped": 0,
+                      "peak_depth": 0, "peak_bytes": 0}
+        self._drainer = self.loop.create_task(self._drain_loop())
+
+    def _in_loop(self) -> bool:
+        return threading.get_ident() == self._loop_thread
+
+    async def read_line(self) -> bytes | None:
+        try:
+            line = await self.reader.readline()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.error(f"Ошибка чтения от {self.peer}: {e}")
+            return None
+        if not line.endswith(b"\n"):
+            return None
+        self.last_seen = time.monotonic()
+        return line
+
+    async def heartbeat(self, interval: float = HEARTBEAT_INTERVAL, timeout: float = HEARTBEAT_TIMEOUT):
+        while not self.closed:
+            if time.monotonic() - self.last_seen > timeout:
+                logger.warning(f"{self.peer} молчит дольше {timeout} с — соединение закрыто")
+                self.timed_out = True
+                self._abort()
+                return
+            self._ping_seq += 1
+            self._enqueue(proto.dumps(proto.ping(self._ping_seq, time.time())))
+            await asyncio.sleep(interval)
+
+    def handle_heartbeat(self, data: Dict) -> bool:
+        # ping/pong обрабатываются здесь и дальше игровой логики не идут
+        cmd = data.get("command")
+        if cmd == "ping":
+            self.send(proto.dumps(proto.pong(data.get("seq"), data.get("t0"), time.time())))
+            return True
+        if cmd != "pong":
+            return False
+        t0, t1, t2 = data.get("t0"), data.get("t1"), time.time()
+        if not isinstance(t0, (int, float)) or not isinstance(t1, (int, float)):
+            return True
+        rtt = max(0.0, t2 - t0)
+        # оценка NTP: часы собеседника считаются снятыми в середине пути
+        offset = t1 - (t0 + t2) / 2
+        if self.rtt is None:
+            self.rtt, self.clock_offset = rtt, offset
+        else:
+            self.rtt += LINK_SMOOTHING * (rtt - self.rtt)
+            self.clock_offset += LINK_SMOOTHING * (offset - self.clock_offset)
+        if self.on_link:
+            self.on_link(self.rtt, self.clock_offset)
+        return True
+
+    def send(self, data: bytes):
+        if self.closed:
+            return
+        if self._in_loop():
+            self._enqueue(data)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, data)
+
+    def _enqueue(self, data: bytes):
+        if self.closed or self.writer.is_closing():
+            return
+        cmd = peek_command(data)
+        key = cmd
+        if cmd in SUPERSEDED:
+            # у каждого игрока своё состояние: вытесняем только кадры того же автора
+            author = data.rfind(b'"from": ')
+            if author > 0:
+                key = cmd + data[author:]
+            old = self._latest.get(key)
+            if old is not None:
+                # старое состояние ещё не ушло — на его место в очереди встаёт новое.
+                # Такой кадр не отбрасывается: иначе пропали бы оба
+                self._queued_bytes += len(data) - len(old[1])
+                old[1] = data
+                self.stats["merged"] += 1
+                self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self._queued_bytes)
+                self._check_hard_limit()
+                return
+            if self._queued_bytes + len(data) > self.high_water:
+                self.stats["dropped"] += 1
+                return
+        entry = [key, data]
+        if cmd in SUPERSEDED:
+            self._latest[key] = entry
+        self._queue.append(entry)
+        self._queued_bytes += len(data)
+        self._live += 1
+        self.stats["peak_depth"] = max(self.stats["peak_depth"], self._live)
+        self.stats["peak_bytes"] = max(self.stats["peak_bytes"], self._queued_bytes)
+        if self._check_hard_limit():
+            self._wakeup.set()
+
+    def _check_hard_limit(self) -> bool:
+        if self._queued_bytes <= self.hard_limit:
+            return True
+        logger.error(f"{self.peer} не успевает принимать данные "
+                     f"({self._queued_bytes} байт в очереди) — соединение закрыто")
+        self._abort()
+        return False
+
+    async def _drain_loop(self):
+        try:
+            while True:
+                if not self._queue:
+                    if self.closed:
+                        break
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                # пишем всё накопленное одним заходом, затем ждём, пока сокет примет
+                while self._queue:
+                    entry = self._queue.popleft()
+                    key, data = entry
+                    if self._latest.get(key) is entry:
+                        del self._latest[key]
+                    self._queued_bytes -= len(data)
+                    self._live -= 1
+                    self.writer.write(data)
+                    self.stats["sent"] += 1
+                    self.stats["bytes_sent"] += len(data)
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.error(f"Ошибка отправки {self.peer}: {e}")
+        finally:
+            self._queue.clear()
+            self._latest.clear()
+            self._queued_bytes = self._live = 0
+            self.writer.close()
+
+    def queue_metrics(self) -> Dict[str, int]:
+        return {**self.stats, "depth": self._live, "bytes": self._queued_bytes}
+
+    def close(self):
+        if self._in_loop():
+            self._close()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        # очередь дописывается, после чего задача отправки закроет сокет
+        if self.closed:
+            return
+        self.closed = True
+        self._wakeup.set()
+
+    def _abort(self):
+        self.closed = True
+        self._queue.clear()
+        self._latest.clear()
+        self._queued_bytes = self._live = 0
+        self._drainer.cancel()
+        # close() ждал бы, пока зависший клиент вычитает буфер; abort рвёт сразу
+        self.writer.transport.abort()
+
+
+# рассылка второстепенным подписчикам (зрителям): кадр сериализован один раз,
+# те же байты уходят в очередь каждого подписчика. Раздаёт отдельная задача
+# и только после того, как игроки получили свои копии, поэтому число зрителей
+# не добавляет задержки игрокам
+class Fanout:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.subscribers: Dict[str, Connection] = {}
+        self._frames: Deque[bytes] = deque()
+        self._wakeup = asyncio.Event()
+        self.stats = {"frames": 0, "deliveries": 0, "peak_backlog": 0}
+        self._task = self.loop.create_task(self._run())
+
+    def push(self, data: bytes):
+        if threading.get_ident() == self._loop_thread:
+            self._push(data)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._push, data)
+
+    def _push(self, data: bytes):
+        if not self.subscribers:
+            return
+        self._frames.append(data)
+        self.stats["peak_backlog"] = max(self.stats["peak_backlog"], len(self._frames))
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._frames:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            data = self._frames.popleft()
+            for conn in list(self.subscribers.values()):
+                conn.send(data)
+            self.stats["frames"] += 1
+            self.stats["deliveries"] += len(self.subscribers)
+            # между кадрами отдаём цикл игровым соединениям
+            await asyncio.sleep(0)
+
+    def close(self):
+        if threading.get_ident() == self._loop_thread:
+            self._close()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        self._task.cancel()
+        self._frames.clear()
+        for conn in list(self.subscribers.values()):
+            conn.close()
+        self.subscribers.clear()
+
+
+# фоновый поток с собственным event loop (для клиента)
+class LoopThread:
+    def __init__(self, name: str = "net-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coro: Coroutine[Any, Any, Any]):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,38 @@
+import argparse
+import time
+
+from core.network_utils import DISCOVERY_PORT
+from core.server import Server
+from core.transport import SEND_HIGH_WATER, SEND_HARD_LIMIT
+from logger import logger
+
+
+def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Выделенный сервер «Три в ряд» (без GUI и звука)")
+    parser.add_argument("--host", default=None, help="адрес для прослушивания (по умолчанию — все интерфейсы)")
+    parser.add_argument("--port", type=int, default=DISCOVERY_PORT)
+    parser.add_argument("--rooms", type=int, default=4, help="сколько свободных комнат держать открытыми")
+    parser.add_argument("--mode", choices=["time", "chess"], default="time")
+    parser.add_argument("--time", type=int, default=60, help="лимит времени партии, с")
+    parser.add_argument("--authoritative", action="store_true",
+                        help="сервер сам считает каскады, клиенты присылают только обмены")
+    parser.add_argument("--send-high-water", type=int, default=SEND_HIGH_WATER // 1024,
+                        help="очередь клиента, КБ, выше которой отбрасываются устаревшие board/time/score")
+    parser.add_argument("--send-hard-limit", type=int, default=SEND_HARD_LIMIT // 1024,
+                        help="очередь клиента, КБ, выше которой клиент отключается как зависший")
+    parser.add_argument("--metrics-interval", type=float, default=60, help="период вывода метрик комнат, с")
+    args = parser.parse_args()
+
+    server = Server(port=args.port, host=args.host,
+                    send_high_water=args.send_high_water * 1024,
+                    send_hard_limit=args.send_hard_limit * 1024)
+    server.keep_open_rooms(args.rooms, args.mode, args.time if args.mode == "time" else 999,
+                           authoritative=args.authoritative)
+    codes = ", ".join(room.code for room in server.rooms.open_rooms())
+    logger.info(f"Выделенный сервер готов за {time.perf_counter() - started:.3f} с, комнаты: {codes}")
+    server.start(metrics_interval=args.metrics_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from core import protocol as proto
+from core.board import Board
+from core.transport import READ_LIMIT
+
+# нагрузочный тест: поднимает dedicated_server.py отдельным процессом и гоняет
+# через него N ботов парами по комнатам, как живые игроки в режиме на время
+
+
+class ServerProcess:
+    def __init__(self, host: str, port: int, rooms: int):
+        self.proc = subprocess.Popen(
+            [sys.executable, "dedicated_server.py", "--host", host, "--port", str(port),
+             "--rooms", str(rooms), "--mode", "time", "--time", "999", "--metrics-interval", "0"],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8",
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        self.codes: list[str] = []
+        self.samples: list[tuple[float, float, int]] = []
+        self._ready = threading.Event()
+        self._sampling = False
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        # лог сервера нужно вычитывать, иначе он упрётся в заполненный pipe
+        for line in self.proc.stdout:
+            if not self._ready.is_set() and "комнаты:" in line:
+                self.codes = line.strip().split("комнаты: ")[1].split(", ")
+                self._ready.set()
+        self._ready.set()
+
+    def wait_ready(self, timeout: float = 15) -> list[str]:
+        self._ready.wait(timeout)
+        return self.codes
+
+    def _cpu_and_rss(self) -> tuple[float, int] | None:
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            with open(f"/proc/{self.proc.pid}/status") as f:
+                rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            return cpu, rss * 1024
+        except (OSError, StopIteration, ValueError, AttributeError):
+            # не Linux — CPU/память сервера не снимаем
+            return None
+
+    def start_sampling(self, interval: float = 0.5):
+        self._sampling = True
+
+        def loop():
+            while self._sampling:
+                usage = self._cpu_and_rss()
+                if usage is None:
+                    return
+                self.samples.append((time.perf_counter(), *usage))
+                time.sleep(interval)
+
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._sampling = False
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class Stats:
+    def __init__(self):
+        self.handshakes: dict[str, int] = {}
+        self.sent = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latencies: list[float] = []
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        data = sorted(self.latencies)
+        return data[min(len(data) - 1, int(len(data) * p))]
+
+
+class Bot:
+    def __init__(self, code: str, nickname: str, args, stats: Stats):
+        self.code = code
+        self.nickname = nickname
+        self.args = args
+        self.stats = stats
+        self.board = Board()
+        self.elapsed = 0
+
+    async def run(self, host: str, port: int, stop: asyncio.Event, started: asyncio.Event):
+        reader, writer = await asyncio.open_connection(host, port, limit=READ_LIMIT)
+        writer.write(proto.dumps(proto.join(self.code, self.nickname)))
+        resp = (await reader.readline()).decode("utf-8").strip() or "EOF"
+        self.stats.handshakes[resp] = self.stats.handshakes.get(resp, 0) + 1
+        if resp != "WELCOME":
+            writer.close()
+            return
+
+        recv = asyncio.create_task(self._recv_loop(reader, writer, started))
+        await started.wait()
+        senders = [
+            asyncio.create_task(self._every(self.args.swap_rate, self._swap, writer, stop)),
+            asyncio.create_task(self._every(self.args.board_rate, self._board, writer, stop)),
+            asyncio.create_task(self._every(self.args.score_rate, self._score, writer, stop)),
+            asyncio.create_task(self._every(self.args.time_rate, self._time, writer, stop)),
+        ]
+        await stop.wait()
+        for task in senders:
+            task.cancel()
+        # даём долететь сообщениям в пути
+        await asyncio.sleep(self.args.drain)
+        recv.cancel()
+        writer.close()
+
+    async def _recv_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, started: asyncio.Event):
+        while True:
+            raw = await reader.readline()
+            if not raw:
+                return
+            now = time.perf_counter()
+            data = json.loads(raw)
+            if data.get("command") == "start_game":
+                started.set()
+                continue
+            if data.get("command") == "ping":
+                # без ответа сервер сочтёт бота отвалившимся
+                writer.write(proto.dumps(proto.pong(data["seq"], data["t0"], time.time())))
+                continue
+            self.stats.received += 1
+            self.stats.bytes_received += len(raw)
+            if "ts" in data:
+                self.stats.latencies.append(now - data["ts"])
+
+    async def _every(self, rate: float, make, writer: asyncio.StreamWriter, stop: asyncio.Event):
+        if rate <= 0:
+            return
+        period = 1 / rate
+        # разносим ботов по фазе, чтобы не слать всё одной пачкой
+        await asyncio.sleep(random.uniform(0, period))
+        while not stop.is_set():
+            msg = make().to_dict()
+            msg["ts"] = time.perf_counter()
+            data = proto.dumps(msg)
+            writer.write(data)
+            self.stats.sent += 1
+            self.stats.bytes_sent += len(data)
+            await asyncio.sleep(period)
+
+    def _swap(self):
+        r, c = random.randrange(Board.ROWS - 1), random.randrange(Board.COLS)
+        success, removed, bonuses = self.board.swap((r, c), (r + 1, c))
+        if success:
+            self.board.collapse_and_fill()
+        return proto.swap(a_lbl=(r, c), b_lbl=(r + 1, c), next_player=self.nickname, removed=removed,
+                          bonuses=bonuses, success=success, board=self.board.to_matrix())
+
+    def _board(self):
+        return proto.board(board_=self.board.to_matrix())
+
+    def _score(self):
+        return proto.score(score_=random.randint(0, 999))
+
+    def _time(self):
+        self.elapsed += 1
+        return proto.time(time_=self.elapsed)
+
+
+async def run_load(args, codes: list[str], stats: Stats, server: ServerProcess):
+    stop = asyncio.Event()
+    bots = []
+    room_started: dict[str, asyncio.Event] = {}
+    for i in range(args.clients):
+        code = codes[i // 2]
+        bots.append(Bot(code, f"bot{i}", args, stats))
+        room_started.setdefault(code, asyncio.Event())
+    # часть ботов стучится в уже занятые комнаты с чужим ником — проверяем отказ
+    for i in range(min(args.collisions, args.clients)):
+        bots.append(Bot(codes[i // 2], f"bot{i}", args, stats))
+
+    t0 = time.perf_counter()
+    tasks = []
+    for bot in bots[:args.clients]:
+        tasks.append(asyncio.create_task(bot.run(args.host, args.port, stop, room_started[bot.code])))
+    # дубли подключаем, когда оригиналы уже в комнате
+    await asyncio.sleep(0.2)
+    for bot in bots[args.clients:]:
+        tasks.append(asyncio.create_task(bot.run(args.host, args.port, stop, asyncio.Event())))
+
+    await asyncio.wait_for(asyncio.gather(*(e.wait() for e in room_started.values())), 30)
+    connect_time = time.perf_counter() - t0
+    server.start_sampling()
+    sent_before = stats.sent
+    t1 = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - t1
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return connect_time, elapsed, stats.sent - sent_before
+
+
+def report(args, stats: Stats, server: ServerProcess, connect_time: float, elapsed: float, sent: int):
+    print(f"Клиентов: {args.clients}, комнат: {args.clients // 2}, длительность {elapsed:.1f} с")
+    print(f"Рукопожатия: {stats.handshakes}, подключение и старт всех комнат за {connect_time:.2f} с")
+    print(f"Отправлено: {stats.sent} сообщений ({stats.bytes_sent / 1024:.0f} КБ), "
+          f"{sent / elapsed:.0f} сообщ./с")
+    print(f"Доставлено: {stats.received} сообщений ({stats.bytes_received / 1024:.0f} КБ), "
+          f"{stats.received / elapsed:.0f} сообщ./с")
+    if stats.latencies:
+        print(f"Задержка доставки: p50 {stats.percentile(0.5) * 1000:.2f} мс, "
+              f"p99 {stats.percentile(0.99) * 1000:.2f} мс, "
+              f"среднее {statistics.fmean(stats.latencies) * 1000:.2f} мс, "
+              f"макс {max(stats.latencies) * 1000:.2f} мс")
+    if len(server.samples) >= 2:
+        (t_a, cpu_a, _), (t_b, cpu_b, _) = server.samples[0], server.samples[-1]
+        peak_rss = max(rss for _, _, rss in server.samples)
+        print(f"Сервер: CPU {100 * (cpu_b - cpu_a) / (t_b - t_a):.0f}% одного ядра, "
+              f"пик RSS {peak_rss / (1 << 20):.1f} МБ")
+    else:
+        print("Сервер: CPU/память недоступны на этой платформе")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервера «Три в ряд»")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--clients", type=int, default=20, help="число ботов (по двое в комнате)")
+    parser.add_argument("--duration", type=float, default=10, help="длительность замера, с")
+    parser.add_argument("--swap-rate", type=float, default=1, help="обменов в секунду на бота")
+    parser.add_argument("--board-rate", type=float, default=2, help="рассылок поля в секунду на бота")
+    parser.add_argument("--score-rate", type=float, default=1, help="обновлений счёта в секунду на бота")
+    parser.add_argument("--time-rate", type=float, default=1, help="тиков таймера в секунду на бота")
+    parser.add_argument("--collisions", type=int, default=1, help="ботов с уже занятым ником")
+    parser.add_argument("--drain", type=float, default=0.5, help="ожидание сообщений в пути после остановки, с")
+    args = parser.parse_args()
+    if args.clients < 2 or args.clients % 2:
+        parser.error("--clients должно быть чётным и не меньше 2")
+
+    server = ServerProcess(args.host, args.port, args.clients // 2)
+    try:
+        codes = server.wait_ready()
+        if not codes:
+            print("Сервер не запустился")
+            return
+        stats = Stats()
+        connect_time, elapsed, sent = asyncio.run(run_load(args, codes, stats, server))
+        report(args, stats, server, connect_time, elapsed, sent)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import sys
+import time
+
+from core.replay import ReplayReader, ReplayError
+
+
+# разбор записанных партий: без окна — как можно быстрее, сводка по каждому файлу;
+# с окном — проигрывание в BoardView без сетевого соперника
+def analyse(paths: list[str]) -> int:
+    failed = 0
+    for path in paths:
+        try:
+            reader = ReplayReader(path)
+        except (OSError, ReplayError) as e:
+            print(f"{path}: {e}")
+            failed += 1
+            continue
+        with reader:
+            started = time.perf_counter()
+            swaps = cascades = 0
+            for _move, result in reader.play(speed=None):
+                if result.success:
+                    swaps += 1
+                    cascades += len(result.steps)
+            elapsed = time.perf_counter() - started
+            status = "расхождение на ходах " + ", ".join(map(str, reader.mismatches[:5])) \
+                if reader.mismatches else "сходится"
+            print(f"{path}: {reader.meta.get('mode')}, ходов {len(reader)} (удачных {swaps}, "
+                  f"шагов каскада {cascades}), партия {reader.duration_ms / 1000:.0f} с, "
+                  f"разбор {len(reader) / max(elapsed, 1e-9):,.0f} ходов/с, {status}"
+                  + ("" if reader.finished else ", запись не завершена"))
+            failed += bool(reader.mismatches)
+    return 1 if failed else 0
+
+
+def view(path: str, speed: float, start: int) -> int:
+    from PyQt5.QtWidgets import QApplication
+    from GUI.board_view import BoardView
+
+    app = QApplication(sys.argv)
+    view = BoardView()
+    view.play_replay(ReplayReader(path), speed=speed, start=start)
+    view.show()
+    return app.exec_()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Просмотр и разбор повторов «Три в ряд»")
+    parser.add_argument("paths", nargs="+", help="файлы .m3r из каталога replays/")
+    parser.add_argument("--headless", action="store_true", help="без окна: проверить и разобрать как можно быстрее")
+    parser.add_argument("--speed", type=float, default=1.0, help="скорость проигрывания в окне")
+    parser.add_argument("--start", type=int, default=0, help="с какого хода начать просмотр")
+    args = parser.parse_args()
+
+    if args.headless:
+        sys.exit(analyse(args.paths))
+    sys.exit(view(args.paths[0], args.speed, args.start))
+
+
+if __name__ == "__main__":
+    main()